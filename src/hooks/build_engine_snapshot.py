@@ -0,0 +1,62 @@
+from anyio import to_thread
+
+from src.hooks.config import LOGGER, PRESIDIO_ENGINE_SNAPSHOT_PATH
+from src.hooks.hooks_base import Hook, HookRunResult
+from src.hooks.presidio.engine_snapshot import EngineSnapshot
+from src.hooks.presidio.scanner import PresidioScanner
+
+logger = LOGGER
+
+
+class BuildEngineSnapshotResult(HookRunResult):
+    def __init__(self, snapshot_file: str, error: str | None = None) -> None:
+        self.snapshot_file = snapshot_file
+        self.error = error
+
+    def run_success(self) -> bool:
+        return self.error is None
+
+    def run_summary(self) -> str | None:
+        if self.error:
+            return f"The presidio engine snapshot could not be built: {self.error}"
+        return f"The presidio engine snapshot was written to {self.snapshot_file}"
+
+
+class BuildEngineSnapshot(Hook):
+    """
+
+    Builds the presidio analyzer from the yaml config files and writes it to an engine snapshot, see EngineSnapshot.
+    This is run in the builder stage of the docker image, so the hooks load the snapshot instead of building the
+    analyzer every time a container starts.
+
+    The snapshot is written to the single path given, or to PRESIDIO_ENGINE_SNAPSHOT_PATH when no path is given.
+
+    """
+
+    def validate_args(self) -> bool:
+        if len(self.paths) > 1:
+            logger.debug("Only one snapshot path can be provided, %s paths were provided", len(self.paths))
+            return False
+        if not self.paths and not PRESIDIO_ENGINE_SNAPSHOT_PATH:
+            logger.debug("No snapshot path was provided, and PRESIDIO_ENGINE_SNAPSHOT_PATH is not set")
+            return False
+        return True
+
+    async def _validate_hook_settings(self, dbt_repo_config) -> bool:
+        return True
+
+    async def run(self) -> BuildEngineSnapshotResult:
+        snapshot_file = self.paths[0] if self.paths else str(PRESIDIO_ENGINE_SNAPSHOT_PATH)
+        snapshot = EngineSnapshot(snapshot_file)
+
+        try:
+            analyzer = await to_thread.run_sync(PresidioScanner()._create_analyzer)
+            await to_thread.run_sync(snapshot.build, analyzer)
+            # Check the snapshot can be loaded now, rather than finding out it is broken on every run
+            if await to_thread.run_sync(snapshot.load) is None:
+                return BuildEngineSnapshotResult(snapshot_file, error="the snapshot that was written could not be loaded")
+        except Exception as exc:
+            logger.exception("Could not build the presidio engine snapshot")
+            return BuildEngineSnapshotResult(snapshot_file, error=str(exc))
+
+        return BuildEngineSnapshotResult(snapshot_file)
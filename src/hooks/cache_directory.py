@@ -0,0 +1,45 @@
+import os
+
+from anyio import Path, to_thread
+from pathlib import Path as SyncPath
+
+
+def create_cache_directory(cache_directory: str | os.PathLike[str]):
+    """Creates a cache directory, with a .gitignore so the cache is never committed to the repository being scanned.
+    This is blocking, see write_cache_file for writing a cache file from the event loop
+
+    Every cache inside DEFAULT_CACHE_DIRECTORY treats an error creating or writing to it as there being nothing cached,
+    a cache must never cause a hook to fail. The caller is expected to catch the OSError and carry on without the cache.
+
+    Args:
+        cache_directory (str | os.PathLike[str]): The cache directory
+
+    Raises:
+        OSError: If the directory or the .gitignore could not be created
+    """
+    SyncPath(cache_directory).mkdir(parents=True, exist_ok=True)
+    gitignore = SyncPath(cache_directory, ".gitignore")
+    if not gitignore.exists():
+        gitignore.write_text("*\n")
+
+
+async def write_cache_file(cache_file: Path, contents: str, cache_directory: Path | None = None):
+    """Writes a file inside a cache directory, replacing the file in a single step so a hook running at the same time
+    never reads a partial file
+
+    Args:
+        cache_file (Path): The file to write
+        contents (str): The contents of the file
+        cache_directory (Path | None, optional): The cache directory the file is inside, which the .gitignore is written
+        to. Defaults to None, which uses the directory of the file.
+
+    Raises:
+        OSError: If the file could not be written
+    """
+    await to_thread.run_sync(create_cache_directory, cache_directory or cache_file.parent)
+    await cache_file.parent.mkdir(parents=True, exist_ok=True)
+
+    # Each process writes its own temporary file, so hooks running at the same time never write to the same one
+    temporary_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+    await temporary_file.write_text(contents)
+    await temporary_file.replace(cache_file)
@@ -7,11 +7,17 @@ import time
 from typing import List, Optional
 from logging import StreamHandler, captureWarnings, INFO, DEBUG, Formatter
 
-from src.hooks.config import LOGGER, PERSONAL_DATA_SCAN, SECURITY_SCAN
-from src.hooks.run_security_scan import RunSecurityScan
-from src.hooks.validate_security_scan import ValidateSecurityScan
-
+from src.hooks.config import (
+    LOGGER,
+    PERSONAL_DATA_SCAN,
+    PRESIDIO_MAX_IN_FLIGHT_PATHS,
+    PRESIDIO_MEMORY_BUDGET_BYTES,
+    PRESIDIO_PATH_TIMEOUT_SECONDS,
+    PRESIDIO_SCAN_TIMEOUT_SECONDS,
+    SECURITY_SCAN,
+)
 from src.hooks.hooks_base import Hook
+from src.hooks.profiler import Profiler, profile_span, use_profiler
 
 
 logger = LOGGER
@@ -33,6 +39,50 @@ def init_logger(verbose):
     logger.debug("Logging initialized with level %s", log_level)
 
 
+# Each hook is imported when its subcommand runs, so validate_scan and --help never load presidio, spaCy or proxy.py
+
+
+def create_run_security_scan(args) -> Hook:
+    from src.hooks.run_security_scan import RunSecurityScan
+
+    return RunSecurityScan(
+        paths=args.paths,
+        verbose=args.verbose,
+        github_action=args.github_action,
+        excluded_scans=args.excluded_scans,
+        jobs=args.jobs,
+        use_cache=args.use_cache,
+        diff_base=args.diff_base,
+        staged=args.staged,
+        trufflehog_shards=args.trufflehog_shards,
+        trufflehog_concurrency=args.trufflehog_concurrency,
+        in_process_proxy=args.in_process_proxy,
+        use_daemon=args.use_daemon,
+        max_in_flight_paths=args.max_in_flight_paths,
+        memory_budget=args.memory_budget_mb * 1024 * 1024,
+        path_timeout=args.path_timeout,
+        scan_timeout=args.scan_timeout,
+    )
+
+
+def create_scan_daemon(args) -> Hook:
+    from src.hooks.scan_daemon import ScanDaemon
+
+    return ScanDaemon(args.paths, args.verbose)
+
+
+def create_build_engine_snapshot(args) -> Hook:
+    from src.hooks.build_engine_snapshot import BuildEngineSnapshot
+
+    return BuildEngineSnapshot(args.paths, args.verbose)
+
+
+def create_validate_security_scan(args) -> Hook:
+    from src.hooks.validate_security_scan import ValidateSecurityScan
+
+    return ValidateSecurityScan(args.paths, args.verbose)
+
+
 def parse_args(argv):
     main_parser = argparse.ArgumentParser(description="DBT pre-commit hooks")
 
@@ -41,6 +91,13 @@ def parse_args(argv):
     parent_parser.add_argument(
         "-v", "--verbose", dest="verbose", action="store_true", help="output debug logs", default=False
     )
+    parent_parser.add_argument(
+        "--profile",
+        dest="profile",
+        metavar="FILE",
+        help="Write how long each phase of the hook took to FILE as json",
+        required=False,
+    )
 
     subparsers = main_parser.add_subparsers(title="subcommands", description="valid subcommands", help="additional help")
     run_scan_parser = subparsers.add_parser("run_scan", parents=[parent_parser])
@@ -60,13 +117,116 @@ def parse_args(argv):
         choices=[SECURITY_SCAN, PERSONAL_DATA_SCAN],
         action="append",
     )
+    run_scan_parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of worker processes used by the personal data scan, 0 uses one per CPU",
+        required=False,
+        default=1,
+    )
+    run_scan_parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="Scan every file for personal data, even if it is unchanged since a previous scan",
+        required=False,
+    )
+
+    run_scan_parser.add_argument(
+        "--diff-base",
+        dest="diff_base",
+        help="Only scan files changed since the merge base with this ref, requires --github-action",
+        required=False,
+    )
+
+    run_scan_parser.add_argument(
+        "--staged",
+        dest="staged",
+        action="store_true",
+        help="Scan the contents of the paths staged in the git index, instead of the working tree",
+        required=False,
+    )
+
+    run_scan_parser.add_argument(
+        "--trufflehog-shards",
+        dest="trufflehog_shards",
+        type=int,
+        help="Number of trufflehog processes the paths are split between, 0 uses one per CPU",
+        required=False,
+        default=1,
+    )
+
+    run_scan_parser.add_argument(
+        "--trufflehog-concurrency",
+        dest="trufflehog_concurrency",
+        type=int,
+        help="Number of workers used by each trufflehog process, defaults to the trufflehog default",
+        required=False,
+    )
+
+    run_scan_parser.add_argument(
+        "--in-process-proxy",
+        dest="in_process_proxy",
+        action="store_true",
+        help="Filter the requests made by trufflehog with a lightweight proxy on the hook's event loop, instead of proxy.py",
+        required=False,
+    )
+
+    run_scan_parser.add_argument(
+        "--max-in-flight-paths",
+        dest="max_in_flight_paths",
+        type=int,
+        help="Number of paths the personal data scan works on at once",
+        required=False,
+        default=PRESIDIO_MAX_IN_FLIGHT_PATHS,
+    )
+
+    run_scan_parser.add_argument(
+        "--memory-budget-mb",
+        dest="memory_budget_mb",
+        type=int,
+        help="Megabytes of file contents the personal data scan holds in memory at once",
+        required=False,
+        default=PRESIDIO_MEMORY_BUDGET_BYTES // (1024 * 1024),
+    )
 
-    run_scan_parser.set_defaults(
-        hook=lambda args: RunSecurityScan(args.paths, args.verbose, args.github_action, args.excluded_scans)
+    run_scan_parser.add_argument(
+        "--path-timeout",
+        dest="path_timeout",
+        type=float,
+        help="Seconds a single file can be scanned for personal data before it is reported as errored, 0 is no limit",
+        required=False,
+        default=PRESIDIO_PATH_TIMEOUT_SECONDS,
     )
 
+    run_scan_parser.add_argument(
+        "--scan-timeout",
+        dest="scan_timeout",
+        type=float,
+        help="Seconds the personal data scan can run for before the remaining files are reported as errored, 0 is no limit",
+        required=False,
+        default=PRESIDIO_SCAN_TIMEOUT_SECONDS,
+    )
+
+    run_scan_parser.add_argument(
+        "--no-daemon",
+        dest="use_daemon",
+        action="store_false",
+        help="Always scan in this process, even if a scan daemon started with serve is running",
+        required=False,
+    )
+
+    run_scan_parser.set_defaults(hook=create_run_security_scan)
+
+    serve_parser = subparsers.add_parser("serve", parents=[parent_parser])
+    serve_parser.set_defaults(hook=create_scan_daemon)
+
+    build_engine_snapshot_parser = subparsers.add_parser("build_engine_snapshot", parents=[parent_parser])
+    build_engine_snapshot_parser.set_defaults(hook=create_build_engine_snapshot)
+
     validate_scan_parser = subparsers.add_parser("validate_scan", parents=[parent_parser])
-    validate_scan_parser.set_defaults(hook=lambda args: ValidateSecurityScan(args.paths, args.verbose))
+    validate_scan_parser.set_defaults(hook=create_validate_security_scan)
 
     return main_parser.parse_args(argv)
 
@@ -80,7 +240,21 @@ async def main_async(argv: Optional[List[str]] = None):
 
     logger.debug("Parsed args: %s", args)
 
-    hook: Hook = args.hook(args)
+    if not args.profile:
+        return await run_hook(args, hook_run_time)
+
+    profiler = Profiler()
+    try:
+        with use_profiler(profiler):
+            return await run_hook(args, hook_run_time)
+    finally:
+        profiler.write(args.profile)
+
+
+async def run_hook(args, hook_run_time: float):
+    # Creating the hook imports its module, and the scan dependencies that module needs
+    with profile_span("cli.create_hook"):
+        hook: Hook = args.hook(args)
 
     logger.debug("Loaded hook class %s", hook)
 
@@ -90,13 +264,15 @@ async def main_async(argv: Optional[List[str]] = None):
         return 1
     logger.debug("Hook '%s' passed args validation check", hook.__class__.__name__)
 
-    is_valid_hook = await hook.validate_hook_settings()
+    with profile_span("cli.validate_hook_settings"):
+        is_valid_hook = await hook.validate_hook_settings()
     if not is_valid_hook:
         logger.debug("Hook '%s' did not pass hook settings validation check", hook)
         return 1
     logger.debug("Hook '%s' passed hook settings check", hook.__class__.__name__)
 
-    run_result = await hook.run()
+    with profile_span("cli.run"):
+        run_result = await hook.run()
     logger.info("%s", run_result.run_summary())
 
     hook_run_time = time.time() - hook_run_time
@@ -10,6 +10,8 @@ MANDATORY_HOOK_IDS = ["validate-security-scan", "run-security-scan"]
 FORCE_HOOK_CHECKS = os.getenv("FORCE_HOOK_CHECKS", "0")
 SECURITY_SCAN = "security"
 PERSONAL_DATA_SCAN = "data"
+# The branch changes are compared against in github action mode
+DEFAULT_DIFF_BASE = "main"
 
 LOGGER = logging.getLogger("app")
 
@@ -20,17 +22,65 @@ TRUFFLEHOG_ERROR_CODE = 183
 TRUFFLEHOG_SUCCESS_CODE = 0
 TRUFFLEHOG_VERBOSE_LOG_LEVEL = 5
 TRUFFLEHOG_INFO_LOG_LEVEL = -1
-TRUFFLEHOG_PROXY = "http://localhost:8899"
+# The proxy trufflehog runs behind listens on a port assigned by the OS, so any number of scans can run at once
+TRUFFLEHOG_PROXY_HOST = "127.0.0.1"
+# The number of trufflehog log lines kept to explain why a scan failed to run
+TRUFFLEHOG_ERROR_LOG_LINES = 20
+# The maximum combined length of the paths passed to a single trufflehog process. Paths beyond this are split into more
+# shards, so a very large commit never goes over the operating system limit on the size of a command line
+TRUFFLEHOG_MAX_SHARD_ARGS_LENGTH = 100000
 
-# Proxy.py
+# Caches that persist between runs of the hooks
+DEFAULT_CACHE_DIRECTORY = os.getenv("DEFAULT_CACHE_DIRECTORY", "./.github_standards_cache")
+
+# The latest release tag is cached inside DEFAULT_CACHE_DIRECTORY, and only checked with github again once it is older
+# than the ttl. A check after that sends the cached ETag, so an unchanged release is a 304 with no body
+RELEASE_CHECK_CACHE_FILE = "latest_release.json"
+RELEASE_CHECK_CACHE_TTL_SECONDS = 6 * 60 * 60
+# This is a low timeout, we don't want to block commits or make devs wait for the github api
+RELEASE_CHECK_TIMEOUT_SECONDS = 1
+
+# The github-standards repo entry from PRE_COMMIT_FILE, cached inside DEFAULT_CACHE_DIRECTORY once it has been validated
+HOOK_SETTINGS_CACHE_FILE = "hook_settings.json"
+
+# Receipts of passed scans, one file for each staged tree and scanner fingerprint inside this directory of
+# DEFAULT_CACHE_DIRECTORY. The oldest receipts are removed once there are more than the maximum
+SCAN_RECEIPTS_DIRECTORY = "scan_receipts"
+SCAN_RECEIPTS_MAX_ENTRIES = 1000
+
+# Scan daemon, the socket is created inside DEFAULT_CACHE_DIRECTORY so each repository has its own daemon
+SCAN_DAEMON_SOCKET_FILE = "scan_daemon.sock"
+# Increased whenever the requests or responses sent over the socket change, so a client never uses an older daemon
+SCAN_DAEMON_PROTOCOL_VERSION = 4
+# Seconds run_scan waits for the scan daemon to reply before scanning in process instead. This is longer than a personal
+# data scan can run for by default, so only a daemon that has stopped responding is given up on
+SCAN_DAEMON_TIMEOUT_SECONDS = 1200
+
+# Proxy.py, each run uses its own temporary directory inside this directory
 DEFAULT_PROXY_DIRECTORY = os.getenv("DEFAULT_PROXY_DIRECTORY", "./.proxy_py")
 
+# In process egress proxy, see src/proxy/egress_proxy.py
+EGRESS_PROXY_MAX_HEADER_LENGTH = 65536
+
+# Profiling, see hooks-cli --profile
+# The number of the slowest paths included in a profile
+PROFILE_SLOWEST_PATHS = 10
+# The span recorded for each path scanned for personal data
+PROFILE_PATH_SPAN = "presidio.scan_path"
+
 # Presidio
 DEFAULT_LANGUAGE_CODE = "en"
 
 ENGINE_CONFIG_FILE = "engine_config.yaml"
 NLP_CONFIG_FILE = "nlp_config.yaml"
 RECOGNIZER_CONFIG_FILE = "recognizer_config.yaml"
+# Recognizers that need a trained NLP model. When none of these are enabled, the spaCy model is never loaded
+NLP_RECOGNIZER_NAMES = [
+    "SpacyRecognizer",
+    "SpacyPostProcessingRecognizer",
+    "StanzaRecognizer",
+    "TransformersRecognizer",
+]
 EXCLUDED_PERSONAL_DATA_FILE_TYPES = [
     # images
     ".jpg",
@@ -41,3 +91,33 @@ EXCLUDED_PERSONAL_DATA_FILE_TYPES = [
     ".svg",
 ]
 PRESIDIO_EXCLUSIONS_FILE_PATH = "personal-data-exclusions.txt"
+# The number of paths that are checked together before they are scanned, see PathFilter._stat_paths
+PRESIDIO_PATH_BATCH_SIZE = 1000
+# The number of lines analyzed in a single batch, for files that are scanned line by line
+PRESIDIO_LINE_BATCH_SIZE = 1000
+# The number of characters analyzed in a single window, for files that are not scanned line by line. This needs to
+# stay well below the spaCy max_length of 1,000,000 characters
+PRESIDIO_WINDOW_SIZE = 100000
+# The number of characters at the end of each window that are analyzed again as part of the next window, so a match
+# that crosses a window boundary is still found. Must be less than half of PRESIDIO_WINDOW_SIZE
+PRESIDIO_WINDOW_OVERLAP = 1000
+# The most paths the personal data scan works on at once, paths waiting to be scanned are held in a queue of the same size
+PRESIDIO_MAX_IN_FLIGHT_PATHS = 32
+# The most bytes of file contents the personal data scan holds in memory at once, see MemoryBudget
+PRESIDIO_MEMORY_BUDGET_BYTES = 64 * 1024 * 1024
+# The most seconds a single path can be scanned for, and the most seconds the whole personal data scan can run for. A path
+# that runs out of time is reported as errored. 0 means no limit
+PRESIDIO_PATH_TIMEOUT_SECONDS = 60
+PRESIDIO_SCAN_TIMEOUT_SECONDS = 900
+# The most analyses abandoned by paths that ran out of time that can still be running, each with its own analyzer, before
+# the remaining paths wait for one of them to finish, see AnalyzerPool
+PRESIDIO_MAX_ABANDONED_ANALYSES = 4
+# How a file is scanned, csv files are scanned line by line and every other file in overlapping windows. The same
+# contents give different offsets and line numbers in each mode, so cached results are kept separately for each mode
+PRESIDIO_SCAN_MODE_LINES = "lines"
+PRESIDIO_SCAN_MODE_WINDOWS = "windows"
+PRESIDIO_CACHE_FILE = "presidio_results.sqlite"
+PRESIDIO_CACHE_MAX_ENTRIES = 10000
+# A snapshot of the analyzer built from the yaml config files, created by hooks-cli build_engine_snapshot. When unset, or
+# the snapshot was built from a different config, the analyzer is built from the yaml config files on every run
+PRESIDIO_ENGINE_SNAPSHOT_PATH = os.getenv("PRESIDIO_ENGINE_SNAPSHOT_PATH")
@@ -0,0 +1,262 @@
+import os
+import subprocess
+
+from anyio import Lock, open_process, run_process
+from anyio.abc import Process
+from anyio.streams.buffered import BufferedByteReceiveStream
+from io import StringIO
+from typing import AsyncIterator, Dict, List, Set
+
+from src.hooks.config import LOGGER
+
+logger = LOGGER
+
+GIT_BLOB_TYPE = b"blob"
+# Symlinks (120000) and submodules (160000) are not included, their contents are not a file that can be scanned
+GIT_REGULAR_FILE_MODES = [b"100644", b"100755"]
+GIT_CAT_FILE_MAX_HEADER_LENGTH = 1024
+
+
+async def iter_tracked_files(repo_path: str, ref: str = "HEAD") -> AsyncIterator[str]:
+    """Streams the path of every file in a git tree, as they are output by a single git ls-tree process. Only blobs are
+    returned, trees are never listed by a recursive ls-tree and submodules (commit entries) are skipped, so every path
+    returned is a file that can be scanned
+
+    Args:
+        repo_path (str): The root of the git repository
+        ref (str, optional): The commit whose tree is listed. Defaults to "HEAD".
+
+    Raises:
+        subprocess.CalledProcessError: If git could not list the tree
+
+    Yields:
+        str: The absolute path of each file in the tree
+    """
+    repo_root = os.path.abspath(repo_path)
+    args = ["git", "-C", repo_root, "ls-tree", "-r", "-z", "--full-tree", ref]
+    logger.debug("Listing files in git repository with command '%s'", " ".join(args))
+
+    async with await open_process(args, stdin=subprocess.DEVNULL) as process:
+        pending = b""
+        async for chunk in process.stdout:  # type: ignore
+            entries = (pending + chunk).split(b"\0")
+            # The last entry is incomplete until the next chunk, or the empty string after the final separator
+            pending = entries.pop()
+            for entry in entries:
+                # Each entry is "<mode> <type> <object>\t<path>"
+                entry_info, _, path = entry.partition(b"\t")
+                if entry_info.split(b" ")[1] != GIT_BLOB_TYPE:
+                    logger.debug("Skipping git tree entry %s, it is not a file", entry)
+                    continue
+                yield os.path.join(repo_root, os.fsdecode(path))
+
+        stderr = b""
+        async for chunk in process.stderr:  # type: ignore
+            stderr += chunk
+
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, stderr=stderr)  # type: ignore
+
+
+async def get_staged_tree() -> str | None:
+    """Writes the git index as a tree object, the same tree a commit made now would have
+
+    Returns:
+        str | None: The object name of the tree, or None if git could not write it, e.g. there are merge conflicts
+    """
+    write_tree = await run_process(["git", "write-tree"], stdin=subprocess.DEVNULL, check=False)
+    if write_tree.returncode != 0:
+        logger.debug("Could not write the git index as a tree: %s", write_tree.stderr.decode(errors="replace"))
+        return None
+    return write_tree.stdout.decode().strip()
+
+
+async def get_paths_matching_index(paths: List[str]) -> Set[str] | None:
+    """Finds the paths whose working tree contents are the same as their staged contents
+
+    Args:
+        paths (List[str]): The paths to check, relative to the current working directory
+
+    Returns:
+        Set[str] | None: The normalised paths that are staged and unchanged in the working tree, or None if git could not
+        check the paths, e.g. they are outside the repository
+    """
+    # -t tags each cached path with H, and lists modified or deleted paths a second time tagged with C. The paths are
+    # file names, not patterns, so a name such as "a[1].txt" or "*.txt" only ever matches itself
+    ls_files = await run_process(
+        ["git", "--literal-pathspecs", "ls-files", "-z", "-t", "--cached", "--modified", "--", *paths],
+        stdin=subprocess.DEVNULL,
+        check=False,
+    )
+    if ls_files.returncode != 0:
+        logger.debug("Could not compare the paths to the git index: %s", ls_files.stderr.decode(errors="replace"))
+        return None
+
+    cached: Set[str] = set()
+    modified: Set[str] = set()
+    for entry in ls_files.stdout.split(b"\0"):
+        if not entry:
+            continue
+        tag, _, path = entry.partition(b" ")
+        (modified if tag == b"C" else cached).add(os.path.normpath(os.fsdecode(path)))
+    return cached - modified
+
+
+class StagedFile:
+    """
+
+    A read only, in memory file over the staged contents of a path, with the same read and line iteration methods the
+    scanners use on an anyio AsyncFile
+
+    """
+
+    def __init__(self, contents: str) -> None:
+        self._buffer = StringIO(contents)
+
+    async def read(self, size: int = -1) -> str:
+        return self._buffer.read(size)
+
+    def __aiter__(self) -> "StagedFile":
+        return self
+
+    async def __anext__(self) -> str:
+        line = self._buffer.readline()
+        if not line:
+            raise StopAsyncIteration
+        return line
+
+
+class StagedFiles:
+    """
+
+    The contents of paths as they are staged in the git index, rather than as they are in the working tree. Blobs are
+    read through a single long lived git cat-file --batch process, which is started on first use. Call aclose() once
+    all the blobs have been read.
+
+    Paths are relative to the current working directory, which is how pre-commit passes them to the hooks.
+
+    """
+
+    def __init__(self, blobs: Dict[str, str], sizes: Dict[str, int] | None = None) -> None:
+        self.blobs = blobs
+        self.sizes = sizes or {}
+        self._process: Process | None = None
+        self._stdout: BufferedByteReceiveStream | None = None
+        self._lock = Lock()
+
+    @staticmethod
+    async def load(paths: List[str]) -> "StagedFiles":
+        """Looks up the staged blob for each path
+
+        Args:
+            paths (List[str]): The paths to look up
+
+        Returns:
+            StagedFiles: The staged blobs and their sizes. Paths that are not staged as a regular file, such as untracked
+            paths, directories, symlinks, submodules and paths with merge conflicts, are not included
+        """
+        blobs: Dict[str, str] = {}
+        if not paths:
+            return StagedFiles(blobs)
+
+        # The paths are file names, not patterns, so a name such as "a[1].txt" or "*.txt" only ever matches itself
+        ls_files = await run_process(
+            ["git", "--literal-pathspecs", "ls-files", "--stage", "-z", "--", *paths], stdin=subprocess.DEVNULL
+        )
+        for entry in ls_files.stdout.split(b"\0"):
+            if not entry:
+                continue
+            # Each entry is "<mode> <object> <stage>\t<path>"
+            entry_info, _, path = entry.partition(b"\t")
+            mode, object_name, stage = entry_info.split(b" ")
+            if mode not in GIT_REGULAR_FILE_MODES or stage != b"0":
+                logger.debug("Path %s is not staged as a regular file, it will be read from the working tree", path)
+                continue
+            blobs[os.fsdecode(path)] = object_name.decode()
+
+        logger.debug("Found %s staged blobs for %s paths", len(blobs), len(paths))
+        return StagedFiles(blobs, await StagedFiles._get_sizes(set(blobs.values())))
+
+    @staticmethod
+    async def _get_sizes(object_names: Set[str]) -> Dict[str, int]:
+        sizes: Dict[str, int] = {}
+        if not object_names:
+            return sizes
+
+        # A single git cat-file process looks up the size of every blob, without reading their contents
+        batch_check = await run_process(["git", "cat-file", "--batch-check"], input="\n".join(object_names).encode() + b"\n")
+        for line in batch_check.stdout.splitlines():
+            # Each line is "<object> <type> <size>", or "<object> missing" if the object is not in the database
+            line_parts = line.split(b" ")
+            if len(line_parts) == 3:
+                sizes[line_parts[0].decode()] = int(line_parts[2])
+        return sizes
+
+    def get(self, path: str) -> str | None:
+        """Gets the staged blob for a path
+
+        Args:
+            path (str): The path, as passed to load()
+
+        Returns:
+            str | None: The object name of the staged blob, or None if the path is not staged
+        """
+        return self.blobs.get(os.path.normpath(path))
+
+    def get_size(self, object_name: str) -> int:
+        """Gets the size of a staged blob
+
+        Args:
+            object_name (str): The object name of the blob, see get()
+
+        Returns:
+            int: The size of the blob in bytes, or 0 if it is not known
+        """
+        return self.sizes.get(object_name, 0)
+
+    async def read_blob(self, object_name: str) -> bytes:
+        """Reads the contents of a blob from the git object database
+
+        Args:
+            object_name (str): The object name of the blob
+
+        Raises:
+            ValueError: If git could not find the blob
+
+        Returns:
+            bytes: The contents of the blob
+        """
+        # Requests and responses are matched by their order, so only one blob can be read at a time
+        async with self._lock:
+            if self._process is None:
+                self._process = await open_process(["git", "cat-file", "--batch"], stderr=subprocess.DEVNULL)
+                self._stdout = BufferedByteReceiveStream(self._process.stdout)  # type: ignore
+
+            await self._process.stdin.send(f"{object_name}\n".encode())  # type: ignore
+            # The header is "<object> <type> <size>", or "<object> missing" if the object is not in the database
+            header = await self._stdout.receive_until(b"\n", GIT_CAT_FILE_MAX_HEADER_LENGTH)  # type: ignore
+            header_parts = header.split(b" ")
+            if len(header_parts) != 3 or header_parts[1] != GIT_BLOB_TYPE:
+                raise ValueError(f"Could not read git blob {object_name}: {header.decode()}")
+
+            contents = await self._stdout.receive_exactly(int(header_parts[2]))  # type: ignore
+            await self._stdout.receive_exactly(1)  # type: ignore
+            return contents
+
+    async def checkout(self, directory: str):
+        """Writes the staged contents of every path into a directory, keeping the same relative paths. The contents are
+        written by git straight from the object database
+
+        Args:
+            directory (str): The directory to write the files to
+        """
+        await run_process(
+            ["git", "checkout-index", f"--prefix={os.path.join(directory, '')}", "-z", "--stdin"],
+            input=b"\0".join(os.fsencode(path) for path in self.blobs),
+        )
+
+    async def aclose(self):
+        if self._process is not None:
+            await self._process.aclose()
+            self._process = None
+            self._stdout = None
@@ -0,0 +1,85 @@
+import json
+import os
+import yaml
+
+from anyio import Path
+from typing import Any, Dict
+
+from src.hooks.cache_directory import write_cache_file
+from src.hooks.config import DEFAULT_CACHE_DIRECTORY, HOOK_SETTINGS_CACHE_FILE, LOGGER
+
+# The LibYAML loader is many times faster than the pure python loader, but is only available when pyyaml was built with it
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:  # pragma: no cover
+    from yaml import SafeLoader  # type: ignore
+
+logger = LOGGER
+
+
+def load_yaml(contents: str | bytes) -> Any:
+    """Parses yaml the same way as yaml.safe_load, using the LibYAML loader when it is available"""
+    return yaml.load(contents, Loader=SafeLoader)
+
+
+class HookSettingsCache:
+    """
+
+    An on disk cache of the github-standards repo entry from the pre-commit config file, once it has passed the checks
+    in Hook.validate_hook_settings. Pre-commit runs each hook in its own process, so this lets every hook after the first
+    in a commit skip parsing the config. An entry is only used while the path, modification time and size of the config
+    file are the same as when it was cached.
+
+    Any error reading or writing the cache is treated as there being nothing cached, so the config is parsed and
+    validated again.
+
+    """
+
+    def __init__(self, cache_directory: str = DEFAULT_CACHE_DIRECTORY) -> None:
+        self.cache_file = Path(cache_directory, HOOK_SETTINGS_CACHE_FILE)
+
+    def _get_key(self, config_file: str, config_stat: os.stat_result) -> Dict[str, Any]:
+        return {
+            "path": os.path.realpath(config_file),
+            "mtime_ns": config_stat.st_mtime_ns,
+            "size": config_stat.st_size,
+        }
+
+    async def get(self, config_file: str, config_stat: os.stat_result) -> Dict[str, Any] | None:
+        """Gets the cached repo entry for the config file
+
+        Args:
+            config_file (str): The path to the pre-commit config file
+            config_stat (os.stat_result): The current stat result of the config file
+
+        Returns:
+            Dict[str, Any] | None: The cached repo entry, or None if the config file has changed since it was cached
+        """
+        try:
+            cached = json.loads(await self.cache_file.read_text())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as exc:
+            logger.debug("The hook settings cache %s could not be read: %s", self.cache_file, exc)
+            return None
+
+        if not isinstance(cached, dict) or cached.get("key") != self._get_key(config_file, config_stat):
+            return None
+
+        logger.debug("File %s has not changed since it was last validated, using the cached settings", config_file)
+        return cached.get("repo")
+
+    async def set(self, config_file: str, config_stat: os.stat_result, repo: Dict[str, Any]):
+        """Caches the repo entry for the config file
+
+        Args:
+            config_file (str): The path to the pre-commit config file
+            config_stat (os.stat_result): The stat result of the config file, taken before it was read
+            repo (Dict[str, Any]): The validated github-standards repo entry
+        """
+        try:
+            await write_cache_file(
+                self.cache_file, json.dumps({"key": self._get_key(config_file, config_stat), "repo": repo})
+            )
+        except (OSError, TypeError, ValueError) as exc:
+            logger.debug("The hook settings cache %s could not be written: %s", self.cache_file, exc)
@@ -1,11 +1,10 @@
-import yaml
-
-from anyio import open_file, Path
+from anyio import Path
 from abc import ABC, abstractmethod
-from typing import List
+from typing import Any, Dict, List
 
 
-from src.hooks.config import FORCE_HOOK_CHECKS, LOGGER, PRE_COMMIT_FILE
+from src.hooks.config import DEFAULT_CACHE_DIRECTORY, FORCE_HOOK_CHECKS, LOGGER, PRE_COMMIT_FILE
+from src.hooks.hook_settings import HookSettingsCache, load_yaml
 
 
 logger = LOGGER
@@ -46,30 +45,49 @@ class Hook(ABC):
             )
             return True
 
-        if not await Path(PRE_COMMIT_FILE).exists():
+        config_file = Path(PRE_COMMIT_FILE)
+        if not await config_file.exists():
             logger.debug("File %s does not exist in this repository. This file must be present", PRE_COMMIT_FILE)
             return False
 
-        async with await open_file(PRE_COMMIT_FILE, "r", encoding="utf-8") as file:
-            config = yaml.safe_load(await file.read())
-
-            if "repos" not in config:
-                logger.debug("File %s does not contain a repo tag", PRE_COMMIT_FILE)
+        # Stat before reading, so a file changed while it is being read is never cached as unchanged
+        config_stat = await config_file.stat()
+        settings_cache = HookSettingsCache(DEFAULT_CACHE_DIRECTORY)
+        dbt_hook_repo = await settings_cache.get(PRE_COMMIT_FILE, config_stat)
+        if dbt_hook_repo is None:
+            dbt_hook_repo = self._get_dbt_hook_repo(await config_file.read_bytes())
+            if dbt_hook_repo is None:
                 return False
+            await settings_cache.set(PRE_COMMIT_FILE, config_stat, dbt_hook_repo)
 
-            dbt_hook_repo = list(
-                filter(lambda x: "https://github.com/uktrade/github-standards" in x["repo"], config["repos"])
-            )
+        return await self._validate_hook_settings(dbt_hook_repo)
 
-            if not dbt_hook_repo:
-                logger.debug("File %s does not contain the github standards hooks repo", PRE_COMMIT_FILE)
-                return False
+    def _get_dbt_hook_repo(self, contents: bytes) -> Dict[str, Any] | None:
+        """Parses the pre-commit config, and checks it contains the github standards hooks repo exactly once
 
-            if len(dbt_hook_repo) != 1:
-                logger.debug("File %s can only contain one github-standards repo entry", PRE_COMMIT_FILE)
-                return False
+        Args:
+            contents (bytes): The contents of the pre-commit config file
+
+        Returns:
+            Dict[str, Any] | None: The github standards hooks repo entry, or None if the config is not valid
+        """
+        config = load_yaml(contents)
+
+        if "repos" not in config:
+            logger.debug("File %s does not contain a repo tag", PRE_COMMIT_FILE)
+            return None
+
+        dbt_hook_repo = list(filter(lambda x: "https://github.com/uktrade/github-standards" in x["repo"], config["repos"]))
+
+        if not dbt_hook_repo:
+            logger.debug("File %s does not contain the github standards hooks repo", PRE_COMMIT_FILE)
+            return None
+
+        if len(dbt_hook_repo) != 1:
+            logger.debug("File %s can only contain one github-standards repo entry", PRE_COMMIT_FILE)
+            return None
 
-            return await self._validate_hook_settings(dbt_hook_repo[0])
+        return dbt_hook_repo[0]
 
     @abstractmethod
     async def _validate_hook_settings(self, dbt_repo_config) -> bool:
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import pickle
+import platform
+import tempfile
+
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from presidio_analyzer import AnalyzerEngine
+from typing import Any, Dict
+
+from src.hooks.config import LOGGER
+from src.hooks.presidio.result_cache import PresidioResultCache
+
+logger = LOGGER
+
+# Packages whose installed version changes what is stored inside a pickled analyzer
+SNAPSHOT_PACKAGES = ["spacy", "en_core_web_sm"]
+
+
+class EngineSnapshot:
+    """
+
+    A pickled presidio analyzer, built once from the yaml config files so later runs skip reading the config, creating
+    the recognizers and compiling their patterns. The docker image builds the snapshot in its builder stage, see
+    hooks-cli build_engine_snapshot.
+
+    The file holds a header, pickled on its own, followed by the analyzer. The header is checked before the analyzer is
+    unpickled, so a snapshot built from a different config, python or library version is never loaded. Only load a
+    snapshot from a path the hooks control, never from the repository being scanned.
+
+    """
+
+    def __init__(self, snapshot_file: str) -> None:
+        self.snapshot_file = Path(snapshot_file)
+
+    @staticmethod
+    def get_fingerprint() -> str:
+        """Creates a fingerprint of everything that can change the analyzer stored in a snapshot
+
+        Returns:
+            str: A sha256 hex digest of the presidio config fingerprint, python version and spaCy package versions
+        """
+        fingerprint = hashlib.sha256()
+        fingerprint.update(PresidioResultCache.get_config_fingerprint().encode())
+        fingerprint.update(platform.python_version().encode())
+        for package in SNAPSHOT_PACKAGES:
+            try:
+                fingerprint.update(f"{package}=={version(package)}".encode())
+            except PackageNotFoundError:
+                logger.debug("Could not find the installed %s version", package)
+
+        return fingerprint.hexdigest()
+
+    def _get_header(self) -> Dict[str, Any]:
+        return {"fingerprint": self.get_fingerprint()}
+
+    def build(self, analyzer: AnalyzerEngine):
+        """Writes the analyzer to the snapshot file, replacing any existing snapshot
+
+        Args:
+            analyzer (AnalyzerEngine): The analyzer built from the yaml config files
+        """
+        self.snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so a snapshot that is being written is never loaded
+        with tempfile.NamedTemporaryFile(dir=self.snapshot_file.parent, delete=False) as f:
+            pickle.dump(self._get_header(), f, protocol=pickle.HIGHEST_PROTOCOL)
+            pickle.dump(analyzer, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(f.name, self.snapshot_file)
+        logger.debug("Wrote the presidio engine snapshot to %s", self.snapshot_file)
+
+    def load(self) -> AnalyzerEngine | None:
+        """Loads the analyzer from the snapshot file
+
+        Returns:
+            AnalyzerEngine | None: The analyzer, or None if there is no snapshot, it is stale or it could not be loaded
+        """
+        try:
+            with open(self.snapshot_file, "rb") as f:
+                header = pickle.load(f)
+                if not isinstance(header, dict) or header.get("fingerprint") != self.get_fingerprint():
+                    logger.debug("The presidio engine snapshot %s was built from a different config", self.snapshot_file)
+                    return None
+
+                analyzer = pickle.load(f)
+        except FileNotFoundError:
+            logger.debug("There is no presidio engine snapshot at %s", self.snapshot_file)
+            return None
+        except Exception as exc:
+            logger.debug("Could not load the presidio engine snapshot %s: %s", self.snapshot_file, exc)
+            return None
+
+        if not isinstance(analyzer, AnalyzerEngine):
+            logger.debug("The presidio engine snapshot %s does not contain an analyzer", self.snapshot_file)
+            return None
+
+        logger.debug("Loaded the presidio analyzer from the snapshot %s", self.snapshot_file)
+        return analyzer
@@ -0,0 +1,55 @@
+import spacy
+
+from presidio_analyzer import AnalyzerEngineProvider
+from presidio_analyzer.nlp_engine import NlpArtifacts, NlpEngine, NlpEngineProvider, SpacyNlpEngine
+from spacy.tokens import Doc
+
+from src.hooks.config import LOGGER
+
+logger = LOGGER
+
+
+class TokenizerOnlyNlpEngine(SpacyNlpEngine):
+    """
+
+    A spaCy NLP engine that only runs the language tokenizer. The trained model (tagger, parser, NER) is never
+    loaded, so the engine is only suitable when every enabled recognizer is pattern based. Tokens and lowercased
+    lemmas are still produced, so context words configured on a recognizer continue to enhance the score
+
+    """
+
+    # Registered under the same name as the full spaCy engine, so the models listed in nlp_config.yaml are reused
+    engine_name = "spacy"
+
+    def load(self) -> None:
+        logger.debug("Loading tokenizer only spaCy pipelines for models %s", self.models)
+
+        self.nlp = {}
+        for model in self.models:
+            self._validate_model_params(model)
+            self.nlp[model["lang_code"]] = spacy.blank(model["lang_code"])
+
+    def _doc_to_nlp_artifact(self, doc: Doc, language: str) -> NlpArtifacts:
+        # A blank pipeline has no lemmatizer, fall back to the lowercased token text so context matching still works
+        return NlpArtifacts(
+            entities=[],
+            tokens=doc,
+            tokens_indices=[token.idx for token in doc],
+            lemmas=[token.lemma_ or token.lower_ for token in doc],
+            nlp_engine=self,
+            language=language,
+            scores=[],
+        )
+
+
+class TokenizerOnlyAnalyzerEngineProvider(AnalyzerEngineProvider):
+    """
+
+    Builds an AnalyzerEngine from the same yaml configuration as the AnalyzerEngineProvider, but swaps the NLP engine
+    for the TokenizerOnlyNlpEngine
+
+    """
+
+    def _load_nlp_engine(self) -> NlpEngine:
+        provider = NlpEngineProvider(nlp_engines=(TokenizerOnlyNlpEngine,), conf_file=self.nlp_engine_conf_file)
+        return provider.create_engine()
@@ -1,14 +1,18 @@
+import errno
+import os
 import re
+import stat
 
 from anyio import open_file, Path
 from enum import Enum
-from typing import List
+from typing import Dict, List, Tuple
 
 
 from src.hooks.config import (
     EXCLUDED_PERSONAL_DATA_FILE_TYPES,
     LOGGER,
 )
+from src.hooks.profiler import profile_span
 
 logger = LOGGER
 
@@ -21,31 +25,127 @@ class PathScanStatus(Enum):
     ERRORED = 5
 
 
+# A backreference to a numbered group would point at the wrong group once the pattern is part of the combined regex
+NUMBERED_BACKREFERENCE_REGEX = re.compile(r"\\[1-9]|\(\?\(\d")
+
+
+class ExclusionMatcher:
+    """
+
+    Matches a path against every exclusion regex with a single search, by combining the regexes into one alternation.
+    Most paths do not match any exclusion, so only a path that matches the combined regex is searched again with each
+    regex in turn, to find out which exclusion matched.
+
+    When the regexes cannot be combined, for example because one uses a numbered backreference or a global inline
+    flag, each regex is searched in turn instead.
+
+    """
+
+    def __init__(self, exclusions: List[re.Pattern[str]]) -> None:
+        self.exclusions = exclusions
+        self._combined: re.Pattern[str] | None = None
+
+        if not exclusions or any(NUMBERED_BACKREFERENCE_REGEX.search(exclusion.pattern) for exclusion in exclusions):
+            return
+
+        try:
+            # Non capturing groups keep the alternation fast, capturing a named group per regex is an order of magnitude slower
+            self._combined = re.compile("|".join(f"(?:{exclusion.pattern})" for exclusion in exclusions))
+        except re.error:
+            logger.debug("The exclusion regexes could not be combined, each regex will be searched in turn")
+
+    def match(self, path: str) -> re.Pattern[str] | None:
+        """Finds an exclusion regex that matches a path
+
+        Args:
+            path (str): The path to check
+
+        Returns:
+            re.Pattern[str] | None: The exclusion regex that matched, or None if no exclusion matched the path
+        """
+        if self._combined is not None and self._combined.search(path) is None:
+            return None
+
+        return next((exclusion for exclusion in self.exclusions if exclusion.search(path) is not None), None)
+
+
+# Compiled exclusion matchers, keyed on the exclusions file path. The file modification time and size are stored
+# alongside the matcher so it is rebuilt when the file changes
+_exclusion_matchers: Dict[str, Tuple[int, int, ExclusionMatcher]] = {}
+
+
 class PathFilter:
     LINE_BY_LINE_FILE_EXTENSIONS = [".csv"]
 
-    def _is_path_excluded(self, path: str, exclusions: List[re.Pattern[str]]):
-        for exclusion in exclusions:
-            match = exclusion.search(path)
-            if match is not None:
-                logger.info("Path %s matches regex %s and should be excluded", path, exclusion)
-                return True
+    def _is_path_excluded(self, path: str, exclusions: ExclusionMatcher):
+        exclusion = exclusions.match(path)
+        if exclusion is not None:
+            logger.debug("Path %s matches regex %s and should be excluded", path, exclusion.pattern)
+            return True
 
         logger.debug("The path %s was not found in any exclusion regexes", path)
         return False
 
-    async def _check_is_path_invalid(self, path: str, exclusions: List[re.Pattern[str]]):
+    def _stat_path(self, path: str) -> os.stat_result | OSError | None:
+        try:
+            return os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        except OSError as exc:
+            # Returned rather than raised, so one path that cannot be read does not stop the rest of the scan
+            return exc
+
+    def _stat_paths(self, paths: List[str]) -> Dict[str, os.stat_result | OSError | None]:
+        """Runs a single stat for every path. This is blocking, so should be called on a worker thread, once for all the
+        paths in a scan rather than once per path
+
+        Args:
+            paths (List[str]): The paths to stat
+
+        Returns:
+            Dict[str, os.stat_result | OSError | None]: The stat result for each path, None if the path does not exist,
+            or the error if the path could not be stat'd
+        """
+        return {path: self._stat_path(path) for path in paths}
+
+    def _check_is_path_invalid(self, path: str, exclusions: ExclusionMatcher, path_stat: os.stat_result | OSError | None):
         if self._is_path_excluded(path, exclusions):
             return PathScanStatus.EXCLUDED
 
-        if not await Path(path).exists():
+        if path_stat is None:
             logger.debug("Path %s does not exist", path)
             return PathScanStatus.SKIPPED
 
-        if not await Path(path).is_file():
+        if isinstance(path_stat, OSError):
+            if path_stat.errno == errno.ELOOP:
+                logger.debug("Path %s is a symlink loop, there is no file to scan", path)
+                return PathScanStatus.SKIPPED
+            logger.warning("Path %s could not be checked: %s", path, path_stat)
+            return PathScanStatus.ERRORED
+
+        if not stat.S_ISREG(path_stat.st_mode):
             logger.debug("Path %s is a directory, presidio can only scan files", path)
             return PathScanStatus.SKIPPED
 
+        return self._check_file_type(path)
+
+    def _check_is_staged_path_invalid(self, path: str, exclusions: ExclusionMatcher):
+        """Checks a path that is staged as a regular file. Its staged contents are scanned, so the working tree is not
+        checked, and a path that has since been changed or deleted in the working tree is still scanned
+
+        Args:
+            path (str): The path to check
+            exclusions (ExclusionMatcher): The paths that should not be scanned
+
+        Returns:
+            PathScanStatus | None: The reason the path should not be scanned, or None if it should be scanned
+        """
+        if self._is_path_excluded(path, exclusions):
+            return PathScanStatus.EXCLUDED
+
+        return self._check_file_type(path)
+
+    def _check_file_type(self, path: str):
         file_extension = Path(path).suffix
         if file_extension in EXCLUDED_PERSONAL_DATA_FILE_TYPES:
             logger.debug(
@@ -68,15 +168,43 @@ class PathFilter:
             logger.debug("The exclusions file %s is not present", exclusions_file)
             return exclusions
 
-        async with await open_file(exclusions_file) as f:
-            async for exclusion_regex in f:
-                try:
-                    regex = re.compile(exclusion_regex.rstrip())
-                    exclusions.append(regex)
-
-                except re.error:
-                    logger.error(
-                        "The regex %s in file %s could not be compiled into a valid regex", exclusion_regex, exclusions_file
-                    )
-                    raise
+        with profile_span("presidio.get_exclusions", exclusions_file=exclusions_file) as span:
+            async with await open_file(exclusions_file) as f:
+                async for exclusion_regex in f:
+                    try:
+                        regex = re.compile(exclusion_regex.rstrip())
+                        exclusions.append(regex)
+
+                    except re.error:
+                        logger.error(
+                            "The regex %s in file %s could not be compiled into a valid regex",
+                            exclusion_regex,
+                            exclusions_file,
+                        )
+                        raise
+            span["exclusions"] = len(exclusions)
         return exclusions
+
+    async def _get_exclusion_matcher(self, exclusions_file: str) -> ExclusionMatcher:
+        """Gets the compiled matcher for an exclusions file, only reading the file again when it has changed
+
+        Args:
+            exclusions_file (str): The path to the exclusions file
+
+        Returns:
+            ExclusionMatcher: A matcher for every regex in the exclusions file
+        """
+        exclusions_path = Path(exclusions_file)
+        if not await exclusions_path.exists():
+            _exclusion_matchers.pop(exclusions_file, None)
+            return ExclusionMatcher(await self._get_exclusions(exclusions_file))
+
+        stat = await exclusions_path.stat()
+        cached = _exclusion_matchers.get(exclusions_file)
+        if cached is not None and cached[:2] == (stat.st_mtime_ns, stat.st_size):
+            logger.debug("Using the cached exclusions for %s", exclusions_file)
+            return cached[2]
+
+        matcher = ExclusionMatcher(await self._get_exclusions(exclusions_file))
+        _exclusion_matchers[exclusions_file] = (stat.st_mtime_ns, stat.st_size, matcher)
+        return matcher
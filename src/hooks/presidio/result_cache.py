@@ -0,0 +1,174 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path
+from typing import Any, Dict, List
+
+from src.hooks.cache_directory import create_cache_directory
+from src.hooks.config import (
+    DEFAULT_CACHE_DIRECTORY,
+    ENGINE_CONFIG_FILE,
+    LOGGER,
+    NLP_CONFIG_FILE,
+    PRESIDIO_CACHE_FILE,
+    PRESIDIO_CACHE_MAX_ENTRIES,
+    PRESIDIO_LINE_BATCH_SIZE,
+    PRESIDIO_WINDOW_OVERLAP,
+    PRESIDIO_WINDOW_SIZE,
+    RECOGNIZER_CONFIG_FILE,
+)
+
+logger = LOGGER
+
+
+class PresidioResultCache:
+    """
+
+    An on disk cache of personal data scan results, keyed on the sha256 of a file's contents, how the file was scanned
+    and a fingerprint of the presidio configuration. Entries are evicted least recently used first once the cache holds
+    more than max_entries.
+
+    Reads are served straight from sqlite, while writes and last used updates are buffered in memory and written in a
+    single transaction by flush(). Both block on sqlite, which waits for any other hook writing to the cache, so they are
+    called from worker threads, never the event loop. Any error using the cache disables it for the rest of the scan, and every path is
+    scanned as if nothing was cached.
+
+    """
+
+    def __init__(
+        self,
+        cache_directory: str = DEFAULT_CACHE_DIRECTORY,
+        max_entries: int = PRESIDIO_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.cache_file = Path(cache_directory, PRESIDIO_CACHE_FILE)
+        self.max_entries = max_entries
+        self.fingerprint = self.get_config_fingerprint()
+        self.hits = 0
+        self._connection: sqlite3.Connection | None = None
+        self._disabled = False
+        self._pending_writes: Dict[str, str] = {}
+        self._pending_reads: Dict[str, float] = {}
+        # Reads from several worker threads at once share the one connection
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def get_config_fingerprint() -> str:
+        """Creates a fingerprint of everything that can change the results of a scan of the same file contents
+
+        Returns:
+            str: A sha256 hex digest of the presidio config files, the window and line batch sizes, and the installed
+            presidio version
+        """
+        fingerprint = hashlib.sha256()
+        base_path = Path(__file__).parent
+        for config_file in [ENGINE_CONFIG_FILE, NLP_CONFIG_FILE, RECOGNIZER_CONFIG_FILE]:
+            fingerprint.update(Path(base_path, config_file).read_bytes())
+        # Where windows and line batches start changes the offsets and line numbers of detections
+        fingerprint.update(f"{PRESIDIO_WINDOW_SIZE}:{PRESIDIO_WINDOW_OVERLAP}:{PRESIDIO_LINE_BATCH_SIZE}".encode())
+
+        try:
+            fingerprint.update(version("presidio-analyzer").encode())
+        except PackageNotFoundError:
+            logger.debug("Could not find the installed presidio-analyzer version")
+
+        return fingerprint.hexdigest()
+
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        with open(file_path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+    @staticmethod
+    def hash_bytes(contents: bytes) -> str:
+        return hashlib.sha256(contents).hexdigest()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            create_cache_directory(self.cache_file.parent)
+            # The connection is used from whichever worker thread is reading or flushing the cache
+            self._connection = sqlite3.connect(self.cache_file, timeout=5, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, detections TEXT NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        return self._connection
+
+    def _disable(self, exc: Exception):
+        logger.debug("The personal data scan cache %s is not available: %s", self.cache_file, exc)
+        self._disabled = True
+
+    def _get_key(self, content_hash: str, scan_mode: str) -> str:
+        return f"{content_hash}:{scan_mode}:{self.fingerprint}"
+
+    def get(self, content_hash: str, scan_mode: str) -> List[Dict[str, Any]] | None:
+        """Gets the cached detections for a file
+
+        Args:
+            content_hash (str): The sha256 of the file contents
+            scan_mode (str): How the file is scanned, PRESIDIO_SCAN_MODE_LINES or PRESIDIO_SCAN_MODE_WINDOWS
+
+        Returns:
+            List[Dict[str, Any]] | None: The cached detections, or None if this content has not been scanned
+        """
+        if self._disabled:
+            return None
+
+        key = self._get_key(content_hash, scan_mode)
+        with self._lock:
+            try:
+                row = self._get_connection().execute("SELECT detections FROM results WHERE key = ?", (key,)).fetchone()
+            except (sqlite3.Error, OSError) as exc:
+                self._disable(exc)
+                return None
+
+            if row is None:
+                return None
+
+            self.hits += 1
+            self._pending_reads[key] = time.time()
+        return json.loads(row[0])
+
+    def set(self, content_hash: str, scan_mode: str, detections: List[Dict[str, Any]]):
+        if self._disabled:
+            return
+
+        self._pending_writes[self._get_key(content_hash, scan_mode)] = json.dumps(detections)
+
+    def flush(self):
+        """Writes any new results and last used times to disk, then evicts the least recently used entries"""
+        with self._lock:
+            if self._disabled or (not self._pending_writes and not self._pending_reads):
+                return
+
+            now = time.time()
+            try:
+                with self._get_connection() as connection:
+                    connection.executemany(
+                        "UPDATE results SET last_used = ? WHERE key = ?",
+                        [(last_used, key) for key, last_used in self._pending_reads.items()],
+                    )
+                    connection.executemany(
+                        "INSERT OR REPLACE INTO results (key, detections, last_used) VALUES (?, ?, ?)",
+                        [(key, detections, now) for key, detections in self._pending_writes.items()],
+                    )
+                    connection.execute(
+                        "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+                logger.debug(
+                    "Saved %s new results to the personal data scan cache %s", len(self._pending_writes), self.cache_file
+                )
+            except (sqlite3.Error, OSError) as exc:
+                self._disable(exc)
+            finally:
+                self._pending_writes = {}
+                self._pending_reads = {}
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
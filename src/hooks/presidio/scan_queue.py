@@ -0,0 +1,221 @@
+import asyncio
+import time
+
+from anyio import CapacityLimiter, to_thread
+from collections import deque
+from presidio_analyzer import AnalyzerEngine
+from typing import Any, Callable, Deque, Dict, List, Set, Tuple
+
+from src.hooks.config import PRESIDIO_MAX_ABANDONED_ANALYSES
+
+
+class MemoryReservation:
+    """
+
+    Bytes reserved from a MemoryBudget, given back once every holder has released the reservation. The path that made
+    the reservation is the first holder, and each analysis of its contents holds it too, so the bytes stay reserved
+    while an analysis abandoned by a path that ran out of time is still running.
+
+    """
+
+    def __init__(self, budget: "MemoryBudget", size: int) -> None:
+        self.budget = budget
+        self.size = size
+        self._holders = 1
+
+    def hold(self):
+        self._holders += 1
+
+    def release(self):
+        self._holders -= 1
+        if self._holders == 0:
+            self.budget._give_back(self.size)
+
+    async def __aenter__(self) -> "MemoryReservation":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.release()
+
+
+class MemoryBudget:
+    """
+
+    Limits the bytes of file contents the personal data scan holds in memory at once. Each scan reserves the bytes it
+    will read before it reads them, and waits while the rest of the budget is reserved by other scans. Waiting scans are
+    given their reservation in the order they asked for it, so a large file is not held back forever by smaller ones. A
+    file larger than the whole budget reserves all of it, so it is scanned on its own rather than never being scanned.
+
+    """
+
+    def __init__(self, total_bytes: int) -> None:
+        self.total_bytes = total_bytes
+        self.available_bytes = total_bytes
+        self.max_reserved_bytes = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    async def reserve(self, size: int) -> MemoryReservation:
+        """Reserves part of the budget, use the reservation as a context manager to release it when the context exits
+
+        Args:
+            size (int): The number of bytes to reserve
+
+        Returns:
+            MemoryReservation: The reservation
+        """
+        size = min(max(size, 0), self.total_bytes)
+        if self._waiters or self.available_bytes < size:
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append((size, waiter))
+            try:
+                await waiter
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    # The reservation was given just as this scan was cancelled, hand it on to the next waiter
+                    self.available_bytes += size
+                waiter.cancel()
+                self._wake_waiters()
+                raise
+        else:
+            self._take(size)
+
+        return MemoryReservation(self, size)
+
+    def _take(self, size: int):
+        self.available_bytes -= size
+        self.max_reserved_bytes = max(self.max_reserved_bytes, self.total_bytes - self.available_bytes)
+
+    def _give_back(self, size: int):
+        self.available_bytes += size
+        self._wake_waiters()
+
+    def _wake_waiters(self):
+        while self._waiters:
+            size, waiter = self._waiters[0]
+            if waiter.done():
+                self._waiters.popleft()
+                continue
+            if self.available_bytes < size:
+                return
+            self._waiters.popleft()
+            self._take(size)
+            waiter.set_result(None)
+
+
+class AnalyzerPool:
+    """
+
+    The analyzers used by a personal data scan that analyzes paths on worker threads. An analyzer is not thread safe, so
+    each analysis borrows one for as long as its thread runs, and only one analysis runs at a time.
+
+    The thread of a path that runs out of time can not be stopped, so the analyzer it borrowed stays busy until the
+    analysis finishes. Abandoning the analysis lets one more analysis run at once, with a new analyzer built when it is
+    first needed, so the other paths keep scanning. Once max_abandoned abandoned analyses are still running, the
+    remaining paths wait for one of them to finish instead.
+
+    """
+
+    def __init__(
+        self,
+        analyzer: AnalyzerEngine,
+        create_analyzer: Callable[[], AnalyzerEngine],
+        max_abandoned: int = PRESIDIO_MAX_ABANDONED_ANALYSES,
+    ) -> None:
+        self.create_analyzer = create_analyzer
+        self.max_abandoned = max_abandoned
+        self._analyzers: List[AnalyzerEngine] = [analyzer]
+        self._limiter = CapacityLimiter(1)
+        self._abandoned: Set[object] = set()
+
+    @property
+    def abandoned(self) -> int:
+        return len(self._abandoned)
+
+    async def acquire(self, borrower: object) -> AnalyzerEngine:
+        """Waits for an analyzer that is not being used by another analysis
+
+        Args:
+            borrower (object): Identifies the analysis, pass the same borrower to release() and abandon()
+
+        Returns:
+            AnalyzerEngine: The analyzer, which must be released once the analysis has finished
+        """
+        await self._limiter.acquire_on_behalf_of(borrower)
+        if self._analyzers:
+            return self._analyzers.pop()
+
+        try:
+            # Every analyzer is still being used by an abandoned analysis. Building the analyzer is blocking, so it is
+            # done on a worker thread
+            return await to_thread.run_sync(self.create_analyzer)
+        except BaseException:
+            self._limiter.release_on_behalf_of(borrower)
+            raise
+
+    def release(self, borrower: object, analyzer: AnalyzerEngine):
+        """Returns an analyzer once the analysis using it has finished, whether or not it was abandoned
+
+        Args:
+            borrower (object): The borrower passed to acquire()
+            analyzer (AnalyzerEngine): The analyzer returned by acquire()
+        """
+        if borrower in self._abandoned:
+            self._abandoned.remove(borrower)
+            self._limiter.total_tokens -= 1
+
+        # Every other borrower is using an analyzer, only keep as many analyzers as analyses that can run at once, e.g.
+        # an abandoned analysis that finishes after a new analyzer has taken its place does not keep its analyzer
+        if len(self._analyzers) + self._limiter.borrowed_tokens - 1 < self._limiter.total_tokens:
+            self._analyzers.append(analyzer)
+        self._limiter.release_on_behalf_of(borrower)
+
+    def abandon(self, borrower: object):
+        """Lets another analysis start while an abandoned analysis keeps running, unless max_abandoned abandoned
+        analyses are already running
+
+        Args:
+            borrower (object): The borrower passed to acquire()
+        """
+        if borrower not in self._limiter.statistics().borrowers or borrower in self._abandoned:
+            # The analysis had already finished
+            return
+        if len(self._abandoned) >= self.max_abandoned:
+            return
+
+        self._abandoned.add(borrower)
+        self._limiter.total_tokens += 1
+
+
+class ScanQueueStats:
+    """
+
+    The queue depth and throughput of the personal data scan queue, logged when the scan finishes and added to the
+    presidio.scan_queue span of the --profile report
+
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.queued_paths = 0
+        self.scanned_paths = 0
+        self.scanned_bytes = 0
+        self.max_queue_depth = 0
+
+    def path_queued(self, queue_depth: int):
+        self.queued_paths += 1
+        self.max_queue_depth = max(self.max_queue_depth, queue_depth)
+
+    def path_scanned(self, size: int):
+        self.scanned_paths += 1
+        self.scanned_bytes += size
+
+    def to_dict(self) -> Dict[str, Any]:
+        seconds = time.perf_counter() - self.started
+        return {
+            "queued_paths": self.queued_paths,
+            "scanned_paths": self.scanned_paths,
+            "scanned_bytes": self.scanned_bytes,
+            "max_queue_depth": self.max_queue_depth,
+            "paths_per_second": round(self.scanned_paths / seconds, 2) if seconds else None,
+            "bytes_per_second": round(self.scanned_bytes / seconds) if seconds else None,
+        }
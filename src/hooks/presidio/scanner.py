@@ -1,13 +1,22 @@
 import asyncio
+import bisect
+import contextvars
 import json
+import multiprocessing
+import os
 import re
+import threading
+import time
 
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from io import StringIO
-from anyio import open_file
+from anyio import AsyncFile, open_file, to_thread
 from pathlib import Path
-from typing import List
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, List, Tuple
 
-from presidio_analyzer import AnalyzerEngine, RecognizerResult, AnalyzerEngineProvider
+from presidio_analyzer import AnalyzerEngine, BatchAnalyzerEngine, RecognizerResult, AnalyzerEngineProvider
 from prettytable import PrettyTable
 
 from src.hooks.config import (
@@ -15,21 +24,138 @@ from src.hooks.config import (
     DEFAULT_LANGUAGE_CODE,
     LOGGER,
     NLP_CONFIG_FILE,
+    NLP_RECOGNIZER_NAMES,
+    PRESIDIO_ENGINE_SNAPSHOT_PATH,
     PRESIDIO_EXCLUSIONS_FILE_PATH,
+    PRESIDIO_LINE_BATCH_SIZE,
+    PRESIDIO_MAX_IN_FLIGHT_PATHS,
+    PRESIDIO_MEMORY_BUDGET_BYTES,
+    PRESIDIO_PATH_TIMEOUT_SECONDS,
+    PRESIDIO_SCAN_MODE_LINES,
+    PRESIDIO_SCAN_MODE_WINDOWS,
+    PRESIDIO_SCAN_TIMEOUT_SECONDS,
+    PRESIDIO_PATH_BATCH_SIZE,
+    PRESIDIO_WINDOW_OVERLAP,
+    PRESIDIO_WINDOW_SIZE,
+    PROFILE_PATH_SPAN,
     RECOGNIZER_CONFIG_FILE,
 )
-from src.hooks.presidio.path_filter import PathFilter, PathScanStatus
+from src.hooks.git_files import StagedFile, StagedFiles
+from src.hooks.hook_settings import load_yaml
+from src.hooks.presidio.engine_snapshot import EngineSnapshot
+from src.hooks.presidio.nlp_engine import TokenizerOnlyAnalyzerEngineProvider
+from src.hooks.presidio.path_filter import ExclusionMatcher, PathFilter, PathScanStatus
+from src.hooks.presidio.result_cache import PresidioResultCache
+from src.hooks.presidio.scan_queue import AnalyzerPool, MemoryBudget, MemoryReservation, ScanQueueStats
+from src.hooks.profiler import profile_span
 
 logger = LOGGER
 
+# The timeout of the path being scanned by the current task, see PresidioScanner._scan_path
+_path_deadline: ContextVar[asyncio.Timeout | None] = ContextVar("path_deadline", default=None)
+# The memory reserved for the contents of the path being scanned by the current task, see PresidioScanner._reserve_memory
+_memory_reservation: ContextVar[MemoryReservation | None] = ContextVar("memory_reservation", default=None)
+
+# Each process pool worker builds its own analyzer once, in _init_worker, and reuses it for every file it is sent
+_worker_analyzer: AnalyzerEngine | None = None
+_worker_entities: List[str] | None = None
+
+
+def _init_worker():
+    global _worker_analyzer, _worker_entities
+    _worker_analyzer = PresidioScanner()._get_analyzer()
+    _worker_entities = _worker_analyzer.get_supported_entities()
+
+
+def _scan_content_in_worker(content: str):
+    return PresidioScanner()._scan_content(_worker_analyzer, _worker_entities, content)  # type: ignore
+
+
+def _set_future_result(future: asyncio.Future, result: Any, exc: BaseException | None, on_finished: Callable[[], None]):
+    on_finished()
+    if future.done():
+        return
+    if exc is not None:
+        future.set_exception(exc)
+    else:
+        future.set_result(result)
+
+
+def _call_soon_threadsafe(loop: asyncio.AbstractEventLoop, callback: Callable[[], None]):
+    try:
+        loop.call_soon_threadsafe(callback)
+    except RuntimeError:
+        # The event loop has already closed, nothing is waiting for the result of abandoned work
+        pass
+
+
+async def _run_in_daemon_thread(func, *args, on_finished: Callable[[], None] = lambda: None) -> Any:
+    """Runs a function in a new daemon thread. Unlike to_thread.run_sync, if the caller is cancelled, e.g. because a path
+    ran out of time, it returns straight away. The thread is abandoned and keeps running until the function returns,
+    as python can not stop it, but it does not stop the hook from exiting
+
+    Args:
+        on_finished (Callable[[], None], optional): Called on the event loop once the function returns, even if the
+        caller was cancelled. Defaults to doing nothing.
+
+    Returns:
+        Any: The value returned by the function
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    context = contextvars.copy_context()
+
+    def run():
+        result, exc = None, None
+        try:
+            result = context.run(func, *args)
+        except BaseException as e:
+            exc = e
+        try:
+            loop.call_soon_threadsafe(_set_future_result, future, result, exc, on_finished)
+        except RuntimeError:
+            # The event loop has already closed, nothing is waiting for the result of abandoned work
+            pass
+
+    threading.Thread(target=run, name="presidio-analysis", daemon=True).start()
+    return await future
+
+
+def _scan_lines_in_worker(lines: List[str], first_line_number: int):
+    return PresidioScanner()._scan_lines(_worker_analyzer, _worker_entities, lines, first_line_number)  # type: ignore
+
 
 class PersonalDataDetection:
-    def __init__(self, result: RecognizerResult, text_value: str | None = None) -> None:
+    def __init__(
+        self,
+        result: RecognizerResult,
+        text_value: str | None = None,
+        line_number: int | None = None,
+    ) -> None:
         self.result = result
         self.text_value = text_value
+        self.line_number = line_number
 
     def __repr__(self) -> str:
-        return json.dumps({"type": self.result.entity_type, "value": self.text_value})
+        return json.dumps({"type": self.result.entity_type, "value": self.text_value, "line": self.line_number})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "entity_type": self.result.entity_type,
+            "start": self.result.start,
+            "end": self.result.end,
+            "score": self.result.score,
+            "text_value": self.text_value,
+            "line_number": self.line_number,
+        }
+
+    @staticmethod
+    def from_dict(detection: Dict[str, Any]) -> "PersonalDataDetection":
+        return PersonalDataDetection(
+            RecognizerResult(detection["entity_type"], detection["start"], detection["end"], detection["score"]),
+            detection["text_value"],
+            line_number=detection["line_number"],
+        )
 
 
 class PathScanResult:
@@ -39,11 +165,32 @@ class PathScanResult:
         status: PathScanStatus,
         results: List[PersonalDataDetection] | None = None,
         additional_detail: str | None = None,
+        cached: bool = False,
     ) -> None:
         self.path = path
         self.status = status
         self.results = results if results else []
         self.additional_detail = additional_detail
+        self.cached = cached
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "status": self.status.name,
+            "results": [detection.to_dict() for detection in self.results],
+            "additional_detail": self.additional_detail,
+            "cached": self.cached,
+        }
+
+    @staticmethod
+    def from_dict(scan_result: Dict[str, Any]) -> "PathScanResult":
+        return PathScanResult(
+            scan_result["path"],
+            PathScanStatus[scan_result["status"]],
+            results=[PersonalDataDetection.from_dict(detection) for detection in scan_result["results"]],
+            additional_detail=scan_result["additional_detail"],
+            cached=scan_result["cached"],
+        )
 
 
 class PresidioScanResult:
@@ -53,13 +200,31 @@ class PresidioScanResult:
         self.paths_skipped: List[PathScanResult] = []
         self.paths_excluded: List[PathScanResult] = []
         self.paths_errored: List[PathScanResult] = []
+        self.paths_from_cache = 0
         self.add_path_scan_results(results)
 
+    def to_dict(self) -> Dict[str, Any]:
+        scan_results = (
+            self.paths_excluded
+            + self.paths_skipped
+            + self.paths_without_personal_data
+            + self.paths_containing_personal_data
+            + self.paths_errored
+        )
+        return {"results": [scan_result.to_dict() for scan_result in scan_results]}
+
+    @staticmethod
+    def from_dict(result: Dict[str, Any]) -> "PresidioScanResult":
+        return PresidioScanResult([PathScanResult.from_dict(scan_result) for scan_result in result["results"]])
+
     def add_path_scan_results(self, scan_results: List[PathScanResult]):
         for scan_result in scan_results:
             self.add_path_scan_result(scan_result)
 
     def add_path_scan_result(self, scan_result: PathScanResult):
+        if scan_result.cached:
+            self.paths_from_cache += 1
+
         if scan_result.status == PathScanStatus.EXCLUDED:
             self.paths_excluded.append(scan_result)
 
@@ -99,6 +264,12 @@ class PresidioScanResult:
                     paths_without_issues_table.add_row([valid_path.path])
                 output_buffer.write(str(paths_without_issues_table))
 
+            if self.paths_from_cache:
+                paths_scanned = len(self.paths_without_personal_data) + len(self.paths_containing_personal_data)
+                output_buffer.write(
+                    f"\n\nRESULTS FOR {self.paths_from_cache} OF {paths_scanned} SCANNED FILES WERE LOADED FROM THE CACHE"
+                )
+
             if self.paths_errored:
                 output_buffer.write("\n\nFILES ERRORED\n")
                 errored_paths_table = PrettyTable(["Path", "Reason"])
@@ -111,10 +282,11 @@ class PresidioScanResult:
 
                 for invalid_path_scan in self.paths_containing_personal_data:
                     output_buffer.write(f"\n{invalid_path_scan.path}\n")
-                    table = PrettyTable(["Type", "Value", "Score"])
+                    table = PrettyTable(["Line", "Type", "Value", "Score"])
                     for invalid_path in invalid_path_scan.results:
                         table.add_row(
                             [
+                                invalid_path.line_number,
                                 invalid_path.result.entity_type,
                                 invalid_path.text_value,
                                 invalid_path.result.score,
@@ -130,24 +302,94 @@ class PresidioScanResult:
 
 class PresidioScanner:
     LINE_BY_LINE_FILE_EXTENSIONS = [".csv"]
+    WHITESPACE_PATTERN = re.compile(r"\s")
 
     def __init__(
         self,
         verbose: bool = False,
-        paths: List[str] | None = None,
+        paths: List[str] | AsyncIterable[str] | None = None,
+        jobs: int = 1,
+        cache: PresidioResultCache | None = None,
+        staged_files: StagedFiles | None = None,
+        analyzer: AnalyzerEngine | None = None,
+        max_in_flight_paths: int = PRESIDIO_MAX_IN_FLIGHT_PATHS,
+        memory_budget: int = PRESIDIO_MEMORY_BUDGET_BYTES,
+        path_timeout: float = PRESIDIO_PATH_TIMEOUT_SECONDS,
+        scan_timeout: float = PRESIDIO_SCAN_TIMEOUT_SECONDS,
     ) -> None:
         self.verbose = verbose
         self.paths = paths if paths else []
+        self.jobs = jobs
+        self.cache = cache
+        self.staged_files = staged_files
+        self.analyzer = analyzer
+        self._staged_scans: Dict[Tuple[str, str], asyncio.Future] = {}
+        self._executor: Executor | None = None
+        self._analyzer_pool: AnalyzerPool | None = None
+        self.max_in_flight_paths = max_in_flight_paths
+        self._memory_budget = MemoryBudget(memory_budget)
+        self.path_timeout = path_timeout
+        self.scan_timeout = scan_timeout
+        # Set once a path runs out of time, the analysis it started may still be running
+        self._abandoned_analysis = False
+
+    def _requires_nlp_model(self, recognizer_config_file: Path) -> bool:
+        """Checks whether the recognizer config needs a trained NLP model. Presidio adds a default SpacyRecognizer to a
+        config that does not list one, so the model is only not needed when the config lists its NLP recognizers and
+        every one of them is disabled with enabled: false
+
+        Args:
+            recognizer_config_file (Path): The recognizer registry yaml file
+
+        Returns:
+            bool: True unless every NLP recognizer is explicitly disabled
+        """
+        with open(recognizer_config_file, encoding="utf-8") as f:
+            recognizer_config = load_yaml(f.read()) or {}
+
+        nlp_recognizers = [
+            recognizer
+            for recognizer in recognizer_config.get("recognizers", [])
+            if recognizer.get("name") in NLP_RECOGNIZER_NAMES
+        ]
+        if not nlp_recognizers:
+            return True
+        return any(recognizer.get("enabled", True) is not False for recognizer in nlp_recognizers)
 
     def _get_analyzer(self) -> AnalyzerEngine:
+        """Loads the analyzer from the engine snapshot if one is configured and up to date, otherwise builds it from
+        the yaml config files
+
+        Returns:
+            AnalyzerEngine: The analyzer
+        """
+        with profile_span("presidio.get_analyzer") as span:
+            if PRESIDIO_ENGINE_SNAPSHOT_PATH:
+                analyzer = EngineSnapshot(PRESIDIO_ENGINE_SNAPSHOT_PATH).load()
+                span["snapshot"] = analyzer is not None
+                if analyzer:
+                    return analyzer
+                logger.debug("Building the presidio analyzer from the yaml config files instead of the engine snapshot")
+
+            return self._create_analyzer()
+
+    def _create_analyzer(self) -> AnalyzerEngine:
         # Set up the engine, loads the NLP module (spaCy model by default)
         # and other PII recognizers
         # Create configuration containing engine name and models
         base_path = Path(__file__).parent
-        provider = AnalyzerEngineProvider(
+        recognizer_config_file = Path.joinpath(base_path, RECOGNIZER_CONFIG_FILE)
+
+        provider_cls = AnalyzerEngineProvider
+        if not self._requires_nlp_model(recognizer_config_file):
+            # Every enabled recognizer is pattern based, so there is no need to load the spaCy model or run NER
+            logger.debug("No NLP recognizers are enabled, using the tokenizer only NLP engine")
+            provider_cls = TokenizerOnlyAnalyzerEngineProvider
+
+        provider = provider_cls(
             analyzer_engine_conf_file=Path.joinpath(base_path, ENGINE_CONFIG_FILE),
             nlp_engine_conf_file=Path.joinpath(base_path, NLP_CONFIG_FILE),
-            recognizer_registry_conf_file=Path.joinpath(base_path, RECOGNIZER_CONFIG_FILE),
+            recognizer_registry_conf_file=recognizer_config_file,
         )
         analyzer = provider.create_engine()
 
@@ -159,58 +401,608 @@ class PresidioScanner:
             language=DEFAULT_LANGUAGE_CODE,
             entities=entities,
         )
-        if results:
-            logger.debug("Found presidio results %s", results)
-        return [PersonalDataDetection(result, content[result.start : result.end]) for result in results]
+        if not results:
+            return []
+
+        logger.debug("Found presidio results %s", results)
+        # A match can start on the newline before the value, so count newlines up to and including the start offset
+        newline_offsets = [match.start() for match in re.finditer("\n", content)]
+        return [
+            PersonalDataDetection(
+                result,
+                content[result.start : result.end],
+                line_number=bisect.bisect_right(newline_offsets, result.start) + 1,
+            )
+            for result in results
+        ]
+
+    def _scan_lines(self, analyzer: AnalyzerEngine, entities: List[str], lines: List[str], first_line_number: int):
+        # The batch analyzer runs the NLP pipeline over every line in one pass, instead of once per analyze() call
+        batch_results = BatchAnalyzerEngine(analyzer).analyze_iterator(
+            texts=lines,
+            language=DEFAULT_LANGUAGE_CODE,
+            batch_size=len(lines),
+            entities=entities,
+        )
+
+        detections = []
+        for line_index, (line, results) in enumerate(zip(lines, batch_results)):
+            if results:
+                logger.debug("Found presidio results %s", results)
+            detections.extend(
+                PersonalDataDetection(result, line[result.start : result.end], line_number=first_line_number + line_index)
+                for result in results
+            )
+        return detections
+
+    @asynccontextmanager
+    async def _pause_deadline(self) -> AsyncIterator[None]:
+        """Pauses the path timeout while waiting for something shared by every path, such as the analyzer pool or the
+        memory budget, so a path is not timed out for waiting behind a slower path"""
+        deadline = _path_deadline.get()
+        when = deadline.when() if deadline and not deadline.expired() else None
+        if when is None:
+            yield
+            return
+
+        loop = asyncio.get_running_loop()
+        waiting_since = loop.time()
+        deadline.reschedule(None)  # type: ignore
+        try:
+            yield
+        finally:
+            deadline.reschedule(when + loop.time() - waiting_since)  # type: ignore
+
+    @asynccontextmanager
+    async def _reserve_memory(self, memory_needed: int) -> AsyncIterator[None]:
+        """Reserves memory for the contents of the path being scanned. Analysis started by the path holds the reservation
+        too, see _hold_until_finished
+
+        Args:
+            memory_needed (int): The bytes to reserve, see _get_memory_needed
+        """
+        async with self._pause_deadline():
+            reservation = await self._memory_budget.reserve(memory_needed)
+        async with reservation:
+            token = _memory_reservation.set(reservation)
+            try:
+                yield
+            finally:
+                _memory_reservation.reset(token)
+
+    def _hold_until_finished(self, release_analyzer: Callable[[], None]) -> Callable[[], None]:
+        """Holds the memory reserved for the path being scanned until an analysis finishes. Once a path runs out of time
+        its analysis is abandoned but keeps running, and the analyzer and memory it is using are not free until it ends
+
+        Args:
+            release_analyzer (Callable[[], None]): Releases the analyzer the analysis is using
+
+        Returns:
+            Callable[[], None]: Releases the analyzer and the memory, to be called once the analysis has finished
+        """
+        reservation = _memory_reservation.get()
+        if reservation:
+            reservation.hold()
+
+        def release():
+            release_analyzer()
+            if reservation:
+                reservation.release()
+
+        return release
+
+    async def _run_analysis(self, scan_func, worker_func, analyzer: AnalyzerEngine, entities: List[str], *args):
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            # Analysis is CPU bound, run it on a worker thread so the event loop can keep the security scan running. If
+            # the path runs out of time the thread is abandoned, and the pool gives the other paths a new analyzer
+            pool = self._analyzer_pool
+            borrower = object()
+            if pool:
+                async with self._pause_deadline():
+                    analyzer = await pool.acquire(borrower)
+            on_finished = self._hold_until_finished(lambda: pool.release(borrower, analyzer) if pool else None)
+            try:
+                return await _run_in_daemon_thread(scan_func, analyzer, entities, *args, on_finished=on_finished)
+            except asyncio.CancelledError:
+                if pool:
+                    pool.abandon(borrower)
+                raise
+
+        # The analyzer and entities live in the worker process, see _init_worker. The executor only runs as many
+        # analyses at once as it has workers, an abandoned analysis keeps its worker until it finishes
+        on_finished = self._hold_until_finished(lambda: None)
+        future = self._executor.submit(worker_func, *args)
+        future.add_done_callback(lambda _: _call_soon_threadsafe(loop, on_finished))
+        return await asyncio.wrap_future(future)
+
+    async def _analyze_content(self, analyzer: AnalyzerEngine, entities: List[str], content: str):
+        return await self._run_analysis(self._scan_content, _scan_content_in_worker, analyzer, entities, content)
+
+    async def _analyze_lines(self, analyzer: AnalyzerEngine, entities: List[str], lines: List[str], first_line_number: int):
+        return await self._run_analysis(
+            self._scan_lines, _scan_lines_in_worker, analyzer, entities, lines, first_line_number
+        )
+
+    def _merge_detections(self, detections: List[PersonalDataDetection]) -> List[PersonalDataDetection]:
+        """Removes duplicate detections of the same entity at the same position, keeping the highest score
+
+        Args:
+            detections (List[PersonalDataDetection]): The detections found across every window of a file
+
+        Returns:
+            List[PersonalDataDetection]: The detections, ordered by their position in the file
+        """
+        merged: Dict[tuple, PersonalDataDetection] = {}
+        for detection in detections:
+            key = (detection.result.entity_type, detection.result.start, detection.result.end)
+            if key not in merged or detection.result.score > merged[key].result.score:
+                merged[key] = detection
+        return sorted(merged.values(), key=lambda detection: (detection.result.start, detection.result.end))
+
+    async def _scan_windows(
+        self, analyzer: AnalyzerEngine, entities: List[str], fs: AsyncFile[str]
+    ) -> List[PersonalDataDetection]:
+        """Analyzes a file in overlapping windows of at most PRESIDIO_WINDOW_SIZE characters, so memory use does not
+        grow with the size of the file
+
+        Each window ends on a line break where possible, and up to the last PRESIDIO_WINDOW_OVERLAP characters of a
+        window are analyzed again at the start of the next one. Detections are rebased to their offset and line in the
+        file.
+
+        Args:
+            analyzer (AnalyzerEngine): The analyzer to use
+            entities (List[str]): The entities to detect
+            fs (AsyncFile[str]): The open file to read from
+
+        Returns:
+            List[PersonalDataDetection]: The detections found in the file
+        """
+        detections: List[PersonalDataDetection] = []
+        buffer = ""
+        buffer_offset = 0
+        buffer_line_number = 1
+        while True:
+            chunk_size = PRESIDIO_WINDOW_SIZE - len(buffer)
+            chunk = await fs.read(chunk_size)
+            buffer += chunk
+            is_last_window = len(chunk) < chunk_size
+
+            window_end = len(buffer)
+            if not is_last_window:
+                # Only look for a line break in the second half of the window, so every window moves the scan forward
+                last_line_break = buffer.rfind("\n", len(buffer) // 2)
+                if last_line_break != -1:
+                    window_end = last_line_break + 1
+            next_window_start = len(buffer) if is_last_window else self._get_overlap_start(buffer, window_end)
+
+            for detection in await self._analyze_content(analyzer, entities, buffer[:window_end]):
+                # Anything starting in the overlap is analyzed again, with more of its surrounding text, in the next window
+                if detection.result.start >= next_window_start:
+                    continue
+                detection.result.start += buffer_offset
+                detection.result.end += buffer_offset
+                if detection.line_number is not None:
+                    detection.line_number += buffer_line_number - 1
+                detections.append(detection)
+
+            if is_last_window:
+                return self._merge_detections(detections)
+
+            buffer_offset += next_window_start
+            buffer_line_number += buffer.count("\n", 0, next_window_start)
+            buffer = buffer[next_window_start:]
+
+    def _get_overlap_start(self, buffer: str, window_end: int) -> int:
+        """Finds where the next window starts, within the last PRESIDIO_WINDOW_OVERLAP characters of this window
+
+        The overlap starts at the beginning of a line where possible, otherwise after whitespace, so the next window does
+        not start part way through a word and analyze the rest of that word as a false or partial match
+
+        Args:
+            buffer (str): The contents being scanned, starting at the current window
+            window_end (int): Where the current window ends in the buffer
+
+        Returns:
+            int: Where the next window starts in the buffer
+        """
+        overlap_start = max(window_end - PRESIDIO_WINDOW_OVERLAP, 1)
+        # The character ending the window is not searched, so the next window always includes some of this one
+        line_break = buffer.find("\n", overlap_start - 1, window_end - 1)
+        if line_break != -1:
+            return line_break + 1
+        whitespace = self.WHITESPACE_PATTERN.search(buffer, overlap_start - 1, window_end - 1)
+        if whitespace:
+            return whitespace.end()
+        return overlap_start
+
+    async def _scan_contents(
+        self, analyzer: AnalyzerEngine, entities: List[str], file_path: str, fs: AsyncFile[str] | StagedFile
+    ) -> List[PersonalDataDetection]:
+        results: List[PersonalDataDetection] = []
+        if self._get_scan_mode(file_path) == PRESIDIO_SCAN_MODE_LINES:
+            logger.debug("Scanning file %s line by line", file_path)
+            lines: List[str] = []
+            first_line_number = 1
+            async for line in fs:
+                lines.append(line.rstrip())
+                if len(lines) == PRESIDIO_LINE_BATCH_SIZE:
+                    results.extend(await self._analyze_lines(analyzer, entities, lines, first_line_number))
+                    first_line_number += len(lines)
+                    lines = []
+            if lines:
+                results.extend(await self._analyze_lines(analyzer, entities, lines, first_line_number))
+        else:
+            logger.debug("Scanning file %s in windows of %s characters", file_path, PRESIDIO_WINDOW_SIZE)
+            results.extend(await self._scan_windows(analyzer, entities, fs))
+        return results
+
+    def _get_scan_mode(self, file_path: str) -> str:
+        if Path(file_path).suffix.lower() in self.LINE_BY_LINE_FILE_EXTENSIONS:
+            return PRESIDIO_SCAN_MODE_LINES
+        return PRESIDIO_SCAN_MODE_WINDOWS
+
+    async def _get_cached_results(self, file_path: str, content_hash: str) -> List[PersonalDataDetection] | None:
+        # Reading the cache can wait on another hook writing to it, keep it off the event loop
+        cached_results = await to_thread.run_sync(self.cache.get, content_hash, self._get_scan_mode(file_path))  # type: ignore
+        if cached_results is None:
+            return None
+
+        logger.debug("File %s has not changed since it was last scanned, using the cached results", file_path)
+        return [PersonalDataDetection.from_dict(result) for result in cached_results]
+
+    def _get_memory_needed(self, file_path: str, file_size: int, whole_file: bool) -> int:
+        """Estimates the most bytes of a file held in memory while it is scanned
+
+        Args:
+            file_path (str): The path of the file
+            file_size (int): The size of the file in bytes
+            whole_file (bool): Whether the whole file is read into memory before it is scanned, as staged files are
+
+        Returns:
+            int: The bytes to reserve from the memory budget
+        """
+        if whole_file or self._get_scan_mode(file_path) == PRESIDIO_SCAN_MODE_LINES:
+            return file_size
+        # Other files are read one window at a time, see _scan_windows
+        return min(file_size, PRESIDIO_WINDOW_SIZE)
+
+    async def _scan_working_tree_file(
+        self, analyzer: AnalyzerEngine, entities: List[str], file_path: str, file_size: int = 0
+    ) -> Tuple[List[PersonalDataDetection], bool]:
+        content_hash = None
+        if self.cache:
+            content_hash = await to_thread.run_sync(self.cache.hash_file, file_path)
+            cached_results = await self._get_cached_results(file_path, content_hash)
+            if cached_results is not None:
+                return cached_results, True
+
+        memory_needed = self._get_memory_needed(file_path, file_size, whole_file=False)
+        async with self._reserve_memory(memory_needed):
+            async with await open_file(file_path, "r", encoding="utf-8") as fs:
+                results = await self._scan_contents(analyzer, entities, file_path, fs)
+
+        if self.cache and content_hash:
+            self.cache.set(content_hash, self._get_scan_mode(file_path), [result.to_dict() for result in results])
+        return results, False
+
+    async def _scan_staged_file(
+        self, analyzer: AnalyzerEngine, entities: List[str], file_path: str, object_name: str, file_size: int = 0
+    ) -> Tuple[List[PersonalDataDetection], bool]:
+        memory_needed = self._get_memory_needed(file_path, file_size, whole_file=True)
+        async with self._reserve_memory(memory_needed):
+            return await self._read_and_scan_staged_file(analyzer, entities, file_path, object_name)
+
+    async def _read_and_scan_staged_file(
+        self, analyzer: AnalyzerEngine, entities: List[str], file_path: str, object_name: str
+    ) -> Tuple[List[PersonalDataDetection], bool]:
+        logger.debug("Scanning the staged contents of file %s from git blob %s", file_path, object_name)
+        contents = await self.staged_files.read_blob(object_name)  # type: ignore
+
+        content_hash = None
+        if self.cache:
+            content_hash = PresidioResultCache.hash_bytes(contents)
+            cached_results = await self._get_cached_results(file_path, content_hash)
+            if cached_results is not None:
+                return cached_results, True
+
+        results = await self._scan_contents(analyzer, entities, file_path, StagedFile(contents.decode("utf-8")))
+
+        if self.cache and content_hash:
+            self.cache.set(content_hash, self._get_scan_mode(file_path), [result.to_dict() for result in results])
+        return results, False
 
     async def _scan_path(
-        self, analyzer: AnalyzerEngine, entities: List[str], file_path: str, exclusions: List[re.Pattern[str]]
+        self,
+        analyzer: AnalyzerEngine,
+        entities: List[str],
+        file_path: str,
+        exclusions: ExclusionMatcher,
+        path_stat: os.stat_result | OSError | None = None,
+    ) -> PathScanResult:
+        with profile_span(PROFILE_PATH_SPAN, path=file_path) as span:
+            started = time.perf_counter()
+            try:
+                async with asyncio.timeout(self.path_timeout or None) as deadline:
+                    token = _path_deadline.set(deadline)
+                    try:
+                        result = await self._check_and_scan_path(analyzer, entities, file_path, exclusions, path_stat, span)
+                    finally:
+                        _path_deadline.reset(token)
+            except TimeoutError:
+                self._abandoned_analysis = True
+                seconds = time.perf_counter() - started
+                logger.warning("Scanning file %s for personal data timed out after %.1f seconds", file_path, seconds)
+                result = PathScanResult(
+                    file_path,
+                    status=PathScanStatus.ERRORED,
+                    additional_detail=f"Timed out after {seconds:.1f} seconds, the limit is {self.path_timeout} seconds",
+                )
+                span["timed_out"] = True
+            span["status"] = result.status.name
+            span["cached"] = result.cached
+            return result
+
+    async def _check_and_scan_path(
+        self,
+        analyzer: AnalyzerEngine,
+        entities: List[str],
+        file_path: str,
+        exclusions: ExclusionMatcher,
+        path_stat: os.stat_result | OSError | None,
+        span: Dict[str, Any],
     ) -> PathScanResult:
         try:
             sources = PathFilter()
 
-            invalid_check_result = await sources._check_is_path_invalid(file_path, exclusions)
-            if invalid_check_result is not None:
-                return PathScanResult(file_path, invalid_check_result)
+            object_name = self.staged_files.get(file_path) if self.staged_files else None
+            if object_name is not None:
+                # The staged blob is scanned, so whether the path is scanned and its size come from the blob, even if the
+                # path has since been changed or deleted in the working tree
+                invalid_check_result = sources._check_is_staged_path_invalid(file_path, exclusions)
+                file_size = self.staged_files.get_size(object_name)  # type: ignore
+            else:
+                if path_stat is None:
+                    # Paths are normally stat'd in bulk by _scan_paths, only stat here when the caller did not do this
+                    path_stat = await to_thread.run_sync(sources._stat_path, file_path)
+                invalid_check_result = sources._check_is_path_invalid(file_path, exclusions, path_stat)
+                file_size = path_stat.st_size if isinstance(path_stat, os.stat_result) else 0
 
-            file_extension = Path(file_path).suffix.lower()
-            async with await open_file(file_path, "r", encoding="utf-8") as fs:
-                results: List[PersonalDataDetection] = []
-                if file_extension in self.LINE_BY_LINE_FILE_EXTENSIONS:
-                    logger.debug("Scanning file %s line by line", file_path)
-                    async for line in fs:
-                        results.extend(self._scan_content(analyzer, entities, line.rstrip()))
-                else:
-                    contents = await fs.read()
-                    logger.debug("Scanning file %s by reading all contents", file_path)
-                    results.extend(self._scan_content(analyzer, entities, contents))
-
-                return PathScanResult(
-                    file_path,
-                    status=PathScanStatus.PASSED if len(results) == 0 else PathScanStatus.FAILED,
-                    results=results,
-                )
+            if invalid_check_result is not None:
+                additional_detail = str(path_stat) if invalid_check_result == PathScanStatus.ERRORED else None
+                return PathScanResult(file_path, invalid_check_result, additional_detail=additional_detail)
+            span["bytes"] = file_size
+
+            if object_name is not None:
+                # Paths staged with the same contents, and scanned the same way, share a single scan of that content
+                staged_scan_key = (object_name, self._get_scan_mode(file_path))
+                if staged_scan_key not in self._staged_scans:
+                    # The scan is shared, so it must not pause or extend the deadline of the path that started it
+                    context = contextvars.copy_context()
+                    context.run(_path_deadline.set, None)
+                    self._staged_scans[staged_scan_key] = asyncio.get_running_loop().create_task(
+                        self._scan_staged_file(analyzer, entities, file_path, object_name, file_size),
+                        context=context,
+                    )
+                # Shielded, so a path running out of time does not cancel the scan for other paths with the same contents
+                results, cached = await asyncio.shield(self._staged_scans[staged_scan_key])
+            elif file_size == 0:
+                logger.debug("File %s is empty, there is nothing to scan", file_path)
+                results, cached = [], False
+            else:
+                results, cached = await self._scan_working_tree_file(analyzer, entities, file_path, file_size)
+
+            return PathScanResult(
+                file_path,
+                status=PathScanStatus.PASSED if len(results) == 0 else PathScanStatus.FAILED,
+                results=results,
+                cached=cached,
+            )
         except Exception as exc:
             logger.exception("The file scanner failed to read file %s", file_path, stack_info=True)
             return PathScanResult(file_path, status=PathScanStatus.ERRORED, additional_detail=str(exc))
 
-    async def scan(
-        self,
+    def _get_executor(self) -> Executor:
+        # spawn is used as forking a process that is running an event loop and worker threads is not safe
+        return ProcessPoolExecutor(
+            max_workers=self.jobs,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    async def _iter_path_batches(self) -> AsyncIterator[List[str]]:
+        """Groups the paths to scan into batches of PRESIDIO_PATH_BATCH_SIZE. Paths can be a list, or an async iterable
+        such as the output of iter_tracked_files, in which case a batch is returned as soon as enough paths have arrived
+
+        Yields:
+            List[str]: The next batch of paths
+        """
+        if isinstance(self.paths, list):
+            for index in range(0, len(self.paths), PRESIDIO_PATH_BATCH_SIZE):
+                yield self.paths[index : index + PRESIDIO_PATH_BATCH_SIZE]
+            return
+
+        batch: List[str] = []
+        async for path in self.paths:
+            batch.append(path)
+            if len(batch) == PRESIDIO_PATH_BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _get_scan_timed_out_result(self, file_path: str, seconds: float | None) -> PathScanResult:
+        """Creates the result for a path that had not been scanned when the whole scan ran out of time
+
+        Args:
+            file_path (str): The path
+            seconds (float | None): How long the path had been scanned for, or None if it had not started
+
+        Returns:
+            PathScanResult: An errored result with the reason
+        """
+        if seconds is None:
+            reason = f"Not scanned, the scan timed out after {self.scan_timeout} seconds"
+        else:
+            reason = f"Timed out after {seconds:.1f} seconds, the scan timed out after {self.scan_timeout} seconds"
+        return PathScanResult(file_path, status=PathScanStatus.ERRORED, additional_detail=reason)
+
+    async def _scan_paths(
+        self, analyzer: AnalyzerEngine, entities: List[str], exclusions: ExclusionMatcher
     ) -> PresidioScanResult:
-        sources = PathFilter()
+        """Scans every path through a bounded queue. Paths are queued as they arrive, and max_in_flight_paths workers
+        take paths from the queue. At most max_in_flight_paths paths are scanned at once and as many again wait in the
+        queue, even when the paths come from iter_tracked_files for a whole repository
+
+        Args:
+            analyzer (AnalyzerEngine): The analyzer to use, or None when the paths are analyzed in worker processes
+            entities (List[str]): The entities to detect
+            exclusions (ExclusionMatcher): The paths that should not be scanned
+
+        Returns:
+            PresidioScanResult: The result of scanning every path, in the order the paths were given
+        """
+        max_in_flight_paths = max(self.max_in_flight_paths, 1)
+        queue: asyncio.Queue[Tuple[int, str, os.stat_result | None] | None] = asyncio.Queue(max_in_flight_paths)
+        results: List[PathScanResult | None] = []
+        queued_paths: List[str] = []
+        scan_started: Dict[int, float] = {}
+        stats = ScanQueueStats()
+
+        async def scan_queued_paths():
+            while (queued_path := await queue.get()) is not None:
+                index, path, path_stat = queued_path
+                scan_started[index] = time.perf_counter()
+                results[index] = await self._scan_path(analyzer, entities, path, exclusions, path_stat)
+                stats.path_scanned(
+                    path_stat.st_size if isinstance(path_stat, os.stat_result) and not results[index].cached else 0
+                )
 
-        analyzer = self._get_analyzer()
-        entities = analyzer.get_supported_entities()
+        path_batches = self._iter_path_batches()
+
+        async def get_next_batch() -> List[str] | None:
+            return await anext(path_batches, None)
+
+        # The batch being listed, until its paths have been added to the results
+        next_batch: asyncio.Future[List[str] | None] | None = None
+        with profile_span(
+            "presidio.scan_queue", max_in_flight_paths=max_in_flight_paths, memory_budget=self._memory_budget.total_bytes
+        ) as span:
+            try:
+                async with asyncio.timeout(self.scan_timeout or None):
+                    async with asyncio.TaskGroup() as tg:
+                        for _ in range(max_in_flight_paths):
+                            tg.create_task(scan_queued_paths())
+
+                        while True:
+                            # Listing is shielded from the scan timeout, so iter_tracked_files is not closed part way
+                            # through and the paths that were not scanned can still be listed
+                            next_batch = asyncio.ensure_future(get_next_batch())
+                            paths = await asyncio.shield(next_batch)
+                            if paths is None:
+                                break
+                            first_index = len(results)
+                            results.extend([None] * len(paths))
+                            queued_paths.extend(paths)
+                            next_batch = None
+
+                            # One worker thread stats every path in the batch, rather than each path needing its own
+                            # threads to check it exists and is a file
+                            path_stats = await to_thread.run_sync(PathFilter()._stat_paths, paths)
+                            for index, path in enumerate(paths, first_index):
+                                # Waits while the queue is full, so paths are only read from iter_tracked_files as fast
+                                # as they are scanned
+                                await queue.put((index, path, path_stats[path]))
+                                stats.path_queued(queue.qsize())
+
+                        for _ in range(max_in_flight_paths):
+                            await queue.put(None)
+            except TimeoutError:
+                self._abandoned_analysis = True
+                span["timed_out"] = True
+                logger.warning(
+                    "The personal data scan timed out after %s seconds, the remaining files were not scanned",
+                    self.scan_timeout,
+                )
+                now = time.perf_counter()
+                for index, result in enumerate(results):
+                    if result is None:
+                        results[index] = self._get_scan_timed_out_result(
+                            queued_paths[index], now - scan_started[index] if index in scan_started else None
+                        )
+                # Listing the paths is cheap, so every path that was not scanned is still reported
+                paths = await (next_batch or get_next_batch())
+                while paths is not None:
+                    results.extend(self._get_scan_timed_out_result(path, None) for path in paths)
+                    paths = await get_next_batch()
+            finally:
+                if next_batch and not next_batch.done():
+                    next_batch.cancel()
 
-        exclusions = await sources._get_exclusions(exclusions_file=PRESIDIO_EXCLUSIONS_FILE_PATH)
-        logger.debug("Personal data exclusions file loaded with exclusions %s", exclusions)
+            span.update(stats.to_dict(), max_reserved_bytes=self._memory_budget.max_reserved_bytes)
+            logger.debug("Personal data scan queue stats %s", span)
 
-        tasks: list[asyncio.Task] = []
-        async with asyncio.TaskGroup() as tg:
-            for path in self.paths:
-                tasks.append(
-                    tg.create_task(self._scan_path(analyzer, entities, path, exclusions)),
-                )
-        scan_result = PresidioScanResult(results=[task.result() for task in tasks])
+        if self.cache:
+            await to_thread.run_sync(self.cache.flush)
+            logger.debug("Personal data scan cache had %s hits", self.cache.hits)
+
+        return PresidioScanResult(results=results)  # type: ignore
+
+    async def scan(
+        self,
+    ) -> PresidioScanResult:
+        sources = PathFilter()
 
-        return scan_result
+        exclusions = await sources._get_exclusion_matcher(exclusions_file=PRESIDIO_EXCLUSIONS_FILE_PATH)
+        logger.debug("Personal data exclusions file loaded with exclusions %s", exclusions.exclusions)
+
+        if self.jobs <= 1:
+            # Loading the analyzer reads the yaml config and builds every recognizer, keep this off the event loop too.
+            # The scan daemon passes in an analyzer it has already loaded
+            analyzer = self.analyzer or await to_thread.run_sync(self._get_analyzer)
+            entities = analyzer.get_supported_entities()
+
+            # An analyzer is not thread safe, each analysis borrows one from the pool for as long as its thread runs
+            self._analyzer_pool = AnalyzerPool(analyzer, self._get_analyzer)
+            try:
+                return await self._scan_paths(analyzer, entities, exclusions)
+            finally:
+                self._analyzer_pool = None
+                self._cancel_staged_scans()
+
+        logger.debug("Scanning paths using %s worker processes", self.jobs)
+        executor = self._get_executor()
+        self._executor = executor
+        try:
+            return await self._scan_paths(None, None, exclusions)  # type: ignore
+        finally:
+            self._executor = None
+            self._cancel_staged_scans()
+            await self._shutdown_executor(executor)
+
+    def _cancel_staged_scans(self):
+        # Scans of staged contents are shared between paths, one is left running if every path waiting for it timed out
+        for staged_scan in self._staged_scans.values():
+            staged_scan.cancel()
+        self._staged_scans.clear()
+
+    async def _shutdown_executor(self, executor: Executor):
+        if not self._abandoned_analysis:
+            # Waiting for the worker processes to exit blocks, so do it off the event loop
+            await to_thread.run_sync(executor.shutdown)
+            return
+
+        # A worker process may still be analyzing a path that ran out of time, and would never be waited for
+        logger.debug("Terminating the personal data scan worker processes")
+        terminate_workers = getattr(executor, "terminate_workers", None)
+        if terminate_workers:
+            # Shuts the executor down once the workers are terminated
+            terminate_workers()
+            return
+
+        # ProcessPoolExecutor.terminate_workers was added in python 3.14. The worker processes are taken before shutdown,
+        # which forgets them without waiting for them to exit
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        for process in processes:
+            process.terminate()
+        executor.shutdown(wait=False, cancel_futures=True)
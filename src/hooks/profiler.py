@@ -0,0 +1,184 @@
+import json
+import sys
+import time
+
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncContextManager, AsyncIterator, ContextManager, Dict, Iterator, List, TypeVar
+
+from src.hooks.config import LOGGER, PROFILE_PATH_SPAN, PROFILE_SLOWEST_PATHS
+
+logger = LOGGER
+
+T = TypeVar("T")
+
+# The profiler for the hook that is running, if --profile was passed. Tasks and worker threads started by the hook
+# inherit this, so spans can be recorded from anywhere without passing the profiler around
+_current_profiler: ContextVar["Profiler | None"] = ContextVar("current_profiler", default=None)
+
+
+class ProfileSpan:
+    def __init__(self, name: str, start: float, attributes: Dict[str, Any]) -> None:
+        self.name = name
+        self.start = start
+        self.duration = 0.0
+        self.attributes = attributes
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "start_seconds": round(self.start, 6),
+            "duration_seconds": round(self.duration, 6),
+            **self.attributes,
+        }
+
+
+class Profiler:
+    """
+
+    Records how long each phase of a hook takes, for hooks-cli --profile. Each span has a name, a start time relative
+    to when the profiler was created, a duration and any attributes added while it was open.
+
+    Every path scanned for personal data has its own span, these are summarised in the report as the slowest paths and
+    the bytes scanned per second, rather than listed individually.
+
+    """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.spans: List[ProfileSpan] = []
+
+    @contextmanager
+    def span(self, name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+        span = ProfileSpan(name, time.perf_counter() - self.started, attributes)
+        try:
+            yield span.attributes
+        finally:
+            span.duration = time.perf_counter() - self.started - span.start
+            # Spans can be recorded from worker threads, appending to a list is thread safe
+            self.spans.append(span)
+
+    def get_phases(self) -> Dict[str, Dict[str, Any]]:
+        phases: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            phase = phases.setdefault(span.name, {"count": 0, "total_seconds": 0.0})
+            phase["count"] += 1
+            phase["total_seconds"] += span.duration
+        return {
+            name: {"count": phase["count"], "total_seconds": round(phase["total_seconds"], 6)}
+            for name, phase in phases.items()
+        }
+
+    def get_report(self, slowest_paths: int = PROFILE_SLOWEST_PATHS) -> Dict[str, Any]:
+        """Creates the profile report
+
+        Args:
+            slowest_paths (int, optional): The number of the slowest paths to include. Defaults to PROFILE_SLOWEST_PATHS.
+
+        Returns:
+            Dict[str, Any]: The report, ready to be written as json
+        """
+        path_spans = [span for span in self.spans if span.name == PROFILE_PATH_SPAN]
+        # Paths are scanned concurrently, so the throughput is measured over the wall clock time spent scanning them
+        # Paths with cached results were not analyzed, so their bytes do not count towards the throughput
+        scanned_bytes = sum(span.attributes.get("bytes", 0) for span in path_spans if not span.attributes.get("cached"))
+        scan_seconds = (
+            max(span.start + span.duration for span in path_spans) - min(span.start for span in path_spans)
+            if path_spans
+            else 0.0
+        )
+
+        return {
+            "total_seconds": round(time.perf_counter() - self.started, 6),
+            "spans": [
+                span.to_dict() for span in sorted(self.spans, key=lambda span: span.start) if span.name != PROFILE_PATH_SPAN
+            ],
+            "phases": self.get_phases(),
+            "paths": {
+                "count": len(path_spans),
+                "bytes": scanned_bytes,
+                "seconds": round(scan_seconds, 6),
+                "bytes_per_second": round(scanned_bytes / scan_seconds) if scan_seconds else None,
+                "slowest": [
+                    span.to_dict()
+                    for span in sorted(path_spans, key=lambda span: span.duration, reverse=True)[:slowest_paths]
+                ],
+            },
+        }
+
+    def write(self, profile_file: str):
+        with open(profile_file, "w", encoding="utf-8") as f:
+            json.dump(self.get_report(), f, indent=2)
+        logger.info("Wrote the profile to %s", profile_file)
+
+
+def get_profiler() -> Profiler | None:
+    return _current_profiler.get()
+
+
+@contextmanager
+def use_profiler(profiler: Profiler) -> Iterator[Profiler]:
+    token = _current_profiler.set(profiler)
+    try:
+        yield profiler
+    finally:
+        _current_profiler.reset(token)
+
+
+@contextmanager
+def profile_span(name: str, **attributes: Any) -> Iterator[Dict[str, Any]]:
+    """Records a span with the current profiler, or does nothing if the hook is not being profiled
+
+    Args:
+        name (str): The name of the span
+
+    Yields:
+        Dict[str, Any]: The span attributes, more can be added before the span ends
+    """
+    profiler = _current_profiler.get()
+    if profiler is None:
+        yield attributes
+        return
+
+    with profiler.span(name, **attributes) as span_attributes:
+        yield span_attributes
+
+
+@contextmanager
+def profile_context(name: str, context_manager: ContextManager[T], **attributes: Any) -> Iterator[T]:
+    """Enters a context manager, recording how long entering and exiting take as the spans <name>_start and <name>_stop
+
+    Args:
+        name (str): The prefix of the span names
+        context_manager (ContextManager[T]): The context manager to enter
+
+    Yields:
+        T: The value returned when entering the context manager
+    """
+    with profile_span(f"{name}_start", **attributes):
+        value = context_manager.__enter__()
+    try:
+        yield value
+    except BaseException:
+        with profile_span(f"{name}_stop", **attributes):
+            if not context_manager.__exit__(*sys.exc_info()):
+                raise
+    else:
+        with profile_span(f"{name}_stop", **attributes):
+            context_manager.__exit__(None, None, None)
+
+
+@asynccontextmanager
+async def profile_async_context(name: str, context_manager: AsyncContextManager[T], **attributes: Any) -> AsyncIterator[T]:
+    """The async version of profile_context"""
+    with profile_span(f"{name}_start", **attributes):
+        value = await context_manager.__aenter__()
+    try:
+        yield value
+    except BaseException:
+        with profile_span(f"{name}_stop", **attributes):
+            if not await context_manager.__aexit__(*sys.exc_info()):
+                raise
+    else:
+        with profile_span(f"{name}_stop", **attributes):
+            await context_manager.__aexit__(None, None, None)
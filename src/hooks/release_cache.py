@@ -0,0 +1,67 @@
+import json
+import time
+
+from anyio import Path
+from typing import Any, Dict
+
+from src.hooks.cache_directory import write_cache_file
+from src.hooks.config import (
+    DEFAULT_CACHE_DIRECTORY,
+    LOGGER,
+    RELEASE_CHECK_CACHE_FILE,
+    RELEASE_CHECK_CACHE_TTL_SECONDS,
+)
+
+logger = LOGGER
+
+
+class CachedRelease:
+    def __init__(self, tag_name: str, etag: str | None = None, checked_at: float | None = None) -> None:
+        self.tag_name = tag_name
+        self.etag = etag
+        self.checked_at = checked_at if checked_at is not None else time.time()
+
+    def is_fresh(self, ttl: float) -> bool:
+        return 0 <= time.time() - self.checked_at < ttl
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"tag_name": self.tag_name, "etag": self.etag, "checked_at": self.checked_at}
+
+    @staticmethod
+    def from_dict(release: Dict[str, Any]) -> "CachedRelease":
+        return CachedRelease(release["tag_name"], etag=release["etag"], checked_at=release["checked_at"])
+
+
+class ReleaseTagCache:
+    """
+
+    An on disk cache of the latest github-standards release tag, so the remote version check only calls the github api
+    once the cached tag is older than the ttl. The ETag github returned with the tag is kept, so a check of a release
+    that has not changed can be revalidated with If-None-Match.
+
+    Any error reading or writing the cache is treated as there being no cached tag, so the github api is called.
+
+    """
+
+    def __init__(
+        self,
+        cache_directory: str = DEFAULT_CACHE_DIRECTORY,
+        ttl: float = RELEASE_CHECK_CACHE_TTL_SECONDS,
+    ) -> None:
+        self.cache_file = Path(cache_directory, RELEASE_CHECK_CACHE_FILE)
+        self.ttl = ttl
+
+    async def load(self) -> CachedRelease | None:
+        try:
+            return CachedRelease.from_dict(json.loads(await self.cache_file.read_text()))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError) as exc:
+            logger.debug("The release tag cache %s could not be read: %s", self.cache_file, exc)
+            return None
+
+    async def save(self, release: CachedRelease):
+        try:
+            await write_cache_file(self.cache_file, json.dumps(release.to_dict()))
+        except OSError as exc:
+            logger.debug("The release tag cache %s could not be written: %s", self.cache_file, exc)
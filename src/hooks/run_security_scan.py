@@ -1,31 +1,50 @@
 import asyncio
-import aiohttp
-import git
+import os
 
+from anyio import to_thread
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Any, AsyncIterator, Dict, List
 
 
 from src.hooks.config import (
+    DEFAULT_DIFF_BASE,
     LOGGER,
     PERSONAL_DATA_SCAN,
     PRE_COMMIT_FILE,
+    PRESIDIO_MAX_IN_FLIGHT_PATHS,
+    PRESIDIO_MEMORY_BUDGET_BYTES,
+    PRESIDIO_PATH_TIMEOUT_SECONDS,
+    PRESIDIO_SCAN_TIMEOUT_SECONDS,
+    RELEASE_CHECK_TIMEOUT_SECONDS,
     RELEASE_CHECK_URL,
     SECURITY_SCAN,
 )
+from src.hooks.git_files import StagedFiles, get_paths_matching_index, iter_tracked_files
 from src.hooks.hooks_base import Hook, HookRunResult
-from src.hooks.presidio.scanner import PresidioScanResult, PresidioScanner
-from src.hooks.trufflehog.scanner import TrufflehogScanResult, TrufflehogScanner
+from src.hooks.profiler import profile_span
+from src.hooks.release_cache import CachedRelease, ReleaseTagCache
+from src.hooks.scan_daemon_client import ScanDaemonClient
+from src.hooks.scan_receipts import ScanReceipts
 from src.hooks.trufflehog.vendors import AllowedTrufflehogVendor
 
+# The scanners load presidio, spaCy, proxy.py, aiohttp and GitPython, which take a second or more to import. They are
+# imported by the methods that use them, so a scan run by the scan daemon only pays for the modules it needs
+if TYPE_CHECKING:
+    import aiohttp
+    import git
+
+    from presidio_analyzer import AnalyzerEngine
+    from src.hooks.presidio.scanner import PresidioScanResult
+    from src.hooks.trufflehog.scanner import TrufflehogScanResult
+
 logger = LOGGER
 
 
 class RunSecurityScanResult(HookRunResult):
     def __init__(
         self,
-        trufflehog_scan_result: TrufflehogScanResult,
-        presidio_scan_result: PresidioScanResult,
+        trufflehog_scan_result: "TrufflehogScanResult",
+        presidio_scan_result: "PresidioScanResult",
     ):
         self.trufflehog_scan_result = trufflehog_scan_result
         self.presidio_scan_result = presidio_scan_result
@@ -33,7 +52,7 @@ class RunSecurityScanResult(HookRunResult):
     def run_success(self) -> bool:
         is_success = True
         if self.trufflehog_scan_result:
-            if self.trufflehog_scan_result.detected_keys is not None:
+            if self.trufflehog_scan_result.has_issues():
                 is_success = False
         if self.presidio_scan_result:
             if (
@@ -54,6 +73,30 @@ class RunSecurityScanResult(HookRunResult):
 
         return "".join(["\n", trufflehog_summary, "\n", "\n", presidio_summary])
 
+    def is_complete(self) -> bool:
+        """Checks every path was scanned, a scan that passed without reading some paths must not be trusted later"""
+        if self.presidio_scan_result and self.presidio_scan_result.paths_errored:
+            return False
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trufflehog_scan_result": self.trufflehog_scan_result.to_dict() if self.trufflehog_scan_result else None,
+            "presidio_scan_result": self.presidio_scan_result.to_dict() if self.presidio_scan_result else None,
+        }
+
+    @staticmethod
+    def from_dict(result: Dict[str, Any]) -> "RunSecurityScanResult":
+        from src.hooks.presidio.scanner import PresidioScanResult
+        from src.hooks.trufflehog.scanner import TrufflehogScanResult
+
+        trufflehog_scan_result = result["trufflehog_scan_result"]
+        presidio_scan_result = result["presidio_scan_result"]
+        return RunSecurityScanResult(
+            TrufflehogScanResult.from_dict(trufflehog_scan_result) if trufflehog_scan_result else None,  # type: ignore
+            PresidioScanResult.from_dict(presidio_scan_result) if presidio_scan_result else None,  # type: ignore
+        )
+
 
 class RunSecurityScan(Hook):
     def __init__(
@@ -62,12 +105,80 @@ class RunSecurityScan(Hook):
         verbose: bool = False,
         github_action: bool = False,
         excluded_scans: List[str] | None = None,
+        jobs: int = 1,
+        use_cache: bool = True,
+        diff_base: str | None = None,
+        staged: bool = False,
+        trufflehog_shards: int = 1,
+        trufflehog_concurrency: int | None = None,
+        in_process_proxy: bool = False,
+        use_daemon: bool = True,
+        max_in_flight_paths: int = PRESIDIO_MAX_IN_FLIGHT_PATHS,
+        memory_budget: int = PRESIDIO_MEMORY_BUDGET_BYTES,
+        path_timeout: float = PRESIDIO_PATH_TIMEOUT_SECONDS,
+        scan_timeout: float = PRESIDIO_SCAN_TIMEOUT_SECONDS,
+        analyzer: "AnalyzerEngine | None" = None,
+        proxy_url: str | None = None,
     ):
         super().__init__(paths, verbose)
         self.github_action = github_action
         self.excluded_scans = excluded_scans if excluded_scans else []
+        self.jobs = jobs
+        self.use_cache = use_cache
+        self.diff_base = diff_base
+        self.staged = staged
+        self.trufflehog_shards = trufflehog_shards
+        self.trufflehog_concurrency = trufflehog_concurrency
+        self.in_process_proxy = in_process_proxy
+        self.use_daemon = use_daemon
+        self.max_in_flight_paths = max_in_flight_paths
+        self.memory_budget = memory_budget
+        self.path_timeout = path_timeout
+        self.scan_timeout = scan_timeout
+        # Set by the scan daemon, so every scan it runs reuses the same analyzer and proxy
+        self.analyzer = analyzer
+        self.proxy_url = proxy_url
+        self._staged_files: StagedFiles | None = None
+        self._version_in_config: str | None = None
 
     def validate_args(self) -> bool:
+        if self.jobs < 0:
+            logger.debug("The number of jobs must be 0 or more, %s was provided", self.jobs)
+            return False
+
+        if self.trufflehog_shards < 0:
+            logger.debug("The number of trufflehog shards must be 0 or more, %s was provided", self.trufflehog_shards)
+            return False
+
+        if self.trufflehog_concurrency is not None and self.trufflehog_concurrency < 1:
+            logger.debug("The trufflehog concurrency must be 1 or more, %s was provided", self.trufflehog_concurrency)
+            return False
+
+        if self.max_in_flight_paths < 1:
+            logger.debug("The number of paths in flight must be 1 or more, %s was provided", self.max_in_flight_paths)
+            return False
+
+        if self.memory_budget < 1:
+            logger.debug("The memory budget must be 1 byte or more, %s was provided", self.memory_budget)
+            return False
+
+        # Written as not >= so a timeout of nan is also rejected
+        if not self.path_timeout >= 0:
+            logger.debug("The path timeout must be 0 or more seconds, %s was provided", self.path_timeout)
+            return False
+
+        if not self.scan_timeout >= 0:
+            logger.debug("The scan timeout must be 0 or more seconds, %s was provided", self.scan_timeout)
+            return False
+
+        if self.diff_base and not self.github_action:
+            logger.debug("A diff base can only be used when running in a github action")
+            return False
+
+        if self.staged and self.github_action:
+            logger.debug("Staged files can not be scanned when running in a github action")
+            return False
+
         if self.github_action:
             if self.paths is None:
                 logger.debug("No paths passed to hook, this hook needs a directory as the only path")
@@ -88,7 +199,9 @@ class RunSecurityScan(Hook):
 
         return True
 
-    def _get_client_session(self) -> aiohttp.ClientSession:
+    def _get_client_session(self) -> "aiohttp.ClientSession":
+        import aiohttp
+
         return aiohttp.ClientSession(
             base_url="https://api.github.com",
             headers={
@@ -96,27 +209,45 @@ class RunSecurityScan(Hook):
             },
         )
 
-    async def _get_version_from_remote(self):
-        session = self._get_client_session()
-        # This is a low timeout, we don't want to block commits or make devs wait for the github api
-        timeout = aiohttp.ClientTimeout(total=1)
-        async with session.get(RELEASE_CHECK_URL, raise_for_status=True, timeout=timeout) as response:
-            logger.debug("Received %s response from %s", response.status, response.real_url)
-            json_content = await response.json()
-            await session.close()
-            return json_content["tag_name"]
+    def _get_release_tag_cache(self) -> ReleaseTagCache:
+        return ReleaseTagCache()
 
-    async def _validate_hook_settings(self, dbt_repo_config):
-        if "rev" not in dbt_repo_config:
-            logger.debug(
-                "File %s contains the github standards hooks repo, but is missing the rev child element", PRE_COMMIT_FILE
-            )
-            return False
+    async def _get_version_from_remote(self) -> str:
+        """Gets the latest release tag, from the release tag cache while it is within the ttl, otherwise from the github
+        api. A release that has not changed since it was cached is revalidated with the cached ETag
+
+        Returns:
+            str: The latest release tag
+        """
+        import aiohttp
+
+        cache = self._get_release_tag_cache()
+        cached_release = await cache.load()
+        if cached_release and cached_release.is_fresh(cache.ttl):
+            logger.debug("Using the latest release %s cached at %s", cached_release.tag_name, cache.cache_file)
+            return cached_release.tag_name
+
+        headers = {"If-None-Match": cached_release.etag} if cached_release and cached_release.etag else {}
+        timeout = aiohttp.ClientTimeout(total=RELEASE_CHECK_TIMEOUT_SECONDS)
+        # The session is closed even if the request fails
+        async with self._get_client_session() as session:
+            async with session.get(RELEASE_CHECK_URL, raise_for_status=True, timeout=timeout, headers=headers) as response:
+                logger.debug("Received %s response from %s", response.status, response.real_url)
+                if response.status == 304 and cached_release:
+                    tag_name = cached_release.tag_name
+                else:
+                    tag_name = (await response.json())["tag_name"]
+                etag = response.headers.get("ETag")
+
+        await cache.save(CachedRelease(tag_name, etag=etag))
+        return tag_name
 
-        # If the call to get the remote version fails, return True as we don't want this to block a dev from committing in this scenario.
+    async def _check_version(self, version_in_config: str):
+        # If the call to get the remote version fails, carry on as we don't want this to block a dev from committing in
+        # this scenario.
         try:
-            version_in_config = dbt_repo_config["rev"]
-            version_in_remote = await self._get_version_from_remote()
+            with profile_span("run_scan.get_version_from_remote"):
+                version_in_remote = await self._get_version_from_remote()
 
             if version_in_config != version_in_remote:
                 logger.error(
@@ -127,46 +258,200 @@ class RunSecurityScan(Hook):
         except Exception:
             logger.exception("The remote version check failed", stack_info=True)
 
+    async def _validate_hook_settings(self, dbt_repo_config):
+        if "rev" not in dbt_repo_config:
+            logger.debug(
+                "File %s contains the github standards hooks repo, but is missing the rev child element", PRE_COMMIT_FILE
+            )
+            return False
+
+        # The version is checked against the latest release by run, at the same time as the scans
+        self._version_in_config = dbt_repo_config["rev"]
         return True
 
-    async def run_security_scan(self) -> TrufflehogScanResult:
-        return await TrufflehogScanner(
-            self.verbose,
-            self.paths,
-        ).scan(
-            self.github_action,
-            AllowedTrufflehogVendor.all_endpoints(),
-            AllowedTrufflehogVendor.all_vendor_codes(),
-        )
+    async def run_security_scan(self) -> "TrufflehogScanResult":
+        with profile_span("trufflehog.import"):
+            from src.hooks.trufflehog.scanner import TrufflehogScanner
 
-    async def run_personal_scan(self) -> PresidioScanResult:
-        paths_to_scan = self.paths
+        # A shards value of 0 runs a trufflehog process for every available CPU
+        shards = self.trufflehog_shards if self.trufflehog_shards else os.cpu_count() or 1
+
+        with profile_span("trufflehog.scan"):
+            return await TrufflehogScanner(
+                self.verbose,
+                self.paths,
+                staged_files=self._staged_files,
+                shards=shards,
+                concurrency=self.trufflehog_concurrency,
+                in_process_proxy=self.in_process_proxy,
+                proxy_url=self.proxy_url,
+            ).scan(
+                self.github_action,
+                AllowedTrufflehogVendor.all_endpoints(),
+                AllowedTrufflehogVendor.all_vendor_codes(),
+                since_commit=self.diff_base or DEFAULT_DIFF_BASE,
+            )
+
+    def _get_changed_paths(self, repo: "git.Repo", diff_base: str) -> List[str]:
+        """Gets the files added, modified or renamed between the merge base of diff_base and HEAD
+
+        Args:
+            repo (git.Repo): The repository being scanned
+            diff_base (str): The ref the changes are compared against, e.g. main or origin/main
+
+        Returns:
+            List[str]: The absolute path of every changed file that still exists in HEAD
+        """
+        # The three dot form diffs HEAD against the merge base, so changes made on diff_base since branching are ignored
+        changed_files = repo.git.diff("--name-only", "-z", "--no-renames", "--diff-filter=AM", f"{diff_base}...HEAD")
+        return [os.path.join(repo.working_tree_dir, path) for path in changed_files.split("\0") if path]  # type: ignore
+
+    async def run_personal_scan(self) -> "PresidioScanResult":
+        with profile_span("presidio.import"):
+            from src.hooks.presidio.result_cache import PresidioResultCache
+            from src.hooks.presidio.scanner import PresidioScanner
+
+        paths_to_scan: List[str] | AsyncIterator[str] = self.paths
         if self.github_action:
-            repo = git.Repo(self.paths[0])
-            logger.debug("Scanning files in git repository %s", repo)
-            paths_to_scan = [entry.abspath for entry in repo.tree().traverse()]
+            if self.diff_base:
+                import git
+
+                repo = git.Repo(self.paths[0])
+                logger.debug("Scanning files in git repository %s changed since %s", repo, self.diff_base)
+                paths_to_scan = await to_thread.run_sync(self._get_changed_paths, repo, self.diff_base)
+            else:
+                logger.debug("Scanning files in git repository %s", self.paths[0])
+                paths_to_scan = iter_tracked_files(self.paths[0])
+
+        # A jobs value of 0 uses a worker process for every available CPU
+        jobs = self.jobs if self.jobs else os.cpu_count() or 1
+
+        cache = PresidioResultCache() if self.use_cache else None
+        try:
+            with profile_span("presidio.scan"):
+                return await PresidioScanner(
+                    self.verbose,
+                    paths_to_scan,
+                    jobs=jobs,
+                    cache=cache,
+                    staged_files=self._staged_files,
+                    analyzer=self.analyzer,
+                    max_in_flight_paths=self.max_in_flight_paths,
+                    memory_budget=self.memory_budget,
+                    path_timeout=self.path_timeout,
+                    scan_timeout=self.scan_timeout,
+                ).scan()
+        finally:
+            if cache:
+                cache.close()
+
+    def get_scan_args(self) -> Dict[str, Any]:
+        """Gets the arguments needed to run the same scan in the scan daemon
 
-        return await PresidioScanner(
-            self.verbose,
-            paths_to_scan,
-        ).scan()
+        Returns:
+            Dict[str, Any]: The RunSecurityScan keyword arguments
+        """
+        return {
+            "paths": self.paths,
+            "verbose": self.verbose,
+            "github_action": self.github_action,
+            "excluded_scans": self.excluded_scans,
+            "jobs": self.jobs,
+            "use_cache": self.use_cache,
+            "diff_base": self.diff_base,
+            "staged": self.staged,
+            "trufflehog_shards": self.trufflehog_shards,
+            "trufflehog_concurrency": self.trufflehog_concurrency,
+            "in_process_proxy": self.in_process_proxy,
+            "max_in_flight_paths": self.max_in_flight_paths,
+            "memory_budget": self.memory_budget,
+            "path_timeout": self.path_timeout,
+            "scan_timeout": self.scan_timeout,
+        }
 
     async def run(self) -> RunSecurityScanResult:
+        async with asyncio.TaskGroup() as tg:
+            if self._version_in_config:
+                # The remote version check runs in the background, so a slow network does not delay the scans
+                tg.create_task(self._check_version(self._version_in_config))
+            result = await self._run_scans()
+        return result
+
+    def _get_scan_receipts(self) -> ScanReceipts:
+        return ScanReceipts()
+
+    async def _get_receipt_key(self, receipts: ScanReceipts) -> str | None:
+        """Gets the key of the scan receipt for the paths, when the result of scanning them depends only on the staged tree
+
+        Args:
+            receipts (ScanReceipts): The scan receipts
+
+        Returns:
+            str | None: The receipt key, or None if receipts can not be used for this scan
+        """
+        if self.github_action or not self.use_cache or not self.paths:
+            return None
+
+        # The working tree contents of a path are scanned unless --staged is used, so a receipt for the staged tree only
+        # describes the scan if every path is tracked and unchanged since it was staged
+        matching_paths = await get_paths_matching_index(self.paths)
+        if matching_paths is None or not matching_paths.issuperset(os.path.normpath(path) for path in self.paths):
+            logger.debug("Not every path matches the staged tree, scan receipts will not be used")
+            return None
+
+        return await receipts.get_key()
+
+    async def _run_scans(self) -> RunSecurityScanResult:
+        receipts = self._get_scan_receipts()
+        with profile_span("run_scan.receipt") as span:
+            receipt_key = await self._get_receipt_key(receipts)
+            passed = receipt_key is not None and await receipts.has_passed(receipt_key, self.paths, self.excluded_scans)
+            span["passed"] = passed
+        if passed:
+            logger.info("The staged tree has already passed the scans, skipping them")
+            return RunSecurityScanResult(None, None)  # type: ignore
+
+        result = await self._run_scans_without_receipt()
+        if receipt_key and result.run_success() and result.is_complete():
+            await receipts.record(receipt_key, self.paths, self.excluded_scans)
+        return result
+
+    async def _run_scans_without_receipt(self) -> RunSecurityScanResult:
+        if self.use_daemon:
+            # Spans for a scan run by the daemon are recorded in the daemon, not here
+            with profile_span("run_scan.daemon") as span:
+                daemon_result = await ScanDaemonClient().run_scan(self.get_scan_args())
+                span["used"] = daemon_result is not None
+            if daemon_result is not None:
+                return RunSecurityScanResult.from_dict(daemon_result)
+
+        return await self.run_in_process()
+
+    async def run_in_process(self) -> RunSecurityScanResult:
         security_scan_task = None
         personal_data_scan_task = None
 
-        async with asyncio.TaskGroup() as tg:
-            if SECURITY_SCAN not in self.excluded_scans:
-                logger.debug("Running security scan")
-                security_scan_task = tg.create_task(self.run_security_scan())
-            else:
-                logger.debug("Security scan is excluded")
+        if self.staged:
+            logger.debug("Scanning the staged contents of the paths")
+            self._staged_files = await StagedFiles.load(self.paths)
 
-            if PERSONAL_DATA_SCAN not in self.excluded_scans:
-                logger.debug("Running personal data scan")
-                personal_data_scan_task = tg.create_task(self.run_personal_scan())
-            else:
-                logger.debug("Personal data scan is excluded")
+        try:
+            async with asyncio.TaskGroup() as tg:
+                if SECURITY_SCAN not in self.excluded_scans:
+                    logger.debug("Running security scan")
+                    security_scan_task = tg.create_task(self.run_security_scan())
+                else:
+                    logger.debug("Security scan is excluded")
+
+                if PERSONAL_DATA_SCAN not in self.excluded_scans:
+                    logger.debug("Running personal data scan")
+                    personal_data_scan_task = tg.create_task(self.run_personal_scan())
+                else:
+                    logger.debug("Personal data scan is excluded")
+        finally:
+            if self._staged_files:
+                await self._staged_files.aclose()
+                self._staged_files = None
 
         security_scan_result = security_scan_task.result() if security_scan_task else None
         personal_data_scan_result = personal_data_scan_task.result() if personal_data_scan_task else None
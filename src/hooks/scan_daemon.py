@@ -0,0 +1,222 @@
+import json
+import os
+import signal
+
+from contextlib import contextmanager
+
+from anyio import (
+    TASK_STATUS_IGNORED,
+    BrokenResourceError,
+    CancelScope,
+    ClosedResourceError,
+    Lock,
+    Path,
+    connect_unix,
+    create_task_group,
+    create_unix_listener,
+    open_signal_receiver,
+    to_thread,
+)
+from anyio.abc import SocketStream, TaskStatus
+from presidio_analyzer import AnalyzerEngine
+from typing import Any, Dict, Iterator, List
+
+from src.hooks.cache_directory import create_cache_directory
+from src.hooks.config import LOGGER, SCAN_DAEMON_PROTOCOL_VERSION
+from src.hooks.hooks_base import Hook, HookRunResult
+from src.hooks.presidio.result_cache import PresidioResultCache
+from src.hooks.presidio.scanner import PresidioScanner
+from src.hooks.run_security_scan import RunSecurityScan
+from src.hooks.scan_daemon_client import (
+    GIT_ENV_PREFIX,
+    SCAN_DAEMON_STATUS_ERROR,
+    SCAN_DAEMON_STATUS_OK,
+    SCAN_DAEMON_STATUS_REJECTED,
+    get_scan_daemon_socket_path,
+)
+from src.hooks.scan_receipts import ScanReceipts
+from src.hooks.trufflehog.vendors import AllowedTrufflehogVendor
+from src.proxy.egress_proxy import EgressProxy
+
+logger = LOGGER
+
+
+class ScanDaemonResult(HookRunResult):
+    def __init__(self, error: str | None = None) -> None:
+        self.error = error
+
+    def run_success(self) -> bool:
+        return self.error is None
+
+    def run_summary(self) -> str | None:
+        if self.error:
+            return f"The scan daemon could not be started: {self.error}"
+        return "The scan daemon has stopped"
+
+
+class ScanDaemon(Hook):
+    """
+
+    A long running process that runs scans for hooks-cli run_scan, so every scan after the first skips the cold start.
+    The daemon keeps a loaded presidio analyzer and a running egress proxy for trufflehog between scans, and the
+    compiled exclusions are reused for as long as the exclusions files are unchanged, see PathFilter. The egress proxy
+    is only used by scans run with --in-process-proxy, other scans start proxy.py as they would outside the daemon.
+
+    The daemon listens on a unix socket inside DEFAULT_CACHE_DIRECTORY, so it only serves the repository it was started
+    in. Scans are run one at a time, each with the git environment variables of the client that sent it.
+
+    """
+
+    def __init__(self, paths: List[str] | None = None, verbose: bool = False, socket_path: str | None = None):
+        super().__init__(paths, verbose)
+        self.socket_path = socket_path if socket_path else get_scan_daemon_socket_path()
+        # The analyzer is loaded from the presidio config when the daemon starts, and the code from the installed hooks
+        self.config_fingerprint = PresidioResultCache.get_config_fingerprint()
+        self.hooks_version = ScanReceipts.get_hooks_version()
+        self._analyzer: AnalyzerEngine | None = None
+        self._proxy: EgressProxy | None = None
+        self._lock = Lock()
+
+    def validate_args(self) -> bool:
+        if self.paths:
+            logger.debug("The scan daemon does not take any paths, %s paths were provided", len(self.paths))
+            return False
+        return True
+
+    async def _validate_hook_settings(self, dbt_repo_config) -> bool:
+        return True
+
+    def _reject(self, reason: str) -> Dict[str, Any]:
+        logger.debug("Scan daemon rejected a scan: %s", reason)
+        return {"status": SCAN_DAEMON_STATUS_REJECTED, "reason": reason}
+
+    async def _run_scan(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Runs the scan a client has requested
+
+        Args:
+            request (Dict[str, Any]): The request, see ScanDaemonClient.get_request
+
+        Returns:
+            Dict[str, Any]: The response, containing the RunSecurityScanResult as a dict if the scan was run
+        """
+        if request.get("version") != SCAN_DAEMON_PROTOCOL_VERSION:
+            return self._reject(f"protocol version {request.get('version')} is not supported")
+
+        # Paths, exclusions files and the result cache are all relative to the working directory
+        if os.path.realpath(request.get("cwd", "")) != os.path.realpath(os.getcwd()):
+            return self._reject(f"the scan is for {request.get('cwd')}, this daemon scans {os.getcwd()}")
+
+        if request.get("hooks_version") != self.hooks_version:
+            return self._reject(
+                f"the scan is from hooks version {request.get('hooks_version')}, this daemon runs {self.hooks_version}"
+            )
+
+        # The loaded analyzer, exclusions or detectors would give different results to the client's
+        fingerprint = await to_thread.run_sync(ScanReceipts.get_fingerprint, self.config_fingerprint, self.hooks_version)
+        if request.get("fingerprint") != fingerprint:
+            return self._reject("the presidio configuration, exclusions or detectors are not the ones the daemon is using")
+
+        scan = RunSecurityScan(
+            **request["args"],
+            use_daemon=False,
+            analyzer=self._analyzer,
+            proxy_url=self._proxy.url if self._proxy and request["args"].get("in_process_proxy") else None,
+        )
+        if not scan.validate_args():
+            return self._reject("the scan arguments are not valid")
+
+        async with self._lock:
+            logger.info("Scan daemon running a scan of %s paths", len(scan.paths))
+            with self._use_git_env(request.get("git_env", {})):
+                result = await scan.run_in_process()
+
+        return {"status": SCAN_DAEMON_STATUS_OK, "result": result.to_dict()}
+
+    @contextmanager
+    def _use_git_env(self, git_env: Dict[str, str]) -> Iterator[None]:
+        """Replaces the daemon's git environment variables with a client's for the duration of a scan. Scans are run
+        one at a time, so only one client's variables are ever in use
+
+        Args:
+            git_env (Dict[str, str]): The client's git environment variables, e.g. GIT_INDEX_FILE and GIT_DIR
+        """
+        daemon_git_env = {name: value for name, value in os.environ.items() if name.startswith(GIT_ENV_PREFIX)}
+        for name in daemon_git_env:
+            del os.environ[name]
+        os.environ.update({name: value for name, value in git_env.items() if name.startswith(GIT_ENV_PREFIX)})
+        try:
+            yield
+        finally:
+            for name in [name for name in os.environ if name.startswith(GIT_ENV_PREFIX)]:
+                del os.environ[name]
+            os.environ.update(daemon_git_env)
+
+    async def _handle(self, stream: SocketStream):
+        async with stream:
+            try:
+                request = json.loads(b"".join([chunk async for chunk in stream]))
+                response = await self._run_scan(request)
+            except Exception as exc:
+                logger.exception("The scan daemon failed to run a scan")
+                response = {"status": SCAN_DAEMON_STATUS_ERROR, "reason": str(exc)}
+
+            try:
+                await stream.send(json.dumps(response).encode())
+            except (BrokenResourceError, ClosedResourceError, OSError):
+                # The client went away before the reply, e.g. the commit was cancelled, the daemon keeps serving others
+                logger.debug("The scan daemon client disconnected before the scan finished", exc_info=True)
+
+    async def _is_running(self) -> bool:
+        try:
+            async with await connect_unix(self.socket_path):
+                return True
+        except OSError:
+            return False
+
+    async def serve(self, *, task_status: TaskStatus[None] = TASK_STATUS_IGNORED):
+        """Loads the analyzer, starts the proxy and serves scans until cancelled
+
+        Raises:
+            RuntimeError: If a daemon is already running for this repository
+        """
+        socket_path = Path(self.socket_path)
+        if await socket_path.exists():
+            if await self._is_running():
+                raise RuntimeError(f"a scan daemon is already listening on {self.socket_path}")
+            logger.debug("Removing the socket %s left by a scan daemon that did not stop cleanly", self.socket_path)
+            await socket_path.unlink()
+
+        await to_thread.run_sync(create_cache_directory, socket_path.parent)
+
+        logger.debug("Scan daemon loading the presidio analyzer")
+        self._analyzer = await to_thread.run_sync(PresidioScanner()._get_analyzer)
+
+        async with EgressProxy(AllowedTrufflehogVendor.all_endpoints()) as proxy:
+            self._proxy = proxy
+            try:
+                # Only the user running the daemon can send it scans
+                async with await create_unix_listener(self.socket_path, mode=0o600) as listener:
+                    logger.info("Scan daemon listening on %s", self.socket_path)
+                    async with create_task_group() as tg:
+                        tg.start_soon(listener.serve, self._handle, tg)
+                        task_status.started()
+            finally:
+                self._proxy = None
+                # The daemon is normally stopped by cancelling it, shield the clean up from that cancellation
+                with CancelScope(shield=True):
+                    await socket_path.unlink(missing_ok=True)
+
+    async def run(self) -> ScanDaemonResult:
+        async with create_task_group() as tg:
+            try:
+                await tg.start(self.serve)
+            except RuntimeError as exc:
+                return ScanDaemonResult(error=str(exc))
+
+            with open_signal_receiver(signal.SIGINT, signal.SIGTERM) as signals:
+                async for signum in signals:
+                    logger.debug("Scan daemon received signal %s, stopping", signum)
+                    break
+            tg.cancel_scope.cancel()
+
+        return ScanDaemonResult()
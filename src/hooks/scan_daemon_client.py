@@ -0,0 +1,90 @@
+import json
+import os
+
+from anyio import Path, connect_unix, fail_after
+from typing import Any, Dict
+
+from src.hooks.config import (
+    DEFAULT_CACHE_DIRECTORY,
+    LOGGER,
+    SCAN_DAEMON_PROTOCOL_VERSION,
+    SCAN_DAEMON_SOCKET_FILE,
+    SCAN_DAEMON_TIMEOUT_SECONDS,
+)
+from src.hooks.scan_receipts import ScanReceipts
+
+logger = LOGGER
+
+SCAN_DAEMON_STATUS_OK = "ok"
+SCAN_DAEMON_STATUS_REJECTED = "rejected"
+SCAN_DAEMON_STATUS_ERROR = "error"
+
+# Git sets these for the hooks it runs, e.g. GIT_INDEX_FILE for git commit -a, so the daemon must use the client's
+GIT_ENV_PREFIX = "GIT_"
+
+
+def get_scan_daemon_socket_path() -> str:
+    return os.path.join(DEFAULT_CACHE_DIRECTORY, SCAN_DAEMON_SOCKET_FILE)
+
+
+class ScanDaemonClient:
+    """
+
+    Sends a scan to a scan daemon started with hooks-cli serve, see ScanDaemon. A request is a single json document,
+    sent before the client closes its side of the connection, and the daemon replies with a single json document before
+    closing the connection.
+
+    The daemon only accepts scans from a client with the same working directory, protocol version, hooks version and
+    fingerprint as its own, see ScanReceipts.get_fingerprint. Any other scan is rejected, and the client scans in process
+    instead. The client's git environment variables are sent with the scan, and used by the daemon while it runs it. A
+    daemon that does not reply within the timeout is treated the same as there being no daemon.
+
+    """
+
+    def __init__(self, socket_path: str | None = None, timeout: float = SCAN_DAEMON_TIMEOUT_SECONDS) -> None:
+        self.socket_path = socket_path if socket_path else get_scan_daemon_socket_path()
+        self.timeout = timeout
+
+    def get_request(self, scan_args: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "version": SCAN_DAEMON_PROTOCOL_VERSION,
+            "hooks_version": ScanReceipts.get_hooks_version(),
+            "cwd": os.getcwd(),
+            "fingerprint": ScanReceipts.get_fingerprint(),
+            "git_env": {name: value for name, value in os.environ.items() if name.startswith(GIT_ENV_PREFIX)},
+            "args": scan_args,
+        }
+
+    async def run_scan(self, scan_args: Dict[str, Any]) -> Dict[str, Any] | None:
+        """Runs a scan in the daemon
+
+        Args:
+            scan_args (Dict[str, Any]): The RunSecurityScan arguments, see RunSecurityScan.get_scan_args
+
+        Returns:
+            Dict[str, Any] | None: The RunSecurityScanResult as a dict, or None if there is no daemon running or the
+            daemon did not run the scan
+        """
+        if not await Path(self.socket_path).exists():
+            logger.debug("No scan daemon is running, there is no socket at %s", self.socket_path)
+            return None
+
+        try:
+            with fail_after(self.timeout):
+                async with await connect_unix(self.socket_path) as stream:
+                    await stream.send(json.dumps(self.get_request(scan_args)).encode())
+                    await stream.send_eof()
+                    response = json.loads(b"".join([chunk async for chunk in stream]))
+        except TimeoutError:
+            logger.warning("The scan daemon at %s did not reply within %s seconds", self.socket_path, self.timeout)
+            return None
+        except (OSError, json.JSONDecodeError) as exc:
+            logger.debug("Could not run the scan in the scan daemon at %s: %s", self.socket_path, exc)
+            return None
+
+        if response.get("status") != SCAN_DAEMON_STATUS_OK:
+            logger.debug("The scan daemon did not run the scan, %s: %s", response.get("status"), response.get("reason"))
+            return None
+
+        logger.debug("The scan was run by the scan daemon at %s", self.socket_path)
+        return response["result"]
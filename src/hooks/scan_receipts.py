@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import time
+
+from anyio import Path, to_thread
+from importlib.metadata import PackageNotFoundError, version
+from pathlib import Path as SyncPath
+from typing import List
+
+from src.hooks.cache_directory import write_cache_file
+from src.hooks.config import (
+    DEFAULT_CACHE_DIRECTORY,
+    LOGGER,
+    PRESIDIO_EXCLUSIONS_FILE_PATH,
+    SCAN_RECEIPTS_DIRECTORY,
+    SCAN_RECEIPTS_MAX_ENTRIES,
+    TRUFFLEHOG_EXCLUSIONS_FILE_PATH,
+)
+from src.hooks.git_files import get_staged_tree
+from src.hooks.presidio.result_cache import PresidioResultCache
+from src.hooks.trufflehog.vendors import AllowedTrufflehogVendor
+
+logger = LOGGER
+
+
+class ScanReceipts:
+    """
+
+    Receipts of the scans run_scan has passed, so content that has already passed is never scanned again, e.g. after an
+    amend, reword or rebase that leaves the staged tree unchanged. A receipt is only ever a way to skip a scan, a staged
+    tree without one is scanned as normal.
+
+    A receipt is keyed on the staged tree and a fingerprint of everything that can change the result of a scan, and
+    lists the paths that were scanned and the scans that were excluded. Any error reading or writing a receipt is treated
+    as there being no receipt, so the worst case is a scan being run again.
+
+    """
+
+    def __init__(
+        self,
+        cache_directory: str = DEFAULT_CACHE_DIRECTORY,
+        max_entries: int = SCAN_RECEIPTS_MAX_ENTRIES,
+    ) -> None:
+        self.receipts_directory = Path(cache_directory, SCAN_RECEIPTS_DIRECTORY)
+        self.max_entries = max_entries
+
+    @staticmethod
+    def get_hooks_version() -> str | None:
+        """Gets the installed github-standards version
+
+        Returns:
+            str | None: The version, or None if github-standards is not installed as a package
+        """
+        try:
+            return version("github-standards")
+        except PackageNotFoundError:
+            logger.debug("Could not find the installed github-standards version")
+            return None
+
+    @staticmethod
+    def get_fingerprint(config_fingerprint: str | None = None, hooks_version: str | None = None) -> str:
+        """Creates a fingerprint of everything that can change the result of scanning the same content
+
+        Args:
+            config_fingerprint (str | None, optional): The presidio config fingerprint to use, e.g. the one a scan daemon
+            loaded its analyzer with. Defaults to None, which uses the current presidio config.
+            hooks_version (str | None, optional): The github-standards version to use. Defaults to None, which uses the
+            installed version.
+
+        Returns:
+            str: A sha256 hex digest of the presidio config, the exclusions files, the trufflehog detectors and the hooks
+            version
+        """
+        fingerprint = hashlib.sha256()
+        fingerprint.update((config_fingerprint or PresidioResultCache.get_config_fingerprint()).encode())
+        for exclusions_file in [TRUFFLEHOG_EXCLUSIONS_FILE_PATH, PRESIDIO_EXCLUSIONS_FILE_PATH]:
+            try:
+                fingerprint.update(SyncPath(exclusions_file).read_bytes())
+            except OSError:
+                fingerprint.update(b"missing")
+            fingerprint.update(b"\0")
+        fingerprint.update(",".join(AllowedTrufflehogVendor.all_vendor_codes()).encode())
+        fingerprint.update((hooks_version or ScanReceipts.get_hooks_version() or "").encode())
+        return fingerprint.hexdigest()
+
+    async def get_key(self) -> str | None:
+        """Gets the key of the receipt for the staged tree
+
+        Returns:
+            str | None: The key, or None if the staged tree could not be found
+        """
+        tree = await get_staged_tree()
+        if tree is None:
+            return None
+        return f"{tree}-{await to_thread.run_sync(self.get_fingerprint)}"
+
+    def _get_receipt_file(self, key: str) -> Path:
+        return self.receipts_directory / f"{key}.json"
+
+    async def has_passed(self, key: str, paths: List[str] | None = None, excluded_scans: List[str] | None = None) -> bool:
+        """Checks for a receipt of a passed scan
+
+        Args:
+            key (str): The receipt key, see get_key
+            paths (List[str] | None, optional): Paths that must all have been scanned, or None to accept a receipt for
+            any paths. Defaults to None.
+            excluded_scans (List[str] | None, optional): The scans that can have been excluded, or None to accept a
+            receipt whatever scans were excluded. Defaults to None.
+
+        Returns:
+            bool: True if there is a receipt covering the paths and scans
+        """
+        try:
+            receipt = json.loads(await self._get_receipt_file(key).read_text())
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as exc:
+            logger.debug("The scan receipt %s could not be read: %s", key, exc)
+            return False
+
+        if paths is not None and not {os.path.normpath(path) for path in paths}.issubset(receipt.get("paths", [])):
+            logger.debug("The scan receipt %s does not include every path being scanned", key)
+            return False
+
+        if excluded_scans is not None and not set(receipt.get("excluded_scans", [])).issubset(excluded_scans):
+            logger.debug("The scan receipt %s is for a scan that excluded %s", key, receipt.get("excluded_scans"))
+            return False
+
+        return True
+
+    async def record(self, key: str, paths: List[str], excluded_scans: List[str]):
+        """Records a receipt of a passed scan
+
+        Args:
+            key (str): The receipt key, see get_key
+            paths (List[str]): The paths that were scanned
+            excluded_scans (List[str]): The scans that were excluded
+        """
+        receipt = {
+            "paths": sorted({os.path.normpath(path) for path in paths}),
+            "excluded_scans": sorted(excluded_scans),
+            "created_at": time.time(),
+        }
+        try:
+            await write_cache_file(
+                self._get_receipt_file(key), json.dumps(receipt), cache_directory=self.receipts_directory.parent
+            )
+            logger.debug("Recorded scan receipt %s", key)
+
+            await to_thread.run_sync(self._evict)
+        except OSError as exc:
+            logger.debug("The scan receipt %s could not be written: %s", key, exc)
+
+    def _evict(self):
+        receipt_files = list(SyncPath(self.receipts_directory).glob("*.json"))
+        if len(receipt_files) <= self.max_entries:
+            return
+
+        receipt_files.sort(key=lambda receipt_file: receipt_file.stat().st_mtime)
+        for receipt_file in receipt_files[: len(receipt_files) - self.max_entries]:
+            receipt_file.unlink(missing_ok=True)
+        logger.debug("Removed %s of the oldest scan receipts", len(receipt_files) - self.max_entries)
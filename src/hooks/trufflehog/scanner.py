@@ -1,39 +1,179 @@
+import ipaddress
+import json
 import os
+import subprocess
 
-from anyio import run_process, Path
+from anyio import CapacityLimiter, TemporaryDirectory, create_task_group, open_process, to_thread, Path
+from anyio.abc import ByteReceiveStream
+from anyio.streams.text import TextReceiveStream
+from collections import deque
+from contextlib import asynccontextmanager
 from io import StringIO
 
-from proxy import Proxy
-from typing import List
+from prettytable import PrettyTable
+from typing import Any, AsyncIterator, Deque, Dict, List
 
 
 from src.hooks.config import (
+    DEFAULT_DIFF_BASE,
     DEFAULT_PROXY_DIRECTORY,
+    TRUFFLEHOG_ERROR_CODE,
+    TRUFFLEHOG_ERROR_LOG_LINES,
     TRUFFLEHOG_EXCLUSIONS_FILE_PATH,
     LOGGER,
-    TRUFFLEHOG_PROXY,
+    TRUFFLEHOG_PROXY_HOST,
     TRUFFLEHOG_INFO_LOG_LEVEL,
+    TRUFFLEHOG_MAX_SHARD_ARGS_LENGTH,
     TRUFFLEHOG_SUCCESS_CODE,
     TRUFFLEHOG_VERBOSE_LOG_LEVEL,
 )
-from src.proxy.plugins import OutgoingRequestInterceptorPlugin
+from src.hooks.git_files import StagedFiles
+from src.hooks.profiler import profile_async_context, profile_context, profile_span
+from src.proxy.egress_proxy import EgressProxy
 
 logger = LOGGER
 
 
+class TrufflehogFinding:
+    def __init__(
+        self,
+        detector_name: str,
+        file: str | None = None,
+        line: int | None = None,
+        commit: str | None = None,
+        verified: bool = False,
+        redacted: str | None = None,
+    ) -> None:
+        self.detector_name = detector_name
+        self.file = file
+        self.line = line
+        self.commit = commit
+        self.verified = verified
+        self.redacted = redacted
+
+    def __repr__(self) -> str:
+        return json.dumps(
+            {
+                "detector": self.detector_name,
+                "file": self.file,
+                "line": self.line,
+                "commit": self.commit,
+                "verified": self.verified,
+            }
+        )
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, TrufflehogFinding) and self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def _key(self):
+        return (self.detector_name, self.file, self.line, self.commit, self.verified, self.redacted)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "detector_name": self.detector_name,
+            "file": self.file,
+            "line": self.line,
+            "commit": self.commit,
+            "verified": self.verified,
+            "redacted": self.redacted,
+        }
+
+    @staticmethod
+    def from_dict(finding: Dict[str, Any]) -> "TrufflehogFinding":
+        return TrufflehogFinding(
+            finding["detector_name"],
+            file=finding["file"],
+            line=finding["line"],
+            commit=finding["commit"],
+            verified=finding["verified"],
+            redacted=finding["redacted"],
+        )
+
+    @staticmethod
+    def from_json(finding: Dict[str, Any]) -> "TrufflehogFinding":
+        """Creates a finding from a result trufflehog has written with the --json flag
+
+        Args:
+            finding (Dict[str, Any]): The parsed json result
+
+        Returns:
+            TrufflehogFinding: The finding
+        """
+        # The metadata is keyed on the source type, e.g. {"Filesystem": {"file": ..., "line": ...}} or {"Git": {...}}
+        source_data = finding.get("SourceMetadata", {}).get("Data", {})
+        source = next(iter(source_data.values()), {}) if source_data else {}
+        return TrufflehogFinding(
+            finding.get("DetectorName", "Unknown"),
+            file=source.get("file"),
+            line=source.get("line"),
+            commit=source.get("commit"),
+            verified=finding.get("Verified", False),
+            redacted=finding.get("Redacted") or None,
+        )
+
+
 class TrufflehogScanResult:
-    def __init__(self, detected_keys: str | None = None) -> None:
-        self.detected_keys = detected_keys
+    def __init__(self, findings: List[TrufflehogFinding] | None = None, error: str | None = None) -> None:
+        # Trufflehog can report the same secret more than once, e.g. from more than one decoder
+        self.findings = list(dict.fromkeys(findings)) if findings else []
+        self.error = error
+
+    def has_issues(self) -> bool:
+        return len(self.findings) > 0 or self.error is not None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"findings": [finding.to_dict() for finding in self.findings], "error": self.error}
+
+    @staticmethod
+    def from_dict(result: Dict[str, Any]) -> "TrufflehogScanResult":
+        return TrufflehogScanResult(
+            [TrufflehogFinding.from_dict(finding) for finding in result["findings"]], error=result["error"]
+        )
+
+    @staticmethod
+    def merge(results: List["TrufflehogScanResult"]) -> "TrufflehogScanResult":
+        """Combines the results of trufflehog processes that each scanned part of the paths
+
+        Args:
+            results (List[TrufflehogScanResult]): The result of each process
+
+        Returns:
+            TrufflehogScanResult: The findings of every process, and the errors of any process that failed to run
+        """
+        findings = [finding for result in results for finding in result.findings]
+        errors = [result.error for result in results if result.error is not None]
+        return TrufflehogScanResult(findings, error="\n".join(errors) if errors else None)
 
     def __str__(self) -> str:
         with StringIO() as output_buffer:
             output_buffer.write("--------SECURITY SCAN SUMMARY--------")
-            if self.detected_keys:
-                output_buffer.write(self.detected_keys)
+            if self.error:
+                output_buffer.write("\n\nTHE SECURITY SCAN FAILED TO RUN\n")
+                output_buffer.write(self.error)
+
+            if self.findings:
+                output_buffer.write(f"\n\n{len(self.findings)} POTENTIAL SECRETS FOUND\n")
+                table = PrettyTable(["File", "Line", "Commit", "Detector", "Verified", "Redacted"])
+                for finding in sorted(self.findings, key=lambda f: (f.file or "", f.line or 0, f.detector_name)):
+                    table.add_row(
+                        [
+                            finding.file,
+                            finding.line,
+                            finding.commit,
+                            finding.detector_name,
+                            finding.verified,
+                            finding.redacted,
+                        ]
+                    )
+                output_buffer.write(str(table))
                 output_buffer.write(
                     "\n\nTO EXCLUDE THESE FILES FROM BEING SCANNED FOR SECURITY DATA, FOLLOW THE INSTRUCTIONS AT https://github.com/uktrade/github-standards?tab=readme-ov-file#excluding-false-positives"
                 )
-            else:
+
+            if not self.has_issues():
                 output_buffer.write("No security issues detected")
             return output_buffer.getvalue()
 
@@ -43,15 +183,27 @@ class TrufflehogScanner:
         self,
         verbose: bool = False,
         paths: List[str] | None = None,
+        staged_files: StagedFiles | None = None,
+        shards: int = 1,
+        concurrency: int | None = None,
+        in_process_proxy: bool = False,
+        proxy_url: str | None = None,
     ) -> None:
         self.verbose = verbose
         self.paths = paths if paths else []
+        self.staged_files = staged_files
+        self.shards = shards
+        self.concurrency = concurrency
+        self.in_process_proxy = in_process_proxy
+        self.proxy_url = proxy_url
 
     async def _get_args(
         self,
         paths: List[str],
         github_action: bool = False,
         allowed_vendor_codes: List[str] = [],
+        since_commit: str = DEFAULT_DIFF_BASE,
+        exclusions_file: str = TRUFFLEHOG_EXCLUSIONS_FILE_PATH,
     ) -> List[str]:
         trufflehog_log_level = TRUFFLEHOG_VERBOSE_LOG_LEVEL if self.verbose else TRUFFLEHOG_INFO_LOG_LEVEL
 
@@ -70,15 +222,19 @@ class TrufflehogScanner:
             "--fail",
             "--no-update",
             "--results=verified,unknown",
+            "--json",
             f"--log-level={trufflehog_log_level}",
         ]
 
         if github_action:
-            trufflehog_cmd_args.append("--since-commit=main")
+            trufflehog_cmd_args.append(f"--since-commit={since_commit}")
+
+        if self.concurrency:
+            trufflehog_cmd_args.append(f"--concurrency={self.concurrency}")
 
-        if await Path(TRUFFLEHOG_EXCLUSIONS_FILE_PATH).exists():
+        if await Path(exclusions_file).exists():
             logger.debug("Security scanner exclusions file loaded")
-            trufflehog_cmd_args.append(f"--exclude-paths={TRUFFLEHOG_EXCLUSIONS_FILE_PATH}")
+            trufflehog_cmd_args.append(f"--exclude-paths={exclusions_file}")
 
         trufflehog_detectors = ",".join(allowed_vendor_codes)
         logger.debug(
@@ -93,54 +249,273 @@ class TrufflehogScanner:
 
         return trufflehog_cmd_args
 
-    def _get_trufflehog_env_vars(self):
+    def _get_trufflehog_env_vars(self, proxy_url: str):
         env = dict(os.environ)
-        env["HTTP_PROXY"] = TRUFFLEHOG_PROXY
-        env["HTTPS_PROXY"] = TRUFFLEHOG_PROXY
+        env["HTTP_PROXY"] = proxy_url
+        env["HTTPS_PROXY"] = proxy_url
         return env
 
+    @asynccontextmanager
+    async def _run_proxy(self, allowed_vendor_endpoints: List[str]) -> AsyncIterator[str]:
+        """Runs the proxy trufflehog sends its requests through, blocking any requests to endpoints that have not been
+        explicitly allowed
+
+        Args:
+            allowed_vendor_endpoints (List[str]): The endpoints trufflehog is allowed to call
+
+        Yields:
+            str: The url of the running proxy
+        """
+        if self.proxy_url:
+            # A proxy that is already running, such as the scan daemon's, is used as is
+            yield self.proxy_url
+            return
+
+        if self.in_process_proxy:
+            async with profile_async_context(
+                "trufflehog.proxy", EgressProxy(allowed_vendor_endpoints), proxy="egress_proxy"
+            ) as egress_proxy:
+                yield egress_proxy.url
+            return
+
+        # proxy.py is only imported when it is used, it is slow to import and not needed by the in process proxy
+        from proxy import Proxy
+
+        from src.proxy.plugins import OutgoingRequestInterceptorPlugin
+
+        # Every run gets its own data directory, so runs on the same machine never share proxy.py state
+        await Path(DEFAULT_PROXY_DIRECTORY).mkdir(parents=True, exist_ok=True)
+        async with TemporaryDirectory(prefix="run_", dir=DEFAULT_PROXY_DIRECTORY) as proxy_directory:
+            logger.debug("Using the %s folder for storing proxy.py data", proxy_directory)
+            with profile_context(
+                "trufflehog.proxy",
+                Proxy(
+                    hostname=ipaddress.ip_address(TRUFFLEHOG_PROXY_HOST),
+                    port=0,
+                    plugins=[OutgoingRequestInterceptorPlugin],
+                    log_level="ERROR",
+                    enable_events=False,
+                    input_args=[
+                        "--allowed-trufflehog-vendor-endpoints",
+                        ",".join(allowed_vendor_endpoints),
+                        "--cache-dir",
+                        os.path.join(proxy_directory, "cache"),
+                    ],
+                    data_dir=proxy_directory,
+                    ca_cert_dir=os.path.join(proxy_directory, "certs"),
+                ),
+                proxy="proxy.py",
+            ) as proxy:
+                # A port of 0 is replaced by the port the OS assigned once the proxy is listening
+                yield f"http://{TRUFFLEHOG_PROXY_HOST}:{proxy.flags.port}"
+
+    async def _log_stderr(self, stderr: ByteReceiveStream, stderr_tail: Deque[str]):
+        async for line in TextReceiveStream(stderr, errors="replace"):
+            for log_line in line.splitlines():
+                logger.debug("Trufflehog: %s", log_line)
+                stderr_tail.append(log_line)
+
+    async def _run_trufflehog(self, args: List[str], env: Dict[str, str], cwd: str | None = None) -> TrufflehogScanResult:
+        """Runs trufflehog, parsing each json finding as soon as it is written. The first finding is logged while the
+        scan is still running, rather than once it has finished
+
+        Args:
+            args (List[str]): The trufflehog command
+            env (Dict[str, str]): The environment variables for the trufflehog process
+            cwd (str | None, optional): The directory to run trufflehog from. Defaults to None.
+
+        Returns:
+            TrufflehogScanResult: The findings, or the end of the trufflehog log if it failed to run
+        """
+        findings: List[TrufflehogFinding] = []
+        stderr_tail: Deque[str] = deque(maxlen=TRUFFLEHOG_ERROR_LOG_LINES)
+
+        with profile_span("trufflehog.process") as span:
+            async with await open_process(args, env=env, cwd=cwd, stdin=subprocess.DEVNULL) as process:
+                async with create_task_group() as tg:
+                    # stderr has to be read at the same time as stdout, otherwise trufflehog blocks once the pipe is full
+                    tg.start_soon(self._log_stderr, process.stderr, stderr_tail)
+
+                    async for line in self._iter_lines(process.stdout):  # type: ignore
+                        finding = self._parse_finding(line)
+                        if finding:
+                            if not findings:
+                                logger.info("The security scan found a potential secret, the scan is still running")
+                            logger.debug("Trufflehog found %s", finding)
+                            findings.append(finding)
+            span["returncode"] = process.returncode
+            span["findings"] = len(findings)
+
+        logger.debug("Trufflehog returncode was '%s'", process.returncode)
+        if process.returncode == TRUFFLEHOG_SUCCESS_CODE and not findings:
+            logger.debug("Trufflehog security scan successfully completed")
+            return TrufflehogScanResult()
+
+        if process.returncode in [TRUFFLEHOG_SUCCESS_CODE, TRUFFLEHOG_ERROR_CODE] and findings:
+            logger.debug("Trufflehog security scan found %s potential secrets", len(findings))
+            return TrufflehogScanResult(findings)
+
+        logger.debug("Trufflehog security scan failed with returncode %s", process.returncode)
+        return TrufflehogScanResult(findings, error="\n".join(stderr_tail))
+
+    async def _iter_lines(self, stream: ByteReceiveStream) -> AsyncIterator[bytes]:
+        pending = b""
+        async for chunk in stream:
+            lines = (pending + chunk).split(b"\n")
+            pending = lines.pop()
+            for line in lines:
+                yield line
+        if pending:
+            yield pending
+
+    def _parse_finding(self, line: bytes) -> TrufflehogFinding | None:
+        if not line.strip():
+            return None
+        try:
+            return TrufflehogFinding.from_json(json.loads(line))
+        except (json.JSONDecodeError, AttributeError):
+            logger.debug("Trufflehog output line is not a json finding: %s", line)
+            return None
+
+    def _get_path_size(self, path: str) -> int:
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+    def _get_path_shards(self, paths: List[str], cwd: str | None = None) -> List[List[str]]:
+        """Splits the paths into shards with a similar total file size, so each trufflehog process has a similar amount
+        of work. There is a shard for each allowed process, more are added if the paths in a shard would go over
+        TRUFFLEHOG_MAX_SHARD_ARGS_LENGTH
+
+        Args:
+            paths (List[str]): The paths to split
+            cwd (str | None, optional): The directory relative paths are resolved from. Defaults to None.
+
+        Returns:
+            List[List[str]]: The paths in each shard, with no empty shards
+        """
+        path_sizes = {path: self._get_path_size(os.path.join(cwd, path) if cwd else path) for path in paths}
+
+        shards: List[List[str]] = [[] for _ in range(min(self.shards, len(paths)))]
+        shard_sizes = [0] * len(shards)
+        shard_args_lengths = [0] * len(shards)
+        # Largest first, each path going to the shard with the smallest total size that still has room for it
+        for path in sorted(paths, key=lambda path: path_sizes[path], reverse=True):
+            args_length = len(os.fsencode(path)) + 1
+            shards_with_room = [
+                index
+                for index in range(len(shards))
+                if not shards[index] or shard_args_lengths[index] + args_length <= TRUFFLEHOG_MAX_SHARD_ARGS_LENGTH
+            ]
+            if shards_with_room:
+                index = min(shards_with_room, key=lambda index: (shard_sizes[index], len(shards[index])))
+            else:
+                shards.append([])
+                shard_sizes.append(0)
+                shard_args_lengths.append(0)
+                index = len(shards) - 1
+
+            shards[index].append(path)
+            shard_sizes[index] += path_sizes[path]
+            shard_args_lengths[index] += args_length
+
+        return [shard for shard in shards if shard]
+
+    async def _run_sharded(
+        self,
+        paths: List[str],
+        env: Dict[str, str],
+        allowed_vendor_codes: List[str],
+        exclusions_file: str = TRUFFLEHOG_EXCLUSIONS_FILE_PATH,
+        cwd: str | None = None,
+    ) -> TrufflehogScanResult:
+        """Runs trufflehog in filesystem mode over shards of the paths, with at most self.shards processes running at the
+        same time. Every process uses the same proxy
+
+        Args:
+            paths (List[str]): The paths to scan
+            env (Dict[str, str]): The environment variables for the trufflehog processes
+            allowed_vendor_codes (List[str]): The detectors trufflehog should run
+            exclusions_file (str, optional): The trufflehog exclusions file. Defaults to TRUFFLEHOG_EXCLUSIONS_FILE_PATH.
+            cwd (str | None, optional): The directory to run trufflehog from. Defaults to None.
+
+        Returns:
+            TrufflehogScanResult: The merged result of every shard
+        """
+        path_shards = await to_thread.run_sync(self._get_path_shards, paths, cwd)
+        if len(path_shards) <= 1:
+            args = await self._get_args(paths, allowed_vendor_codes=allowed_vendor_codes, exclusions_file=exclusions_file)
+            return await self._run_trufflehog(args, env, cwd=cwd)
+
+        logger.debug("Running trufflehog on %s shards of %s paths", len(path_shards), len(paths))
+        limiter = CapacityLimiter(self.shards)
+        results: List[TrufflehogScanResult] = [TrufflehogScanResult()] * len(path_shards)
+
+        async def run_shard(index: int, shard: List[str]):
+            async with limiter:
+                args = await self._get_args(
+                    shard, allowed_vendor_codes=allowed_vendor_codes, exclusions_file=exclusions_file
+                )
+                results[index] = await self._run_trufflehog(args, env, cwd=cwd)
+
+        async with create_task_group() as tg:
+            for index, shard in enumerate(path_shards):
+                tg.start_soon(run_shard, index, shard)
+
+        return TrufflehogScanResult.merge(results)
+
+    async def _run_on_staged_files(self, env: Dict[str, str], allowed_vendor_codes: List[str]) -> TrufflehogScanResult:
+        """Runs trufflehog against the staged contents of the paths, rather than the working tree. Git writes the staged
+        files into a temporary directory, and trufflehog runs from that directory so findings are reported with the same
+        relative paths as a working tree scan
+
+        Args:
+            env (Dict[str, str]): The environment variables for the trufflehog process
+            allowed_vendor_codes (List[str]): The detectors trufflehog should run
+
+        Returns:
+            TrufflehogScanResult: The result of the scan
+        """
+        async with TemporaryDirectory() as staged_directory:
+            await self.staged_files.checkout(staged_directory)  # type: ignore
+
+            # Paths that are not staged, e.g. untracked files, are still read from the working tree
+            paths = [
+                os.path.normpath(path) if self.staged_files.get(path) else os.path.abspath(path)  # type: ignore
+                for path in self.paths
+            ]
+            return await self._run_sharded(
+                paths,
+                env,
+                allowed_vendor_codes,
+                exclusions_file=os.path.abspath(TRUFFLEHOG_EXCLUSIONS_FILE_PATH),
+                cwd=staged_directory,
+            )
+
     async def scan(
         self,
         github_action: bool = False,
         allowed_vendor_endpoints: List[str] = [],
         allowed_vendor_codes: List[str] = [],
+        since_commit: str = DEFAULT_DIFF_BASE,
     ) -> TrufflehogScanResult:
         # A cyber condition has been applied to using trufflehog, where the endpoints called by the trufflehog scanner
-        # need to be monitored. We don't have that in place currently, so for now use proxy.py running locally and block
-        # any requests made by trufflehog that have not been explicitly allowed
-
-        logger.debug("Using the %s folder for storing proxy.py data", DEFAULT_PROXY_DIRECTORY)
-        with Proxy(
-            port=8899,
-            plugins=[OutgoingRequestInterceptorPlugin],
-            log_level="ERROR",
-            enable_events=False,
-            input_args=[
-                "--allowed-trufflehog-vendor-endpoints",
-                ",".join(allowed_vendor_endpoints),
-                "--cache-dir",
-                f"{DEFAULT_PROXY_DIRECTORY}/cache",
-            ],
-            data_dir=DEFAULT_PROXY_DIRECTORY,
-            ca_cert_dir=f"{DEFAULT_PROXY_DIRECTORY}/certs",
-        ):
-            env = self._get_trufflehog_env_vars()
-
-            args = await self._get_args(
-                self.paths,
-                github_action,
-                allowed_vendor_codes,
-            )
-            trufflehog_run = await run_process(
-                args,
-                check=False,
-                env=env,
-            )
+        # need to be monitored. We don't have that in place currently, so for now run a proxy locally and block any
+        # requests made by trufflehog that have not been explicitly allowed
+        async with self._run_proxy(allowed_vendor_endpoints) as proxy_url:
+            env = self._get_trufflehog_env_vars(proxy_url)
 
-            logger.debug("Trufflehog returncode was '%s'", trufflehog_run.returncode)
-            if trufflehog_run.returncode != TRUFFLEHOG_SUCCESS_CODE:
-                logger.debug("Trufflehog security scan failed with result: %s", trufflehog_run.stderr.decode())
-                return TrufflehogScanResult(trufflehog_run.stdout.decode())
+            if self.staged_files and not github_action:
+                return await self._run_on_staged_files(env, allowed_vendor_codes)
 
-            logger.debug("Trufflehog security scan successfully completed with result: %s", trufflehog_run.stdout.decode())
-            return TrufflehogScanResult()
+            if github_action:
+                args = await self._get_args(
+                    self.paths,
+                    github_action,
+                    allowed_vendor_codes,
+                    since_commit,
+                )
+                return await self._run_trufflehog(args, env)
+
+            return await self._run_sharded(self.paths, env, allowed_vendor_codes)
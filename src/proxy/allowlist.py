@@ -0,0 +1,117 @@
+from typing import Dict, List
+
+from src.hooks.config import LOGGER
+
+logger = LOGGER
+
+WILDCARD_PREFIX = "*."
+
+
+class EndpointAllowlist:
+    """
+
+    An index of the endpoints trufflehog is allowed to call, built once from the allowed vendor endpoints. This is the
+    allowlist enforced by every proxy trufflehog runs behind.
+
+    Each endpoint is one of:
+
+        api.github.com              an exact host, any path
+        circleci.com/api/v2/me      an exact host, only paths starting with /api/v2/me
+        *.okta.com                  any subdomain of okta.com, optionally followed by a path
+
+    Hosts are looked up in a dict, and wildcard domains by walking the labels of the requested host, so the cost of a
+    lookup does not depend on the number of endpoints.
+
+    """
+
+    def __init__(self, endpoints: List[str]) -> None:
+        # None allows any path on the host, otherwise the path must start with one of the prefixes
+        self._hosts: Dict[str, List[str] | None] = {}
+        self._wildcard_domains: Dict[str, List[str] | None] = {}
+
+        for endpoint in endpoints:
+            endpoint = endpoint.strip()
+            if not endpoint:
+                continue
+
+            host, separator, path = endpoint.partition("/")
+            host = self._normalise_host(host)
+            if host.startswith(WILDCARD_PREFIX):
+                self._add(self._wildcard_domains, host.removeprefix(WILDCARD_PREFIX), f"/{path}" if separator else None)
+            else:
+                self._add(self._hosts, host, f"/{path}" if separator else None)
+
+    @staticmethod
+    def from_flag(flag_value: str) -> "EndpointAllowlist":
+        """Creates the allowlist from a comma separated list of endpoints, as passed to proxy.py
+
+        Args:
+            flag_value (str): The comma separated endpoints
+
+        Returns:
+            EndpointAllowlist: The allowlist
+        """
+        return EndpointAllowlist(flag_value.split(",") if flag_value else [])
+
+    def _normalise_host(self, host: str) -> str:
+        return host.lower().rstrip(".")
+
+    def _add(self, index: Dict[str, List[str] | None], host: str, path_prefix: str | None):
+        if path_prefix is None or (host in index and index[host] is None):
+            index[host] = None
+            return
+
+        index.setdefault(host, []).append(path_prefix.rstrip("/") or "/")  # type: ignore
+
+    def _get_path_rules(self, host: str) -> List[str] | None | bool:
+        if host in self._hosts:
+            return self._hosts[host]
+
+        # Check each parent domain of the host, e.g. a.b.okta.com checks b.okta.com, okta.com then com
+        labels = host.split(".")
+        for index in range(1, len(labels)):
+            domain = ".".join(labels[index:])
+            if domain in self._wildcard_domains:
+                return self._wildcard_domains[domain]
+
+        return False
+
+    def _is_path_allowed(self, path: str, path_prefixes: List[str]) -> bool:
+        path = path.split("?", 1)[0].split("#", 1)[0] or "/"
+        for prefix in path_prefixes:
+            # A prefix only matches whole path segments, /api/v2/me allows /api/v2/me/x but not /api/v2/messages
+            if prefix == "/" or path == prefix or path.startswith(f"{prefix}/"):
+                return True
+        return False
+
+    def is_allowed(self, host: str | None, path: str | None = None) -> bool:
+        """Checks if trufflehog is allowed to call an endpoint
+
+        Args:
+            host (str | None): The host trufflehog is connecting to, without the port
+            path (str | None, optional): The path being requested, if the proxy can see it. Tunnelled HTTPS requests only
+            expose the host, so path rules can not be enforced for them. Defaults to None.
+
+        Returns:
+            bool: True if the endpoint is allowed
+        """
+        path_rules = self._get_path_rules(self._normalise_host(host)) if host else False
+
+        if path_rules is False:
+            logger.info(
+                "The endpoint %s is not an endpoint that has been configured for usage with this security scan", host
+            )
+            return False
+
+        if path_rules is None or path is None:
+            logger.debug("The endpoint %s is an allowed endpoint", host)
+            return True
+
+        if self._is_path_allowed(path, path_rules):  # type: ignore
+            logger.debug("The endpoint %s%s is an allowed endpoint", host, path)
+            return True
+
+        logger.info(
+            "The path %s on endpoint %s is not a path that has been configured for usage with this security scan", path, host
+        )
+        return False
@@ -0,0 +1,163 @@
+from urllib.parse import urlsplit
+
+from anyio import (
+    BrokenResourceError,
+    ClosedResourceError,
+    DelimiterNotFound,
+    IncompleteRead,
+    connect_tcp,
+    create_task_group,
+    create_tcp_listener,
+)
+from anyio.abc import ByteReceiveStream, ByteStream, SocketAttribute, SocketStream, TaskGroup
+from anyio.streams.buffered import BufferedByteReceiveStream
+from typing import List, Tuple
+
+from src.hooks.config import TRUFFLEHOG_PROXY_HOST, EGRESS_PROXY_MAX_HEADER_LENGTH, LOGGER
+from src.proxy.allowlist import EndpointAllowlist
+
+logger = LOGGER
+
+CONNECT_METHOD = b"CONNECT"
+# Headers that only apply to the connection between trufflehog and the proxy, these are never sent upstream
+HOP_BY_HOP_HEADERS = [b"connection", b"keep-alive", b"proxy-authorization", b"proxy-connection"]
+
+
+class EgressProxy:
+    """
+
+    A minimal HTTP proxy that runs on the current event loop, as an alternative to proxy.py. It enforces the same
+    allowlist as the OutgoingRequestInterceptorPlugin, tunnelling CONNECT requests and forwarding plain HTTP requests
+    only for allowed hosts. Nothing is written to disk and there are no worker threads or processes, so it is ready as
+    soon as the listening socket is bound.
+
+    The proxy listens on an ephemeral port on localhost, use url once the proxy has been entered:
+
+        async with EgressProxy(allowed_endpoints) as proxy:
+            env["HTTPS_PROXY"] = proxy.url
+
+    """
+
+    def __init__(self, allowed_endpoints: List[str]) -> None:
+        self.allowlist = EndpointAllowlist(allowed_endpoints)
+        self.port: int | None = None
+        self._listener = None
+        self._task_group: TaskGroup | None = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{TRUFFLEHOG_PROXY_HOST}:{self.port}"
+
+    async def __aenter__(self) -> "EgressProxy":
+        self._listener = await create_tcp_listener(local_host=TRUFFLEHOG_PROXY_HOST, local_port=0)
+        self.port = self._listener.extra(SocketAttribute.local_port)
+
+        self._task_group = create_task_group()
+        await self._task_group.__aenter__()
+        self._task_group.start_soon(self._listener.serve, self._handle, self._task_group)
+
+        logger.debug("Egress proxy listening on %s", self.url)
+        return self
+
+    async def __aexit__(self, *exc_info) -> bool:
+        # Connections still open when the scan finishes are closed along with the listener
+        self._task_group.cancel_scope.cancel()  # type: ignore
+        try:
+            await self._task_group.__aexit__(None, None, None)  # type: ignore
+        finally:
+            await self._listener.aclose()  # type: ignore
+            self._task_group = None
+            self._listener = None
+        return False
+
+    async def _handle(self, client: SocketStream):
+        async with client:
+            try:
+                await self._proxy(client)
+            except Exception:
+                logger.debug("Egress proxy connection failed", exc_info=True)
+
+    def _parse_request(self, head: bytes) -> Tuple[bytes, str, int, str | None, bytes] | None:
+        """Parses the request line and headers sent to the proxy
+
+        Args:
+            head (bytes): The request line and headers, without the final blank line
+
+        Returns:
+            Tuple[bytes, str, int, str | None, bytes] | None: The method, upstream host and port, the path requested and
+            the request line and headers to send upstream for a plain HTTP request. None if the request can not be proxied
+        """
+        lines = head.split(b"\r\n")
+        request_line = lines[0].split(b" ")
+        if len(request_line) != 3:
+            return None
+        method, target, version = request_line
+
+        if method == CONNECT_METHOD:
+            # The target is the authority form "host:port", or "[host]:port" for an IPv6 address
+            host, _, port = target.decode("latin-1").rpartition(":")
+            if not host or not port.isdigit():
+                return None
+            return method, host.strip("[]"), int(port), None, b""
+
+        # Plain HTTP requests use the absolute form "http://host[:port]/path", which is rewritten to the origin form
+        url = urlsplit(target.decode("latin-1"))
+        if url.scheme != "http" or not url.hostname:
+            return None
+        try:
+            port = url.port or 80
+        except ValueError:
+            return None
+
+        path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        headers = [line for line in lines[1:] if line and line.split(b":", 1)[0].strip().lower() not in HOP_BY_HOP_HEADERS]
+        # Each connection is only used for one request, so a second request can not reuse the upstream connection
+        forwarded_head = b"\r\n".join([b" ".join([method, path.encode("latin-1"), version]), *headers, b"Connection: close"])
+        return method, url.hostname, port, path, forwarded_head + b"\r\n\r\n"
+
+    async def _send_status(self, client: SocketStream, status: int, reason: str):
+        await client.send(f"HTTP/1.1 {status} {reason}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".encode())
+
+    async def _proxy(self, client: SocketStream):
+        client_stream = BufferedByteReceiveStream(client)
+        try:
+            head = await client_stream.receive_until(b"\r\n\r\n", EGRESS_PROXY_MAX_HEADER_LENGTH)
+        except (DelimiterNotFound, IncompleteRead):
+            logger.debug("Egress proxy received an incomplete request")
+            return await self._send_status(client, 400, "Bad Request")
+
+        request = self._parse_request(head)
+        if request is None:
+            logger.debug("Egress proxy received a request it can not proxy: %s", head.split(b"\r\n")[0])
+            return await self._send_status(client, 400, "Bad Request")
+
+        method, host, port, path, forwarded_head = request
+        logger.debug("Egress proxy received a %s request for host %s", method.decode(), host)
+        if not self.allowlist.is_allowed(host, path):
+            return await self._send_status(client, 403, "Forbidden")
+
+        try:
+            upstream = await connect_tcp(host, port)
+        except OSError as exc:
+            logger.debug("Egress proxy could not connect to %s:%s: %s", host, port, exc)
+            return await self._send_status(client, 502, "Bad Gateway")
+
+        async with upstream:
+            if method == CONNECT_METHOD:
+                await client.send(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            else:
+                await upstream.send(forwarded_head)
+
+            async with create_task_group() as tg:
+                tg.start_soon(self._pipe, client_stream, upstream)
+                # Once the upstream has finished responding there is nothing left to proxy
+                await self._pipe(upstream, client)
+                tg.cancel_scope.cancel()
+
+    async def _pipe(self, source: ByteReceiveStream, destination: ByteStream):
+        try:
+            async for chunk in source:
+                await destination.send(chunk)
+            await destination.send_eof()
+        except (BrokenResourceError, ClosedResourceError, OSError):
+            pass
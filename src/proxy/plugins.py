@@ -1,13 +1,18 @@
+from functools import lru_cache
+
 from src.hooks.config import (
     LOGGER,
 )
 from typing import Optional
 
+from proxy.http.methods import httpMethods
 from proxy.http.proxy import HttpProxyBasePlugin
 from proxy.http.parser import HttpParser
 from proxy.http.exception import HttpRequestRejected
 from proxy.common.flag import flags
 
+from src.proxy.allowlist import EndpointAllowlist
+
 
 logger = LOGGER
 
@@ -19,26 +24,36 @@ flags.add_argument(
 )
 
 
+@lru_cache
+def get_allowlist(allowed_endpoints: str) -> EndpointAllowlist:
+    """Builds the allowlist once per process, rather than for every request. The flags are the same for every plugin
+    instance, so only one allowlist is ever built
+
+    Args:
+        allowed_endpoints (str): The --allowed-trufflehog-vendor-endpoints flag
+
+    Returns:
+        EndpointAllowlist: The allowlist
+    """
+    return EndpointAllowlist.from_flag(allowed_endpoints)
+
+
 class OutgoingRequestInterceptorPlugin(HttpProxyBasePlugin):
     def before_upstream_connection(
         self,
         request: HttpParser,
     ) -> Optional[HttpParser]:
         endpoint = request.host.decode("utf-8") if request.host else None
+        if request.method == httpMethods.CONNECT:
+            # A CONNECT tunnel only exposes the host, so the path rules can not be checked
+            path = None
+        else:
+            # A plain HTTP request for the root of a host, e.g. GET http://example.com, is parsed without a path
+            path = request.path.decode("utf-8") if isinstance(request.path, bytes) else "/"
         logger.debug("Calling before_upstream_connection for host %s.", endpoint)
 
-        allowed_endpoints = (
-            self.flags.allowed_trufflehog_vendor_endpoints.split(",")
-            if self.flags.allowed_trufflehog_vendor_endpoints
-            else []
-        )
-        logger.debug("Allowed endpoints: %s", allowed_endpoints)
-
-        if endpoint in allowed_endpoints:
-            logger.debug("The endpoint %s is an allowed endpoint", endpoint)
+        allowlist = get_allowlist(self.flags.allowed_trufflehog_vendor_endpoints or "")
+        if allowlist.is_allowed(endpoint, path):
             return request
 
-        logger.info(
-            "The endpoint %s is not an endpoint that has been configured for usage with this security scan", endpoint
-        )
         raise HttpRequestRejected()
@@ -0,0 +1,31 @@
+"""
+
+Measures how many paths per second PathFilter can check against a set of exclusion regexes. Run with
+
+    python -m tests.benchmarks.path_filter_benchmark [number of paths] [number of exclusions]
+
+"""
+
+import re
+import sys
+import time
+
+from src.hooks.presidio.path_filter import ExclusionMatcher, PathFilter
+
+
+def run_benchmark(path_count: int, exclusion_count: int) -> float:
+    exclusions = ExclusionMatcher([re.compile(f"^generated/module_{index}/.*\\.json$") for index in range(exclusion_count)])
+    paths = [f"src/package_{index % 100}/module_{index}.py" for index in range(path_count)]
+    path_filter = PathFilter()
+
+    start = time.perf_counter()
+    for path in paths:
+        path_filter._is_path_excluded(path, exclusions)
+    return path_count / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    path_count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    exclusion_count = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    paths_per_second = run_benchmark(path_count, exclusion_count)
+    sys.stdout.write(f"Checked {path_count} paths against {exclusion_count} exclusions: {paths_per_second:,.0f} paths/s\n")
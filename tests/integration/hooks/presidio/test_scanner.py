@@ -7,7 +7,7 @@ from tempfile import NamedTemporaryFile as NamedTemporaryFileSync
 from unittest.mock import patch
 
 from presidio_analyzer import Pattern, PatternRecognizer
-from src.hooks.presidio.path_filter import PathFilter
+from src.hooks.presidio.path_filter import ExclusionMatcher, PathFilter
 from src.hooks.presidio.scanner import PresidioScanner
 from presidio_analyzer.predefined_recognizers.generic import PhoneRecognizer, EmailRecognizer
 
@@ -87,9 +87,9 @@ class TestPresidioScanner:
             suffix=".txt",
         ) as tf:
             with (
-                patch.object(PathFilter, "_get_exclusions") as mock_exclusions,
+                patch.object(PathFilter, "_get_exclusion_matcher") as mock_exclusions,
             ):
-                mock_exclusions.return_value = []
+                mock_exclusions.return_value = ExclusionMatcher([])
                 await tf.write(postcode_str)
                 await tf.seek(0)
 
@@ -125,13 +125,59 @@ class TestPresidioScanner:
         ),
     )
     async def test_scan_path_with_test_file_containing_personal_data_returns_at_least_one_match(self, file):
-        with patch.object(PathFilter, "_get_exclusions") as mock_exclusions:
-            mock_exclusions.return_value = []
+        with patch.object(PathFilter, "_get_exclusion_matcher") as mock_exclusions:
+            mock_exclusions.return_value = ExclusionMatcher([])
             results = await PresidioScanner(verbose=True, paths=[file]).scan()
 
             assert len(results.paths_containing_personal_data) > 0
             assert len(results.paths_without_personal_data) == 0
 
+    async def test_scan_csv_file_returns_line_number_for_each_match(self):
+        with patch.object(PathFilter, "_get_exclusion_matcher") as mock_exclusions:
+            mock_exclusions.return_value = ExclusionMatcher([])
+            results = await PresidioScanner(paths=["tests/test_data/personal_data.csv"]).scan()
+
+            detections = results.paths_containing_personal_data[0].results
+            assert {detection.line_number for detection in detections} == {2}
+            assert "john.smith@test.com" in {detection.text_value for detection in detections}
+
+    async def test_scan_file_larger_than_window_size_returns_line_number_for_each_match(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            line = "There is no personal data on this line\n"
+            lines_per_window = scanner.PRESIDIO_WINDOW_SIZE // len(line)
+            await tf.write(line * lines_per_window + "john.smith@test.com\n" + line * lines_per_window)
+            await tf.write("jane.smith@test.com\n")
+            await tf.flush()
+
+            with patch.object(PathFilter, "_get_exclusion_matcher") as mock_exclusions:
+                mock_exclusions.return_value = ExclusionMatcher([])
+                results = await PresidioScanner(paths=[str(tf.name)]).scan()
+
+            detections = results.paths_containing_personal_data[0].results
+            assert [(detection.text_value, detection.line_number) for detection in detections] == [
+                ("john.smith@test.com", lines_per_window + 1),
+                ("jane.smith@test.com", lines_per_window * 2 + 2),
+            ]
+
+    async def test_scan_with_multiple_jobs_returns_same_results_as_single_job(self):
+        paths = [
+            "tests/test_data/personal_data.csv",
+            "tests/test_data/personal_data.txt",
+            "tests/test_data/personal_data.yaml",
+        ]
+        with patch.object(PathFilter, "_get_exclusion_matcher") as mock_exclusions:
+            mock_exclusions.return_value = ExclusionMatcher([])
+            single_job_results = await PresidioScanner(paths=paths).scan()
+            multiple_job_results = await PresidioScanner(paths=paths, jobs=2).scan()
+
+            def to_values(scan_result):
+                return {
+                    path_result.path: [(r.result.entity_type, r.text_value) for r in path_result.results]
+                    for path_result in scan_result.paths_containing_personal_data
+                }
+
+            assert to_values(multiple_job_results) == to_values(single_job_results)
+
     async def test_scan_for_files_with_each_path_status_returns_expected_results(self):
         async with TemporaryDirectory(delete=True) as td:
             files_to_skip = [
@@ -1,3 +1,5 @@
+import json
+import sys
 import tempfile
 from anyio import NamedTemporaryFile, TemporaryDirectory
 from unittest.mock import patch
@@ -5,6 +7,15 @@ from unittest.mock import patch
 
 from src.hooks.cli import main_async, main
 from src.hooks.config import TRUFFLEHOG_ERROR_CODE
+from src.hooks.trufflehog.scanner import TrufflehogScanner
+
+FINDING = json.dumps(
+    {"SourceMetadata": {"Data": {"Filesystem": {"file": "keys.txt", "line": 1}}}, "DetectorName": "AWS", "Verified": True}
+)
+
+
+def get_fake_trufflehog_args(stdout: str, returncode: int):
+    return [sys.executable, "-c", f"import sys; print({stdout!r}); sys.exit({returncode})"]
 
 
 class TestCLI:
@@ -12,16 +23,14 @@ class TestCLI:
         with (
             tempfile.TemporaryDirectory() as root_td,
             tempfile.NamedTemporaryFile(dir=root_td, mode="w+", prefix="has_personal_data_", suffix=".txt") as root_file,
-            patch("src.hooks.trufflehog.scanner.run_process") as mock_run_process,
+            patch.object(TrufflehogScanner, "_get_args") as mock_get_args,
         ):
             root_file.write("My name is John Smith")
             root_file.write("My email is john.smith@test.com")
             root_file.seek(0)
 
-            # trufflehog needs to be installed, mock the subprocess.run call to avoid calling directly
-            mock_run_process.return_value.stdout = "Found keys".encode()
-            mock_run_process.return_value.stderr = "Called the scanning tool and keys were found".encode()
-            mock_run_process.return_value.returncode = TRUFFLEHOG_ERROR_CODE
+            # trufflehog needs to be installed, run a script that outputs a finding in the same way instead
+            mock_get_args.return_value = get_fake_trufflehog_args(FINDING, TRUFFLEHOG_ERROR_CODE)
 
             assert main(["run_scan", "-v", root_td]) == 1
 
@@ -33,7 +42,7 @@ class TestCLI:
             NamedTemporaryFile(dir=sub_td, mode="w+", prefix="empty_file_", suffix=".txt"),
             NamedTemporaryFile(dir=sub_td, mode="w+", prefix="no_personal_data", suffix=".txt") as dir_file2,
         ):
-            with patch("src.hooks.trufflehog.scanner.run_process") as mock_run_process:
+            with patch.object(TrufflehogScanner, "_get_args") as mock_get_args:
                 await root_file.write("My name is John Smith")
                 await root_file.write("My email is john.smith@test.com")
                 await root_file.seek(0)
@@ -41,13 +50,11 @@ class TestCLI:
                 await dir_file2.write("Nothing to see here")
                 await dir_file2.seek(0)
 
-                # trufflehog needs to be installed, mock the subprocess.run call to avoid calling directly
-                mock_run_process.return_value.stdout = "Found keys".encode()
-                mock_run_process.return_value.stderr = "Called the scanning tool and keys were found".encode()
-                mock_run_process.return_value.returncode = TRUFFLEHOG_ERROR_CODE
+                # trufflehog needs to be installed, run a script that outputs a finding in the same way instead
+                mock_get_args.return_value = get_fake_trufflehog_args(FINDING, TRUFFLEHOG_ERROR_CODE)
 
                 result = await main_async(["run_scan", "-v", root_td])
-                assert mock_run_process.was_called()
+                mock_get_args.assert_called_once()
                 assert result == 1
 
     async def test_run_scan_with_personal_data(self):
@@ -58,7 +65,7 @@ class TestCLI:
             NamedTemporaryFile(dir=sub_td, mode="w+", prefix="empty_file_", suffix=".txt"),
             NamedTemporaryFile(dir=sub_td, mode="w+", prefix="no_personal_data", suffix=".txt") as dir_file2,
         ):
-            with patch("src.hooks.trufflehog.scanner.run_process") as mock_run_process:
+            with patch.object(TrufflehogScanner, "_get_args") as mock_get_args:
                 await root_file.write("My name is John Smith")
                 await root_file.write("My email is john.smith@test.com")
                 await root_file.seek(0)
@@ -66,12 +73,11 @@ class TestCLI:
                 await dir_file2.write("Nothing to see here")
                 await dir_file2.seek(0)
 
-                # trufflehog needs to be installed, mock the subprocess.run call to avoid calling directly
-                mock_run_process.return_value.stdout = "".encode()
-                mock_run_process.return_value.returncode = 0
+                # trufflehog needs to be installed, run a script that outputs no findings in the same way instead
+                mock_get_args.return_value = get_fake_trufflehog_args("", 0)
 
                 result = await main_async(["run_scan", "-v", root_file.name])
-                assert mock_run_process.was_called()
+                mock_get_args.assert_called_once()
                 assert result == 1
 
     async def test_run_scan_with_no_failures(self):
@@ -81,17 +87,16 @@ class TestCLI:
             NamedTemporaryFile(dir=root_td, mode="w+", prefix="empty_file_", suffix=".txt") as root_file,
             NamedTemporaryFile(dir=sub_td, mode="w+", prefix="no_personal_data", suffix=".txt") as dir_file2,
         ):
-            with patch("src.hooks.trufflehog.scanner.run_process") as mock_run_process:
+            with patch.object(TrufflehogScanner, "_get_args") as mock_get_args:
                 await root_file.write("No personal data")
                 await root_file.seek(0)
 
                 await dir_file2.write("Nothing to see here")
                 await dir_file2.seek(0)
 
-                # trufflehog needs to be installed, mock the subprocess.run call to avoid calling directly
-                mock_run_process.return_value.stdout = "".encode()
-                mock_run_process.return_value.returncode = 0
+                # trufflehog needs to be installed, run a script that outputs no findings in the same way instead
+                mock_get_args.return_value = get_fake_trufflehog_args("", 0)
 
                 result = await main_async(["run_scan", "-v", root_file.name, dir_file2.name])
                 assert result == 0
-                assert mock_run_process.was_called()
+                mock_get_args.assert_called_once()
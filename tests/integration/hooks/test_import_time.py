@@ -0,0 +1,57 @@
+import json
+import subprocess
+import sys
+
+from pathlib import Path
+from typing import Dict, List
+
+REPOSITORY_ROOT = Path(__file__).parents[3]
+# Modules that take hundreds of milliseconds or more to import, and are only needed to run a scan
+HEAVY_MODULES = ["aiohttp", "git", "presidio_analyzer", "proxy", "spacy"]
+# Importing the heavy modules takes well over a second, the cli for validate_scan takes a small fraction of that
+VALIDATE_SCAN_IMPORT_TIME_LIMIT_SECONDS = 0.5
+
+
+def get_loaded_heavy_modules(code: str) -> List[str]:
+    """Runs code in a new interpreter, so modules imported by other tests are not already loaded"""
+    script = f"import json, sys\n{code}\nprint(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    result = subprocess.run([sys.executable, "-c", script], cwd=REPOSITORY_ROOT, capture_output=True, check=True)
+    return json.loads(result.stdout)
+
+
+def get_import_times(code: str) -> Dict[str, float]:
+    """Gets the cumulative import time in seconds of each top level module imported by code"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=REPOSITORY_ROOT, capture_output=True, check=True
+    )
+    import_times = {}
+    for line in result.stderr.decode().splitlines():
+        # Each line is "import time: <self us> | <cumulative us> | <module>", nested imports are indented
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line.split("|")
+        if cumulative.strip().isdigit() and not module.startswith("  "):
+            import_times[module.strip()] = int(cumulative) / 1_000_000
+    return import_times
+
+
+class TestImportTime:
+    def test_validate_scan_does_not_import_scan_dependencies(self):
+        code = (
+            'from src.hooks.cli import parse_args\nargs = parse_args(["validate_scan", "COMMIT_EDITMSG"])\nargs.hook(args)'
+        )
+        assert get_loaded_heavy_modules(code) == []
+
+    def test_validate_scan_import_time_is_below_limit(self):
+        import_times = get_import_times("import src.hooks.cli, src.hooks.validate_security_scan")
+        assert import_times["src.hooks.cli"] + import_times.get("src.hooks.validate_security_scan", 0) < (
+            VALIDATE_SCAN_IMPORT_TIME_LIMIT_SECONDS
+        )
+
+    def test_run_scan_does_not_import_scan_dependencies_before_scanning(self):
+        code = 'from src.hooks.cli import parse_args\nargs = parse_args(["run_scan", "a.txt"])\nargs.hook(args)'
+        assert get_loaded_heavy_modules(code) == []
+
+    def test_run_scan_imports_scan_dependencies_when_scanning(self):
+        code = "from src.hooks.presidio.scanner import PresidioScanner\nfrom src.hooks.trufflehog.scanner import TrufflehogScanner"
+        assert "presidio_analyzer" in get_loaded_heavy_modules(code)
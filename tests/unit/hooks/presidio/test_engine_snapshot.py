@@ -0,0 +1,63 @@
+import pickle
+
+from presidio_analyzer import AnalyzerEngine
+from unittest.mock import patch
+
+from src.hooks.presidio.engine_snapshot import EngineSnapshot
+from src.hooks.presidio.scanner import PresidioScanner
+
+
+class TestEngineSnapshot:
+    def test_load_returns_analyzer_that_was_built(self, tmp_path):
+        snapshot = EngineSnapshot(str(tmp_path / "engine.snapshot"))
+        snapshot.build(PresidioScanner()._create_analyzer())
+
+        analyzer = snapshot.load()
+
+        assert isinstance(analyzer, AnalyzerEngine)
+        results = analyzer.analyze(text="Contact me at test@example.com", language="en", entities=["EMAIL_ADDRESS"])
+        assert [result.entity_type for result in results] == ["EMAIL_ADDRESS"]
+
+    def test_load_without_snapshot_returns_none(self, tmp_path):
+        assert EngineSnapshot(str(tmp_path / "engine.snapshot")).load() is None
+
+    def test_load_snapshot_built_from_different_config_returns_none(self, tmp_path):
+        snapshot = EngineSnapshot(str(tmp_path / "engine.snapshot"))
+        snapshot.build(AnalyzerEngine.__new__(AnalyzerEngine))
+
+        with (
+            patch.object(EngineSnapshot, "get_fingerprint", return_value="changed"),
+            patch("pickle.load", wraps=pickle.load) as mock_load,
+        ):
+            assert snapshot.load() is None
+            # Only the header is unpickled, the analyzer in a stale snapshot is never loaded
+            assert mock_load.call_count == 1
+
+    def test_load_corrupt_snapshot_returns_none(self, tmp_path):
+        snapshot_file = tmp_path / "engine.snapshot"
+        snapshot_file.write_bytes(b"not a snapshot")
+
+        assert EngineSnapshot(str(snapshot_file)).load() is None
+
+    def test_load_snapshot_without_analyzer_returns_none(self, tmp_path):
+        snapshot_file = tmp_path / "engine.snapshot"
+        with open(snapshot_file, "wb") as f:
+            pickle.dump({"fingerprint": EngineSnapshot.get_fingerprint()}, f)
+            pickle.dump("not an analyzer", f)
+
+        assert EngineSnapshot(str(snapshot_file)).load() is None
+
+    def test_build_replaces_existing_snapshot(self, tmp_path):
+        snapshot_file = tmp_path / "engine.snapshot"
+        snapshot_file.write_bytes(b"not a snapshot")
+
+        EngineSnapshot(str(snapshot_file)).build(AnalyzerEngine.__new__(AnalyzerEngine))
+
+        assert isinstance(EngineSnapshot(str(snapshot_file)).load(), AnalyzerEngine)
+        assert [path.name for path in tmp_path.iterdir()] == ["engine.snapshot"]
+
+    def test_fingerprint_changes_with_presidio_config(self):
+        with patch("src.hooks.presidio.engine_snapshot.PresidioResultCache.get_config_fingerprint", return_value="a"):
+            first = EngineSnapshot.get_fingerprint()
+        with patch("src.hooks.presidio.engine_snapshot.PresidioResultCache.get_config_fingerprint", return_value="b"):
+            assert EngineSnapshot.get_fingerprint() != first
@@ -0,0 +1,21 @@
+from src.hooks.presidio.nlp_engine import TokenizerOnlyNlpEngine
+
+
+class TestTokenizerOnlyNlpEngine:
+    def test_load_creates_blank_pipeline_without_trained_components(self):
+        engine = TokenizerOnlyNlpEngine(models=[{"lang_code": "en", "model_name": "en_core_web_sm"}])
+        engine.load()
+
+        assert engine.is_loaded() is True
+        assert engine.get_supported_languages() == ["en"]
+        assert engine.get_nlp("en").pipe_names == []
+
+    def test_process_text_returns_tokens_without_entities(self):
+        engine = TokenizerOnlyNlpEngine(models=[{"lang_code": "en", "model_name": "en_core_web_sm"}])
+        engine.load()
+
+        artifacts = engine.process_text("My Postcode is SW1A 1AA", "en")
+
+        assert artifacts.entities == []
+        assert artifacts.tokens_indices == [0, 3, 12, 15, 20]
+        assert artifacts.lemmas == ["my", "postcode", "is", "sw1a", "1aa"]
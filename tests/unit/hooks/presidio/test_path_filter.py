@@ -1,67 +1,97 @@
+import errno
 import os
 import pytest
 import re
 import tempfile
 
-from anyio import NamedTemporaryFile, Path
+from anyio import NamedTemporaryFile
 
-from src.hooks.presidio.path_filter import PathFilter, PathScanStatus
+from src.hooks.presidio.path_filter import ExclusionMatcher, PathFilter, PathScanStatus
 from unittest.mock import patch
 
 
 class TestPathFilter:
     def test_is_path_excluded_returns_true_when_path_is_excluded(self):
         with tempfile.NamedTemporaryFile("w+t") as tf:
-            exclusions = [re.compile(tf.name)]
+            exclusions = ExclusionMatcher([re.compile(tf.name)])
             assert PathFilter()._is_path_excluded(tf.name, exclusions) is True
 
     def test_is_path_excluded_returns_false_when_path_is_not_excluded(self):
         with tempfile.NamedTemporaryFile("w+t") as tf:
-            exclusions = [re.compile(tf.name)]
+            exclusions = ExclusionMatcher([re.compile(tf.name)])
             assert PathFilter()._is_path_excluded("/a.txt", exclusions) is False
 
-    async def test_check_is_path_invalid_returns_excluded_status_when_path_is_excluded(self):
+    def test_check_is_path_invalid_returns_excluded_status_when_path_is_excluded(self):
         with patch.object(PathFilter, "_is_path_excluded", return_value=True):
-            assert await PathFilter()._check_is_path_invalid("/not_real", []) is PathScanStatus.EXCLUDED
+            assert PathFilter()._check_is_path_invalid("/not_real", [], None) is PathScanStatus.EXCLUDED
 
-    async def test_check_is_path_invalid_returns_skipped_status_when_path_does_not_exist(self):
-        with (
-            patch.object(Path, "exists") as mock_exists,
-            patch.object(PathFilter, "_is_path_excluded", return_value=False),
-        ):
-            mock_exists.return_value = False
-            assert await PathFilter()._check_is_path_invalid("/not_real", []) is PathScanStatus.SKIPPED
+    def test_check_is_path_invalid_returns_skipped_status_when_path_does_not_exist(self):
+        with patch.object(PathFilter, "_is_path_excluded", return_value=False):
+            assert PathFilter()._check_is_path_invalid("/not_real", [], None) is PathScanStatus.SKIPPED
 
-    async def test_check_is_path_invalid_returns_skipped_status_when_path_is_a_directory(self):
-        with (
-            patch.object(Path, "exists") as mock_exists,
-            patch.object(Path, "is_file") as mock_is_file,
-            patch.object(PathFilter, "_is_path_excluded", return_value=False),
-        ):
-            mock_exists.return_value = True
-            mock_is_file.return_value = False
-            assert await PathFilter()._check_is_path_invalid("/a", []) is PathScanStatus.SKIPPED
+    def test_check_is_path_invalid_returns_skipped_status_when_path_is_a_directory(self):
+        with patch.object(PathFilter, "_is_path_excluded", return_value=False):
+            assert PathFilter()._check_is_path_invalid("/a", [], os.stat(tempfile.gettempdir())) is PathScanStatus.SKIPPED
 
-    async def test_check_is_path_invalid_returns_skipped_status_when_path_is_not_accepted_file_extension(self):
+    def test_check_is_path_invalid_returns_skipped_status_when_path_is_not_accepted_file_extension(self):
         with (
-            patch.object(Path, "exists") as mock_exists,
-            patch.object(Path, "is_file") as mock_is_file,
+            tempfile.NamedTemporaryFile("w+t") as tf,
             patch.object(PathFilter, "_is_path_excluded", return_value=False),
         ):
-            mock_exists.return_value = True
-            mock_is_file.return_value = True
-            assert await PathFilter()._check_is_path_invalid("a.png", []) is PathScanStatus.SKIPPED
+            assert PathFilter()._check_is_path_invalid("a.png", [], os.stat(tf.name)) is PathScanStatus.SKIPPED
 
     @pytest.mark.parametrize("file_extension", [".txt", ".yml", ".yaml", ".csv"])
-    async def test_check_is_path_invalid_returns_none_when_path_is_an_accepted_file_extension(self, file_extension):
+    def test_check_is_path_invalid_returns_none_when_path_is_an_accepted_file_extension(self, file_extension):
         with (
-            patch.object(Path, "exists") as mock_exists,
-            patch.object(Path, "is_file") as mock_is_file,
+            tempfile.NamedTemporaryFile("w+t") as tf,
             patch.object(PathFilter, "_is_path_excluded", return_value=False),
         ):
-            mock_exists.return_value = True
-            mock_is_file.return_value = True
-            assert await PathFilter()._check_is_path_invalid(f"a{file_extension}", []) is None
+            assert PathFilter()._check_is_path_invalid(f"a{file_extension}", [], os.stat(tf.name)) is None
+
+    def test_check_is_staged_path_invalid_returns_excluded_status_when_path_is_excluded(self):
+        with patch.object(PathFilter, "_is_path_excluded", return_value=True):
+            assert PathFilter()._check_is_staged_path_invalid("/not_real.txt", []) is PathScanStatus.EXCLUDED
+
+    def test_check_is_staged_path_invalid_returns_skipped_status_when_path_is_not_accepted_file_extension(self):
+        with patch.object(PathFilter, "_is_path_excluded", return_value=False):
+            assert PathFilter()._check_is_staged_path_invalid("/not_real.png", []) is PathScanStatus.SKIPPED
+
+    def test_check_is_staged_path_invalid_returns_none_when_path_does_not_exist_in_the_working_tree(self):
+        with patch.object(PathFilter, "_is_path_excluded", return_value=False):
+            assert PathFilter()._check_is_staged_path_invalid("/not_real.txt", []) is None
+
+    def test_stat_paths_returns_stat_result_for_each_path(self):
+        with tempfile.TemporaryDirectory() as td, tempfile.NamedTemporaryFile("w+t", dir=td) as tf:
+            tf.write("contents")
+            tf.flush()
+
+            path_stats = PathFilter()._stat_paths([tf.name, td, f"{td}/not_real", f"{tf.name}/not_real"])
+
+            assert path_stats[tf.name].st_size == 8
+            assert path_stats[td] is not None
+            assert path_stats[f"{td}/not_real"] is None
+            assert path_stats[f"{tf.name}/not_real"] is None
+
+    def test_stat_paths_returns_error_for_path_that_cannot_be_stat(self):
+        with tempfile.TemporaryDirectory() as td:
+            os.symlink(f"{td}/loop", f"{td}/loop")
+
+            with patch("src.hooks.presidio.path_filter.os.stat", side_effect=[PermissionError(errno.EACCES, "Denied")]):
+                permission_stats = PathFilter()._stat_paths(["secret.txt"])
+            loop_stats = PathFilter()._stat_paths([f"{td}/loop"])
+
+            assert isinstance(permission_stats["secret.txt"], PermissionError)
+            assert loop_stats[f"{td}/loop"].errno == errno.ELOOP
+
+    def test_check_is_path_invalid_returns_skipped_when_path_is_a_symlink_loop(self):
+        with patch.object(PathFilter, "_is_path_excluded", return_value=False):
+            path_stat = OSError(errno.ELOOP, "Too many levels of symbolic links")
+            assert PathFilter()._check_is_path_invalid("a.txt", [], path_stat) is PathScanStatus.SKIPPED
+
+    def test_check_is_path_invalid_returns_errored_when_path_could_not_be_stat(self):
+        with patch.object(PathFilter, "_is_path_excluded", return_value=False):
+            path_stat = PermissionError(errno.EACCES, "Permission denied")
+            assert PathFilter()._check_is_path_invalid("a.txt", [], path_stat) is PathScanStatus.ERRORED
 
     async def test_get_exclusions_returns_empty_list_when_exclusions_file_is_missing(self):
         assert await PathFilter()._get_exclusions("not_present_file.txt") == []
@@ -81,3 +111,59 @@ class TestPathFilter:
                 re.compile("folder1/*"),
                 re.compile("folder2/*"),
             ]
+
+    async def test_get_exclusion_matcher_only_reads_exclusions_file_again_when_it_changes(self):
+        async with NamedTemporaryFile("w+t") as exclusions_file:
+            await exclusions_file.write("folder1/*")
+            await exclusions_file.flush()
+
+            with patch.object(PathFilter, "_get_exclusions", wraps=PathFilter()._get_exclusions) as mock_get_exclusions:
+                matcher = await PathFilter()._get_exclusion_matcher(exclusions_file.name)
+                assert await PathFilter()._get_exclusion_matcher(exclusions_file.name) is matcher
+                assert mock_get_exclusions.call_count == 1
+
+                await exclusions_file.write("\nfolder2/*")
+                await exclusions_file.flush()
+                updated_matcher = await PathFilter()._get_exclusion_matcher(exclusions_file.name)
+
+                assert mock_get_exclusions.call_count == 2
+                assert updated_matcher.exclusions == [re.compile("folder1/*"), re.compile("folder2/*")]
+
+    async def test_get_exclusion_matcher_returns_empty_matcher_when_exclusions_file_is_missing(self):
+        matcher = await PathFilter()._get_exclusion_matcher("not_present_file.txt")
+
+        assert matcher.match("a.txt") is None
+
+
+class TestExclusionMatcher:
+    @pytest.mark.parametrize(
+        "path,expected_exclusion",
+        [
+            ("tests/a.txt", "tests/.*"),
+            ("src/b.txt", "b\\.txt$"),
+            ("src/a.txt", None),
+        ],
+    )
+    def test_match_returns_the_exclusion_that_matched(self, path, expected_exclusion):
+        matcher = ExclusionMatcher([re.compile("tests/.*"), re.compile("b\\.txt$")])
+
+        exclusion = matcher.match(path)
+
+        assert (exclusion.pattern if exclusion else None) == expected_exclusion
+
+    def test_match_searches_with_a_single_combined_regex(self):
+        matcher = ExclusionMatcher([re.compile("tests/.*"), re.compile("(docs|examples)/")])
+
+        assert matcher._combined is not None
+        assert matcher.match("examples/a.txt").pattern == "(docs|examples)/"
+
+    @pytest.mark.parametrize("exclusion", ["(a)\\1", "(?i)upper"])
+    def test_match_falls_back_to_each_regex_when_regexes_cannot_be_combined(self, exclusion):
+        matcher = ExclusionMatcher([re.compile("tests/.*"), re.compile(exclusion)])
+
+        assert matcher._combined is None
+        assert matcher.match("tests/a.txt").pattern == "tests/.*"
+        assert matcher.match("aa.txt" if "\\1" in exclusion else "UPPER.txt").pattern == exclusion
+
+    def test_match_returns_none_when_there_are_no_exclusions(self):
+        assert ExclusionMatcher([]).match("a.txt") is None
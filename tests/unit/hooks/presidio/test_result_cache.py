@@ -0,0 +1,101 @@
+import sqlite3
+
+from unittest.mock import patch
+
+from src.hooks.config import PRESIDIO_SCAN_MODE_LINES, PRESIDIO_SCAN_MODE_WINDOWS
+from src.hooks.presidio.result_cache import PresidioResultCache
+
+
+DETECTIONS = [
+    {"entity_type": "EMAIL_ADDRESS", "start": 0, "end": 7, "score": 1.0, "text_value": "a@b.com", "line_number": 1}
+]
+
+
+class TestPresidioResultCache:
+    def test_get_returns_none_when_content_has_not_been_cached(self, tmp_path):
+        assert PresidioResultCache(str(tmp_path)).get("abc", PRESIDIO_SCAN_MODE_WINDOWS) is None
+
+    def test_get_returns_detections_after_they_are_flushed(self, tmp_path):
+        cache = PresidioResultCache(str(tmp_path))
+        cache.set("abc", PRESIDIO_SCAN_MODE_WINDOWS, DETECTIONS)
+        cache.flush()
+
+        assert PresidioResultCache(str(tmp_path)).get("abc", PRESIDIO_SCAN_MODE_WINDOWS) == DETECTIONS
+
+    def test_get_returns_none_when_content_was_cached_for_another_scan_mode(self, tmp_path):
+        cache = PresidioResultCache(str(tmp_path))
+        cache.set("abc", PRESIDIO_SCAN_MODE_LINES, DETECTIONS)
+        cache.flush()
+
+        assert cache.get("abc", PRESIDIO_SCAN_MODE_WINDOWS) is None
+        assert cache.get("abc", PRESIDIO_SCAN_MODE_LINES) == DETECTIONS
+
+    def test_get_counts_cache_hits(self, tmp_path):
+        cache = PresidioResultCache(str(tmp_path))
+        cache.set("abc", PRESIDIO_SCAN_MODE_WINDOWS, [])
+        cache.flush()
+
+        cache.get("abc", PRESIDIO_SCAN_MODE_WINDOWS)
+        cache.get("def", PRESIDIO_SCAN_MODE_WINDOWS)
+
+        assert cache.hits == 1
+
+    def test_get_returns_none_when_config_fingerprint_has_changed(self, tmp_path):
+        cache = PresidioResultCache(str(tmp_path))
+        cache.set("abc", PRESIDIO_SCAN_MODE_WINDOWS, DETECTIONS)
+        cache.flush()
+
+        with patch.object(PresidioResultCache, "get_config_fingerprint", return_value="new_config"):
+            assert PresidioResultCache(str(tmp_path)).get("abc", PRESIDIO_SCAN_MODE_WINDOWS) is None
+
+    def test_get_config_fingerprint_changes_with_presidio_version(self):
+        with patch("src.hooks.presidio.result_cache.version", return_value="1.0.0"):
+            fingerprint_1 = PresidioResultCache.get_config_fingerprint()
+        with patch("src.hooks.presidio.result_cache.version", return_value="2.0.0"):
+            fingerprint_2 = PresidioResultCache.get_config_fingerprint()
+
+        assert fingerprint_1 != fingerprint_2
+
+    def test_get_config_fingerprint_changes_with_window_size(self):
+        fingerprint_1 = PresidioResultCache.get_config_fingerprint()
+        with patch("src.hooks.presidio.result_cache.PRESIDIO_WINDOW_SIZE", 1):
+            fingerprint_2 = PresidioResultCache.get_config_fingerprint()
+
+        assert fingerprint_1 != fingerprint_2
+
+    def test_flush_evicts_least_recently_used_entries(self, tmp_path):
+        cache = PresidioResultCache(str(tmp_path), max_entries=2)
+        with patch("src.hooks.presidio.result_cache.time.time", return_value=1):
+            cache.set("a", PRESIDIO_SCAN_MODE_WINDOWS, [])
+            cache.set("b", PRESIDIO_SCAN_MODE_WINDOWS, [])
+            cache.flush()
+        with patch("src.hooks.presidio.result_cache.time.time", return_value=2):
+            cache.get("a", PRESIDIO_SCAN_MODE_WINDOWS)
+            cache.set("c", PRESIDIO_SCAN_MODE_WINDOWS, [])
+            cache.flush()
+
+        assert cache.get("a", PRESIDIO_SCAN_MODE_WINDOWS) == []
+        assert cache.get("b", PRESIDIO_SCAN_MODE_WINDOWS) is None
+        assert cache.get("c", PRESIDIO_SCAN_MODE_WINDOWS) == []
+
+    def test_cache_directory_is_ignored_by_git(self, tmp_path):
+        cache = PresidioResultCache(str(tmp_path / "cache"))
+        cache.set("abc", PRESIDIO_SCAN_MODE_WINDOWS, [])
+        cache.flush()
+
+        assert (tmp_path / "cache" / ".gitignore").read_text() == "*\n"
+
+    def test_cache_is_disabled_when_database_cannot_be_used(self, tmp_path):
+        cache = PresidioResultCache(str(tmp_path))
+        with patch("src.hooks.presidio.result_cache.sqlite3.connect", side_effect=sqlite3.OperationalError):
+            assert cache.get("abc", PRESIDIO_SCAN_MODE_WINDOWS) is None
+
+        cache.set("abc", PRESIDIO_SCAN_MODE_WINDOWS, DETECTIONS)
+        cache.flush()
+        assert cache.get("abc", PRESIDIO_SCAN_MODE_WINDOWS) is None
+
+    def test_hash_file_returns_sha256_of_file_contents(self, tmp_path):
+        file = tmp_path / "a.txt"
+        file.write_text("hello")
+
+        assert PresidioResultCache.hash_file(str(file)) == "2cf24dba5fb0a30e26e83b2ac5b9e29e1b161e5c1fa7425e73043362938b9824"
@@ -0,0 +1,171 @@
+import anyio
+import pytest
+
+from unittest.mock import MagicMock
+
+from src.hooks.presidio.scan_queue import AnalyzerPool, MemoryBudget, ScanQueueStats
+
+
+class TestAnalyzerPool:
+    async def test_acquire_waits_until_the_analyzer_is_released(self):
+        analyzer = MagicMock()
+        pool = AnalyzerPool(analyzer, MagicMock)
+        first, second = object(), object()
+
+        assert await pool.acquire(first) is analyzer
+        with pytest.raises(TimeoutError), anyio.fail_after(0.05):
+            await pool.acquire(second)
+
+        pool.release(first, analyzer)
+        assert await pool.acquire(second) is analyzer
+
+    async def test_abandon_lets_another_analysis_run_with_a_new_analyzer(self):
+        analyzer, new_analyzer = MagicMock(), MagicMock()
+        pool = AnalyzerPool(analyzer, MagicMock(return_value=new_analyzer))
+        abandoned, other = object(), object()
+        await pool.acquire(abandoned)
+
+        pool.abandon(abandoned)
+
+        with anyio.fail_after(1):
+            assert await pool.acquire(other) is new_analyzer
+        assert pool.abandoned == 1
+
+    async def test_release_of_abandoned_analysis_after_it_was_replaced_keeps_a_single_analyzer(self):
+        analyzer, new_analyzer = MagicMock(), MagicMock()
+        create_analyzer = MagicMock(return_value=new_analyzer)
+        pool = AnalyzerPool(analyzer, create_analyzer)
+        abandoned, other, last = object(), object(), object()
+        await pool.acquire(abandoned)
+        pool.abandon(abandoned)
+        await pool.acquire(other)
+
+        pool.release(abandoned, analyzer)
+        pool.release(other, new_analyzer)
+
+        assert pool.abandoned == 0
+        assert await pool.acquire(last) is new_analyzer
+        create_analyzer.assert_called_once()
+        with pytest.raises(TimeoutError), anyio.fail_after(0.05):
+            await pool.acquire(object())
+
+    async def test_abandon_when_max_abandoned_analyses_are_running_does_not_let_another_analysis_run(self):
+        analyzer = MagicMock()
+        pool = AnalyzerPool(analyzer, MagicMock, max_abandoned=0)
+        abandoned = object()
+        await pool.acquire(abandoned)
+
+        pool.abandon(abandoned)
+
+        assert pool.abandoned == 0
+        with pytest.raises(TimeoutError), anyio.fail_after(0.05):
+            await pool.acquire(object())
+
+    async def test_abandon_after_the_analysis_has_finished_is_ignored(self):
+        analyzer = MagicMock()
+        pool = AnalyzerPool(analyzer, MagicMock)
+        finished = object()
+        await pool.acquire(finished)
+        pool.release(finished, analyzer)
+
+        pool.abandon(finished)
+
+        assert pool.abandoned == 0
+        await pool.acquire(object())
+        with pytest.raises(TimeoutError), anyio.fail_after(0.05):
+            await pool.acquire(object())
+
+
+class TestMemoryBudget:
+    async def test_reserve_held_by_another_holder_returns_bytes_once_every_holder_releases_it(self):
+        budget = MemoryBudget(100)
+
+        async with await budget.reserve(60) as reservation:
+            reservation.hold()
+
+        assert budget.available_bytes == 40
+        reservation.release()
+        assert budget.available_bytes == 100
+
+    async def test_reserve_returns_bytes_when_context_exits(self):
+        budget = MemoryBudget(100)
+
+        async with await budget.reserve(60):
+            assert budget.available_bytes == 40
+
+        assert budget.available_bytes == 100
+        assert budget.max_reserved_bytes == 60
+
+    async def test_reserve_waits_until_enough_bytes_are_returned(self):
+        budget = MemoryBudget(100)
+        order = []
+
+        async def reserve(name: str, size: int, delay: float):
+            async with await budget.reserve(size):
+                order.append(f"{name} start")
+                await anyio.sleep(delay)
+                order.append(f"{name} stop")
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(reserve, "a", 60, 0.02)
+            await anyio.sleep(0)
+            tg.start_soon(reserve, "b", 60, 0)
+
+        assert order == ["a start", "a stop", "b start", "b stop"]
+        assert budget.max_reserved_bytes == 60
+
+    async def test_reserve_gives_waiting_reservations_in_order(self):
+        budget = MemoryBudget(100)
+        order = []
+
+        async def reserve(name: str, size: int):
+            async with await budget.reserve(size):
+                order.append(name)
+                await anyio.sleep(0.01)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(reserve, "first", 100)
+            await anyio.sleep(0)
+            tg.start_soon(reserve, "large", 100)
+            await anyio.sleep(0)
+            # Would fit alongside nothing else, but has to wait behind the large reservation
+            tg.start_soon(reserve, "small", 1)
+
+        assert order == ["first", "large", "small"]
+
+    async def test_reserve_larger_than_the_budget_reserves_all_of_it(self):
+        budget = MemoryBudget(100)
+
+        async with await budget.reserve(1000):
+            assert budget.available_bytes == 0
+
+        assert budget.available_bytes == 100
+
+    async def test_reserve_cancelled_while_waiting_does_not_take_any_bytes(self):
+        budget = MemoryBudget(100)
+
+        async with await budget.reserve(100):
+            with anyio.move_on_after(0.01):
+                async with await budget.reserve(50):
+                    pytest.fail("The reservation should not have been given")
+
+        assert budget.available_bytes == 100
+        async with await budget.reserve(100):
+            assert budget.available_bytes == 0
+
+
+class TestScanQueueStats:
+    def test_to_dict_returns_queue_depth_and_throughput(self):
+        stats = ScanQueueStats()
+        stats.path_queued(1)
+        stats.path_queued(2)
+        stats.path_scanned(10)
+        stats.path_scanned(20)
+
+        result = stats.to_dict()
+
+        assert result["queued_paths"] == 2
+        assert result["scanned_paths"] == 2
+        assert result["scanned_bytes"] == 30
+        assert result["max_queue_depth"] == 2
+        assert result["bytes_per_second"] > 0
@@ -1,13 +1,27 @@
+import anyio
+import errno
+import multiprocessing
+import os
 import pickle
+import re
+import threading
+import time
 from prettytable import PrettyTable
 import pytest
+import yaml
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from anyio import NamedTemporaryFile
 from presidio_analyzer import RecognizerResult
 
-from src.hooks.presidio.path_filter import PathFilter, PathScanStatus
+from src.hooks.config import PRESIDIO_SCAN_MODE_LINES, PRESIDIO_SCAN_MODE_WINDOWS, PROFILE_PATH_SPAN
+from src.hooks.presidio.nlp_engine import TokenizerOnlyAnalyzerEngineProvider
+from src.hooks.presidio.path_filter import ExclusionMatcher, PathFilter, PathScanStatus
+from src.hooks.presidio.scan_queue import AnalyzerPool
 from src.hooks.presidio.scanner import PersonalDataDetection, PresidioScanResult, PresidioScanner, PathScanResult
-from unittest.mock import ANY, MagicMock, call, patch
+from src.hooks.profiler import Profiler, use_profiler
+from unittest.mock import ANY, AsyncMock, MagicMock, call, patch
 
 
 class TestPresidioScanResult:
@@ -32,6 +46,13 @@ class TestPresidioScanResult:
         result = PresidioScanResult()
         assert str(result) == "--------PERSONAL DATA SCAN SUMMARY--------"
 
+    def test_str_output_includes_number_of_paths_loaded_from_cache(self):
+        result = PresidioScanResult()
+        result.add_path_scan_result(PathScanResult("a.txt", PathScanStatus.PASSED, cached=True))
+        result.add_path_scan_result(PathScanResult("b.txt", PathScanStatus.PASSED))
+
+        assert "RESULTS FOR 1 OF 2 SCANNED FILES WERE LOADED FROM THE CACHE" in str(result)
+
     def test_str_output_for_error(self):
         result = PresidioScanResult()
 
@@ -49,43 +70,496 @@ class TestPresidioScanResult:
 
 
 class TestPresidioScanner:
+    @pytest.mark.parametrize(
+        "recognizers,expected",
+        [
+            # Presidio adds a default SpacyRecognizer when the config does not list one
+            ([{"name": "EmailRecognizer"}], True),
+            ([], True),
+            ([{"name": "SpacyRecognizer", "enabled": False}, {"name": "EmailRecognizer"}], False),
+            ([{"name": "SpacyRecognizer", "enabled": False}, {"name": "SpacyPostProcessingRecognizer"}], True),
+            ([{"name": "SpacyRecognizer"}], True),
+            ([{"name": "SpacyRecognizer", "enabled": True}], True),
+        ],
+    )
+    def test_requires_nlp_model_checks_for_enabled_nlp_recognizers(self, tmp_path, recognizers, expected):
+        recognizer_config_file = tmp_path / "recognizer_config.yaml"
+        recognizer_config_file.write_text(yaml.safe_dump({"recognizers": recognizers}))
+
+        assert PresidioScanner()._requires_nlp_model(recognizer_config_file) is expected
+
+    def test_get_analyzer_uses_tokenizer_only_provider_when_nlp_model_is_not_required(self):
+        with (
+            patch.object(PresidioScanner, "_requires_nlp_model", return_value=False),
+            patch.object(TokenizerOnlyAnalyzerEngineProvider, "create_engine") as mock_create_engine,
+        ):
+            assert PresidioScanner()._get_analyzer() == mock_create_engine.return_value
+
+    def test_get_analyzer_uses_default_provider_when_nlp_model_is_required(self):
+        with (
+            patch.object(PresidioScanner, "_requires_nlp_model", return_value=True),
+            patch.object(TokenizerOnlyAnalyzerEngineProvider, "create_engine") as mock_tokenizer_create_engine,
+            patch("src.hooks.presidio.scanner.AnalyzerEngineProvider") as mock_provider,
+        ):
+            assert PresidioScanner()._get_analyzer() == mock_provider.return_value.create_engine.return_value
+            mock_tokenizer_create_engine.assert_not_called()
+
+    def test_get_analyzer_loads_engine_snapshot_when_configured(self):
+        with (
+            patch("src.hooks.presidio.scanner.PRESIDIO_ENGINE_SNAPSHOT_PATH", "engine.snapshot"),
+            patch("src.hooks.presidio.scanner.EngineSnapshot") as mock_snapshot,
+            patch.object(PresidioScanner, "_create_analyzer") as mock_create_analyzer,
+        ):
+            assert PresidioScanner()._get_analyzer() == mock_snapshot.return_value.load.return_value
+            mock_snapshot.assert_called_once_with("engine.snapshot")
+            mock_create_analyzer.assert_not_called()
+
+    def test_get_analyzer_builds_analyzer_when_engine_snapshot_can_not_be_loaded(self):
+        with (
+            patch("src.hooks.presidio.scanner.PRESIDIO_ENGINE_SNAPSHOT_PATH", "engine.snapshot"),
+            patch("src.hooks.presidio.scanner.EngineSnapshot") as mock_snapshot,
+            patch.object(PresidioScanner, "_create_analyzer") as mock_create_analyzer,
+        ):
+            mock_snapshot.return_value.load.return_value = None
+            assert PresidioScanner()._get_analyzer() == mock_create_analyzer.return_value
+
+    def test_get_analyzer_without_engine_snapshot_configured_builds_analyzer(self):
+        with (
+            patch("src.hooks.presidio.scanner.PRESIDIO_ENGINE_SNAPSHOT_PATH", None),
+            patch("src.hooks.presidio.scanner.EngineSnapshot") as mock_snapshot,
+            patch.object(PresidioScanner, "_create_analyzer") as mock_create_analyzer,
+        ):
+            assert PresidioScanner()._get_analyzer() == mock_create_analyzer.return_value
+            mock_snapshot.assert_not_called()
+
     async def test_scan_path_returns_when_invalid_path(self):
         with (
             patch.object(PathFilter, "_check_is_path_invalid") as mock_check_is_path_invalid,
         ):
             mock_check_is_path_invalid.return_value = PathScanStatus.EXCLUDED
-            result = await PresidioScanner()._scan_path(MagicMock(), [], "a", [])
+            result = await PresidioScanner()._scan_path(MagicMock(), [], "a", ExclusionMatcher([]))
 
             assert result.status == PathScanStatus.EXCLUDED
 
+    async def test_scan_path_uses_stat_result_passed_in_to_check_path(self):
+        path_stat = os.stat(__file__)
+        with (
+            patch.object(PathFilter, "_check_is_path_invalid", return_value=PathScanStatus.SKIPPED) as mock_check,
+            patch.object(PathFilter, "_stat_path") as mock_stat_path,
+        ):
+            exclusions = ExclusionMatcher([])
+            await PresidioScanner()._scan_path(MagicMock(), [], "a", exclusions, path_stat)
+
+            mock_stat_path.assert_not_called()
+            mock_check.assert_called_once_with("a", exclusions, path_stat)
+
+    async def test_scan_path_returns_passed_for_empty_file_without_reading_it(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            with patch.object(PresidioScanner, "_scan_windows") as mock_scan_windows:
+                result = await PresidioScanner()._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
+
+                mock_scan_windows.assert_not_called()
+                assert result.status == PathScanStatus.PASSED
+
+    async def test_scan_path_records_profile_span_with_bytes_and_status(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("No personal data")
+            await tf.flush()
+            with (
+                patch.object(PresidioScanner, "_scan_windows", return_value=[]),
+                use_profiler(Profiler()) as profiler,
+            ):
+                await PresidioScanner()._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
+
+        assert [(span.name, span.attributes) for span in profiler.spans] == [
+            (PROFILE_PATH_SPAN, {"path": tf.name, "bytes": 16, "status": "PASSED", "cached": False})
+        ]
+
+    async def test_scan_stats_every_path_on_a_single_thread(self):
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths") as mock_stat_paths,
+            patch.object(PresidioScanner, "_scan_path") as mock_scan_path,
+        ):
+            mock_stat_paths.return_value = {"a.txt": None, "b.txt": None}
+
+            await PresidioScanner(paths=["a.txt", "b.txt"]).scan()
+
+            mock_stat_paths.assert_called_once_with(["a.txt", "b.txt"])
+            mock_scan_path.assert_has_calls([call(ANY, ANY, "a.txt", ANY, None), call(ANY, ANY, "b.txt", ANY, None)])
+
+    async def test_scan_reports_paths_that_cannot_be_stat_without_stopping_the_scan(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("contents")
+            await tf.flush()
+            path_stats = {
+                "loop.txt": OSError(errno.ELOOP, "Too many levels of symbolic links"),
+                "secret.txt": PermissionError(errno.EACCES, "Permission denied"),
+                tf.name: os.stat(tf.name),
+            }
+
+            with (
+                patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+                patch.object(PathFilter, "_stat_paths", return_value=path_stats),
+            ):
+                result = await PresidioScanner(paths=list(path_stats), analyzer=MagicMock()).scan()
+
+            assert [path.path for path in result.paths_skipped] == ["loop.txt"]
+            assert [(path.path, path.additional_detail) for path in result.paths_errored] == [
+                ("secret.txt", "[Errno 13] Permission denied")
+            ]
+            assert [path.path for path in result.paths_without_personal_data] == [tf.name]
+
+    @pytest.mark.parametrize("as_async_iterable", [False, True])
+    async def test_scan_scans_paths_in_batches(self, as_async_iterable):
+        test_paths = ["a.txt", "b.txt", "c.txt"]
+
+        async def iter_paths():
+            for path in test_paths:
+                yield path
+
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths", side_effect=lambda paths: dict.fromkeys(paths)) as mock_stat_paths,
+            patch.object(PresidioScanner, "_scan_path") as mock_scan_path,
+            patch("src.hooks.presidio.scanner.PRESIDIO_PATH_BATCH_SIZE", 2),
+        ):
+            mock_scan_path.return_value = PathScanResult("a.txt", PathScanStatus.PASSED)
+
+            result = await PresidioScanner(paths=iter_paths() if as_async_iterable else test_paths).scan()
+
+            assert mock_stat_paths.call_args_list == [call(["a.txt", "b.txt"]), call(["c.txt"])]
+            assert len(result.paths_without_personal_data) == 3
+
+    async def test_scan_never_scans_more_than_max_in_flight_paths_at_once(self):
+        test_paths = [f"{index}.txt" for index in range(10)]
+        in_flight = 0
+        max_in_flight = 0
+
+        async def scan_path(analyzer, entities, path, *args):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await anyio.sleep(0.01)
+            in_flight -= 1
+            return PathScanResult(path, PathScanStatus.PASSED)
+
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths", side_effect=lambda paths: dict.fromkeys(paths)),
+            patch.object(PresidioScanner, "_scan_path", side_effect=scan_path),
+        ):
+            result = await PresidioScanner(paths=test_paths, analyzer=MagicMock(), max_in_flight_paths=3).scan()
+
+            assert max_in_flight == 3
+            assert [path_result.path for path_result in result.paths_without_personal_data] == test_paths
+
+    async def test_scan_only_reads_paths_from_an_iterable_as_fast_as_they_are_scanned(self):
+        scan_started = anyio.Event()
+        scans_waiting = 0
+        paths_read = 0
+
+        async def iter_paths():
+            nonlocal paths_read
+            for index in range(100):
+                paths_read += 1
+                yield f"{index}.txt"
+
+        async def scan_path(analyzer, entities, path, *args):
+            nonlocal scans_waiting
+            scans_waiting += 1
+            await scan_started.wait()
+            return PathScanResult(path, PathScanStatus.PASSED)
+
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths", side_effect=lambda paths: dict.fromkeys(paths)),
+            patch.object(PresidioScanner, "_scan_path", side_effect=scan_path),
+            patch("src.hooks.presidio.scanner.PRESIDIO_PATH_BATCH_SIZE", 1),
+        ):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(PresidioScanner(paths=iter_paths(), analyzer=MagicMock(), max_in_flight_paths=2).scan)
+                while scans_waiting < 2:
+                    await anyio.sleep(0.01)
+                await anyio.sleep(0.05)
+                # Two paths are being scanned, two are queued and one is waiting to be queued
+                assert paths_read == 5
+                scan_started.set()
+
+            assert paths_read == 100
+
+    async def test_scan_records_queue_stats_in_the_profile(self):
+        profiler = Profiler()
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths", side_effect=lambda paths: dict.fromkeys(paths)),
+            patch.object(PresidioScanner, "_scan_path", return_value=PathScanResult("a.txt", PathScanStatus.PASSED)),
+            use_profiler(profiler),
+        ):
+            await PresidioScanner(
+                paths=["a.txt", "b.txt"], analyzer=MagicMock(), max_in_flight_paths=4, memory_budget=100
+            ).scan()
+
+        [span] = [span for span in profiler.spans if span.name == "presidio.scan_queue"]
+        assert span.attributes["max_in_flight_paths"] == 4
+        assert span.attributes["memory_budget"] == 100
+        assert span.attributes["queued_paths"] == 2
+        assert span.attributes["scanned_paths"] == 2
+        assert "max_queue_depth" in span.attributes
+        assert "paths_per_second" in span.attributes
+
+    async def test_scan_path_that_runs_out_of_time_is_errored_with_how_long_it_ran(self):
+        async def check_and_scan_path(*args):
+            await anyio.sleep(10)
+
+        with patch.object(PresidioScanner, "_check_and_scan_path", side_effect=check_and_scan_path):
+            result = await PresidioScanner(path_timeout=0.05)._scan_path(None, [], "a.txt", ExclusionMatcher([]))
+
+        assert result.status == PathScanStatus.ERRORED
+        assert re.match(r"Timed out after 0\.\d seconds, the limit is 0\.05 seconds", result.additional_detail)
+
+    async def test_scan_abandons_analysis_that_runs_out_of_time_and_keeps_scanning(self):
+        release_analysis = threading.Event()
+
+        def scan_content(analyzer, entities, content):
+            if content.startswith("slow"):
+                release_analysis.wait(10)
+            return []
+
+        async with (
+            NamedTemporaryFile(suffix=".txt", mode="w+t") as slow_file,
+            NamedTemporaryFile(suffix=".txt", mode="w+t") as fast_file,
+        ):
+            await slow_file.write("slow")
+            await fast_file.write("fast")
+            await slow_file.flush()
+            await fast_file.flush()
+            with (
+                patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+                patch.object(PresidioScanner, "_scan_content", side_effect=scan_content),
+                patch.object(PresidioScanner, "_get_analyzer", return_value=MagicMock()) as mock_get_analyzer,
+            ):
+                started = time.perf_counter()
+                result = await PresidioScanner(
+                    paths=[slow_file.name, fast_file.name], analyzer=MagicMock(), path_timeout=0.1, max_in_flight_paths=1
+                ).scan()
+                release_analysis.set()
+
+                # The fast path is analyzed with a new analyzer, while the abandoned analysis keeps running
+                mock_get_analyzer.assert_called_once()
+
+        assert time.perf_counter() - started < 5
+        assert [path_result.path for path_result in result.paths_errored] == [slow_file.name]
+        assert [path_result.path for path_result in result.paths_without_personal_data] == [fast_file.name]
+        assert "Timed out after" in str(result)
+
+    async def test_scan_path_that_runs_out_of_time_keeps_the_analyzer_and_memory_until_its_analysis_finishes(self):
+        release_analysis = threading.Event()
+        scanner = PresidioScanner(path_timeout=0.1, memory_budget=100)
+        scanner._analyzer_pool = AnalyzerPool(MagicMock(), MagicMock)
+
+        with patch.object(PresidioScanner, "_scan_content", side_effect=lambda *args: release_analysis.wait(10) and []):
+            async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+                await tf.write("Some text")
+                await tf.flush()
+                result = await scanner._scan_path(None, [], tf.name, ExclusionMatcher([]))
+
+                assert result.status == PathScanStatus.ERRORED
+                assert scanner._analyzer_pool.abandoned == 1
+                assert scanner._memory_budget.available_bytes == 100 - len("Some text")
+
+                release_analysis.set()
+                with anyio.fail_after(5):
+                    while scanner._analyzer_pool.abandoned:
+                        await anyio.sleep(0.01)
+
+        assert scanner._memory_budget.available_bytes == 100
+
+    async def test_scan_path_waiting_for_the_analyzer_does_not_count_towards_its_timeout(self):
+        scanner = PresidioScanner(path_timeout=0.1)
+        scanner._analyzer_pool = AnalyzerPool(MagicMock(), MagicMock)
+
+        async def hold_analyzer():
+            borrower = object()
+            analyzer = await scanner._analyzer_pool.acquire(borrower)
+            await anyio.sleep(0.3)
+            scanner._analyzer_pool.release(borrower, analyzer)
+
+        with patch.object(PresidioScanner, "_scan_content", return_value=[]):
+            async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+                await tf.write("Some text")
+                await tf.flush()
+                async with anyio.create_task_group() as tg:
+                    tg.start_soon(hold_analyzer)
+                    await anyio.sleep(0.01)
+                    result = await scanner._scan_path(None, [], tf.name, ExclusionMatcher([]))
+
+        assert result.status == PathScanStatus.PASSED
+
+    async def test_scan_that_runs_out_of_time_reports_every_path_not_scanned(self):
+        async def iter_paths():
+            for index in range(5):
+                yield f"{index}.txt"
+
+        async def scan_path(analyzer, entities, path, *args):
+            await anyio.sleep(10)
+
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths", side_effect=lambda paths: dict.fromkeys(paths)),
+            patch.object(PresidioScanner, "_scan_path", side_effect=scan_path),
+            patch("src.hooks.presidio.scanner.PRESIDIO_PATH_BATCH_SIZE", 1),
+        ):
+            result = await PresidioScanner(
+                paths=iter_paths(), analyzer=MagicMock(), max_in_flight_paths=1, scan_timeout=0.05
+            ).scan()
+
+        assert [path_result.path for path_result in result.paths_errored] == [f"{index}.txt" for index in range(5)]
+        reasons = [path_result.additional_detail for path_result in result.paths_errored]
+        assert re.match(r"Timed out after 0\.\d seconds, the scan timed out after 0\.05 seconds", reasons[0])
+        assert reasons[1:] == ["Not scanned, the scan timed out after 0.05 seconds"] * 4
+
+    async def test_scan_that_runs_out_of_time_reports_every_path_when_there_are_more_paths_than_in_flight(self):
+        async def scan_path(analyzer, entities, path, *args):
+            await anyio.sleep(0.2)
+            return PathScanResult(path, PathScanStatus.PASSED)
+
+        paths = [f"{index}.txt" for index in range(100)]
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths", side_effect=lambda paths: dict.fromkeys(paths)),
+            patch.object(PresidioScanner, "_scan_path", side_effect=scan_path),
+        ):
+            result = await PresidioScanner(paths=paths, analyzer=MagicMock(), max_in_flight_paths=2, scan_timeout=0.5).scan()
+
+        scanned_paths = [path_result.path for path_result in result.paths_without_personal_data]
+        errored_paths = [path_result.path for path_result in result.paths_errored]
+        assert 0 < len(scanned_paths) < len(paths)
+        assert scanned_paths + errored_paths == paths
+
+    async def test_scan_that_runs_out_of_time_while_listing_paths_reports_every_path_not_scanned(self):
+        async def iter_paths():
+            for index in range(5):
+                if index == 2:
+                    await anyio.sleep(0.2)
+                yield f"{index}.txt"
+
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths", side_effect=lambda paths: dict.fromkeys(paths)),
+            patch.object(
+                PresidioScanner,
+                "_scan_path",
+                side_effect=lambda analyzer, entities, path, *args: PathScanResult(path, PathScanStatus.PASSED),
+            ),
+            patch("src.hooks.presidio.scanner.PRESIDIO_PATH_BATCH_SIZE", 1),
+        ):
+            result = await PresidioScanner(paths=iter_paths(), analyzer=MagicMock(), scan_timeout=0.05).scan()
+
+        assert [path_result.path for path_result in result.paths_without_personal_data] == ["0.txt", "1.txt"]
+        assert [path_result.path for path_result in result.paths_errored] == ["2.txt", "3.txt", "4.txt"]
+
+    async def test_scan_with_no_timeouts_does_not_time_out(self):
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PathFilter, "_stat_paths", side_effect=lambda paths: dict.fromkeys(paths)),
+            patch.object(PresidioScanner, "_scan_path", return_value=PathScanResult("a.txt", PathScanStatus.PASSED)),
+        ):
+            result = await PresidioScanner(paths=["a.txt"], analyzer=MagicMock(), path_timeout=0, scan_timeout=0).scan()
+
+        assert len(result.paths_without_personal_data) == 1
+
+    async def test_shutdown_executor_after_timeout_terminates_workers(self):
+        executor = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+        # Wait for the worker to start, so it is busy with the long running task when the executor is shut down
+        executor.submit(os.getpid).result()
+        sleep = executor.submit(time.sleep, 20)
+        while not sleep.running():
+            await anyio.sleep(0.01)
+        processes = list(executor._processes.values())
+        scanner = PresidioScanner()
+        scanner._abandoned_analysis = True
+
+        started = time.perf_counter()
+        await scanner._shutdown_executor(executor)
+        for process in processes:
+            process.join(5)
+
+        assert not any(process.is_alive() for process in processes)
+        assert time.perf_counter() - started < 5
+
+    async def test_shutdown_executor_without_timeout_waits_for_workers(self):
+        executor = MagicMock()
+
+        await PresidioScanner()._shutdown_executor(executor)
+
+        executor.shutdown.assert_called_once_with()
+        executor.terminate_workers.assert_not_called()
+
+    @pytest.mark.parametrize(
+        "file_path,file_size,whole_file,expected",
+        [
+            ("a.txt", 10, False, 10),
+            ("a.txt", 10**9, False, 100000),
+            ("a.csv", 10**9, False, 10**9),
+            ("a.txt", 10**9, True, 10**9),
+        ],
+    )
+    def test_get_memory_needed_for_windowed_files_is_at_most_a_window(self, file_path, file_size, whole_file, expected):
+        assert PresidioScanner()._get_memory_needed(file_path, file_size, whole_file) == expected
+
+    async def test_scan_path_reserves_memory_for_working_tree_file_while_it_is_read(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("Some text")
+            await tf.seek(0)
+            scanner = PresidioScanner(memory_budget=100)
+
+            def scan_content(*args):
+                assert scanner._memory_budget.available_bytes == 100 - len("Some text")
+                return []
+
+            with patch.object(PresidioScanner, "_scan_content", side_effect=scan_content) as mock_scan_content:
+                result = await scanner._scan_path(None, [], tf.name, ExclusionMatcher([]))
+
+                mock_scan_content.assert_called_once()
+                assert result.status == PathScanStatus.PASSED
+                assert scanner._memory_budget.available_bytes == 100
+
     @pytest.mark.parametrize("file_extension", [".csv"])
     async def test_scan_path_scans_line_by_line_for_file_extensions_with_expected_results(self, file_extension):
         async with NamedTemporaryFile(suffix=f"file1{file_extension}", mode="w+t") as tf:
-            with patch.object(PresidioScanner, "_scan_content") as mock_scan_content:
+            with patch.object(PresidioScanner, "_scan_lines") as mock_scan_lines:
                 await tf.write("Has Email\nNo data\nHas phone")
                 await tf.seek(0)
 
-                found_email = PersonalDataDetection(RecognizerResult("EMAIL", 0, 10, 1), text_value="A")
-                found_phone = PersonalDataDetection(RecognizerResult("PHONE", 0, 10, 1), text_value="B")
+                found_email = PersonalDataDetection(RecognizerResult("EMAIL", 0, 10, 1), text_value="A", line_number=1)
+                found_phone = PersonalDataDetection(RecognizerResult("PHONE", 0, 10, 1), text_value="B", line_number=3)
 
                 expected_scan_result = PathScanResult(tf.name, PathScanStatus.FAILED, [found_email, found_phone])
-                mock_scan_content.side_effect = [
-                    [found_email],
-                    [],
-                    [found_phone],
-                ]
+                mock_scan_lines.return_value = [found_email, found_phone]
 
-                result = await PresidioScanner()._scan_path(MagicMock(), [], tf.name, [])
-                mock_scan_content.assert_has_calls(
-                    [
-                        call(ANY, ANY, "Has Email"),
-                        call(ANY, ANY, "No data"),
-                        call(ANY, ANY, "Has phone"),
-                    ],
-                    any_order=True,
-                )
+                result = await PresidioScanner()._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
+                mock_scan_lines.assert_called_once_with(ANY, ANY, ["Has Email", "No data", "Has phone"], 1)
                 assert pickle.dumps(result) == pickle.dumps(expected_scan_result)
 
+    async def test_scan_path_scans_line_by_line_in_batches(self):
+        async with NamedTemporaryFile(suffix=".csv", mode="w+t") as tf:
+            with (
+                patch.object(PresidioScanner, "_scan_lines", return_value=[]) as mock_scan_lines,
+                patch("src.hooks.presidio.scanner.PRESIDIO_LINE_BATCH_SIZE", 2),
+            ):
+                await tf.write("1\n2\n3\n4\n5")
+                await tf.seek(0)
+
+                result = await PresidioScanner()._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
+
+                assert mock_scan_lines.call_args_list == [
+                    call(ANY, ANY, ["1", "2"], 1),
+                    call(ANY, ANY, ["3", "4"], 3),
+                    call(ANY, ANY, ["5"], 5),
+                ]
+                assert result.status == PathScanStatus.PASSED
+
     @pytest.mark.parametrize("file_extension", [".txt", ".yaml"])
     async def test_scan_path_scans_file_contents_for_file_extensions_with_expected_results(self, file_extension):
         async with NamedTemporaryFile(suffix=f"file1{file_extension}", mode="w+t") as tf:
@@ -99,20 +573,233 @@ class TestPresidioScanner:
                 expected_scan_result = PathScanResult(tf.name, PathScanStatus.FAILED, [found_email])
                 mock_scan_content.return_value = [found_email]
 
-                result = await PresidioScanner()._scan_path(MagicMock(), [], tf.name, [])
+                result = await PresidioScanner()._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
 
                 mock_scan_content.assert_called_once_with(ANY, ANY, contents)
                 assert pickle.dumps(result) == pickle.dumps(expected_scan_result)
 
+    def _get_email_analyzer(self):
+        analyzer = MagicMock()
+        analyzer.analyze.side_effect = lambda text, **_: [
+            RecognizerResult("EMAIL", match.start(), match.end(), 1.0) for match in re.finditer(r"\S+@\S+\.com", text)
+        ]
+        return analyzer
+
+    @patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_OVERLAP", 10)
+    @patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_SIZE", 40)
+    async def test_scan_path_analyzes_large_files_in_windows_no_larger_than_window_size(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("no personal data on this line\n" * 20)
+            await tf.seek(0)
+            analyzer = self._get_email_analyzer()
+
+            result = await PresidioScanner()._scan_path(analyzer, [], tf.name, ExclusionMatcher([]))
+
+            assert result.status == PathScanStatus.PASSED
+            assert analyzer.analyze.call_count > 1
+            assert all(len(kwargs["text"]) <= 40 for _, kwargs in analyzer.analyze.call_args_list)
+
+    @patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_OVERLAP", 10)
+    @patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_SIZE", 40)
+    async def test_scan_path_finds_match_crossing_window_boundary_once(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            # There are no line breaks, so the first window ends part way through the email address
+            contents = "x" * 35 + " a@b.com " + "y" * 30
+            await tf.write(contents)
+            await tf.seek(0)
+
+            result = await PresidioScanner()._scan_path(self._get_email_analyzer(), [], tf.name, ExclusionMatcher([]))
+
+            assert [(r.text_value, r.result.start, r.line_number) for r in result.results] == [("a@b.com", 36, 1)]
+
+    @patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_OVERLAP", 10)
+    @patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_SIZE", 40)
+    async def test_scan_path_returns_file_positions_and_line_numbers_for_matches_in_later_windows(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            contents = "a\n" * 18 + "xxxxxxxxxx a@b.com yy\n" + "b\n" * 30 + "c@d.com\n"
+            await tf.write(contents)
+            await tf.seek(0)
+
+            result = await PresidioScanner()._scan_path(self._get_email_analyzer(), [], tf.name, ExclusionMatcher([]))
+
+            assert [(r.text_value, r.line_number) for r in result.results] == [("a@b.com", 19), ("c@d.com", 50)]
+            for detection in result.results:
+                assert contents[detection.result.start : detection.result.end] == detection.text_value
+
+    @patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_OVERLAP", 10)
+    @patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_SIZE", 40)
+    async def test_scan_path_starts_window_overlap_at_a_line_break(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("x" * 32 + "\nabcdef\n" + "y" * 30)
+            await tf.seek(0)
+            analyzer = self._get_email_analyzer()
+
+            await PresidioScanner()._scan_path(analyzer, [], tf.name, ExclusionMatcher([]))
+
+            assert analyzer.analyze.call_args_list[1].kwargs["text"].startswith("abcdef\n")
+
+    @pytest.mark.parametrize(
+        "buffer,window_end,expected",
+        [
+            ("x" * 32 + "\nabcdef\n", 40, 33),
+            ("x" * 30 + " abcdefghi", 40, 31),
+            ("x" * 40, 40, 30),
+            # The line break ending the window is never the start of the overlap
+            ("x" * 39 + "\n", 40, 30),
+        ],
+    )
+    def test_get_overlap_start_moves_forward_to_the_next_line_break_or_whitespace(self, buffer, window_end, expected):
+        with patch("src.hooks.presidio.scanner.PRESIDIO_WINDOW_OVERLAP", 10):
+            assert PresidioScanner()._get_overlap_start(buffer, window_end) == expected
+
+    def test_merge_detections_removes_duplicates_keeping_highest_score(self):
+        detections = [
+            PersonalDataDetection(RecognizerResult("EMAIL", 10, 17, 0.5), text_value="a@b.com"),
+            PersonalDataDetection(RecognizerResult("PHONE", 0, 5, 0.5), text_value="01234"),
+            PersonalDataDetection(RecognizerResult("EMAIL", 10, 17, 0.9), text_value="a@b.com"),
+        ]
+
+        merged = PresidioScanner()._merge_detections(detections)
+
+        assert [(d.result.entity_type, d.result.score) for d in merged] == [("PHONE", 0.5), ("EMAIL", 0.9)]
+
+    async def test_scan_path_with_staged_file_scans_staged_contents(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("working tree contents")
+            await tf.seek(0)
+            staged_files = MagicMock()
+            staged_files.get.return_value = "blob"
+            staged_files.get_size.return_value = len("staged a@b.com")
+            staged_files.read_blob = AsyncMock(return_value=b"staged a@b.com")
+
+            result = await PresidioScanner(staged_files=staged_files)._scan_path(
+                self._get_email_analyzer(), [], tf.name, ExclusionMatcher([])
+            )
+
+            staged_files.read_blob.assert_awaited_once_with("blob")
+            assert [detection.text_value for detection in result.results] == ["a@b.com"]
+
+    async def test_scan_path_with_staged_file_scans_staged_contents_when_path_is_deleted_from_working_tree(self):
+        staged_files = MagicMock()
+        staged_files.get.return_value = "blob"
+        staged_files.get_size.return_value = len("staged a@b.com")
+        staged_files.read_blob = AsyncMock(return_value=b"staged a@b.com")
+        with patch.object(PathFilter, "_is_path_excluded", return_value=False):
+            result = await PresidioScanner(staged_files=staged_files)._scan_path(
+                self._get_email_analyzer(), [], "deleted.txt", ExclusionMatcher([]), path_stat=None
+            )
+
+        staged_files.read_blob.assert_awaited_once_with("blob")
+        assert result.status == PathScanStatus.FAILED
+        assert [detection.text_value for detection in result.results] == ["a@b.com"]
+
+    async def test_scan_path_with_staged_files_with_same_contents_only_scans_contents_once(self):
+        async with NamedTemporaryFile(suffix=".txt") as tf_1, NamedTemporaryFile(suffix=".txt") as tf_2:
+            staged_files = MagicMock()
+            staged_files.get.return_value = "blob"
+            staged_files.get_size.return_value = len("staged a@b.com")
+            staged_files.read_blob = AsyncMock(return_value=b"staged a@b.com")
+            scanner = PresidioScanner(staged_files=staged_files)
+            analyzer = self._get_email_analyzer()
+
+            results = [
+                await scanner._scan_path(analyzer, [], tf_1.name, ExclusionMatcher([])),
+                await scanner._scan_path(analyzer, [], tf_2.name, ExclusionMatcher([])),
+            ]
+
+            staged_files.read_blob.assert_awaited_once_with("blob")
+            analyzer.analyze.assert_called_once()
+            assert [result.status for result in results] == [PathScanStatus.FAILED, PathScanStatus.FAILED]
+
+    async def test_scan_path_with_staged_files_with_same_contents_scans_contents_once_for_each_scan_mode(self):
+        async with NamedTemporaryFile(suffix=".txt") as tf_1, NamedTemporaryFile(suffix=".csv") as tf_2:
+            staged_files = MagicMock()
+            staged_files.get.return_value = "blob"
+            staged_files.get_size.return_value = len("staged a@b.com")
+            staged_files.read_blob = AsyncMock(return_value=b"staged a@b.com")
+            scanner = PresidioScanner(staged_files=staged_files)
+
+            with (
+                patch.object(PresidioScanner, "_scan_windows", return_value=[]) as mock_scan_windows,
+                patch.object(PresidioScanner, "_scan_lines", return_value=[]) as mock_scan_lines,
+            ):
+                await scanner._scan_path(MagicMock(), [], tf_1.name, ExclusionMatcher([]))
+                await scanner._scan_path(MagicMock(), [], tf_2.name, ExclusionMatcher([]))
+
+                mock_scan_windows.assert_called_once()
+                mock_scan_lines.assert_called_once()
+
+    async def test_scan_path_returns_cached_results_without_scanning_content(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("a@b.com")
+            await tf.seek(0)
+            cache = MagicMock()
+            cache.get.return_value = [
+                {"entity_type": "EMAIL", "start": 0, "end": 7, "score": 1.0, "text_value": "a@b.com", "line_number": 1}
+            ]
+
+            with patch.object(PresidioScanner, "_scan_content") as mock_scan_content:
+                result = await PresidioScanner(cache=cache)._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
+
+                mock_scan_content.assert_not_called()
+                cache.set.assert_not_called()
+                assert result.cached is True
+                assert result.status == PathScanStatus.FAILED
+                assert result.results[0].text_value == "a@b.com"
+
+    async def test_scan_path_caches_results_when_content_has_not_been_cached(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("a@b.com")
+            await tf.seek(0)
+            cache = MagicMock()
+            cache.get.return_value = None
+            found_email = PersonalDataDetection(RecognizerResult("EMAIL", 0, 7, 1), text_value="a@b.com", line_number=1)
+
+            with patch.object(PresidioScanner, "_scan_content", return_value=[found_email]):
+                result = await PresidioScanner(cache=cache)._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
+
+                cache.set.assert_called_once_with(
+                    cache.hash_file.return_value, PRESIDIO_SCAN_MODE_WINDOWS, [found_email.to_dict()]
+                )
+                assert result.cached is False
+                assert result.status == PathScanStatus.FAILED
+
+    @pytest.mark.parametrize(
+        "suffix,scan_mode",
+        [(".csv", PRESIDIO_SCAN_MODE_LINES), (".CSV", PRESIDIO_SCAN_MODE_LINES), (".txt", PRESIDIO_SCAN_MODE_WINDOWS)],
+    )
+    async def test_scan_path_looks_up_cached_results_for_the_scan_mode(self, suffix, scan_mode):
+        async with NamedTemporaryFile(suffix=suffix, mode="w+t") as tf:
+            await tf.write("a@b.com")
+            await tf.seek(0)
+            cache = MagicMock()
+            cache.get.return_value = []
+
+            await PresidioScanner(cache=cache)._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
+
+            cache.get.assert_called_once_with(cache.hash_file.return_value, scan_mode)
+
+    async def test_scan_path_looks_up_cached_results_off_the_event_loop(self):
+        async with NamedTemporaryFile(suffix=".txt", mode="w+t") as tf:
+            await tf.write("a@b.com")
+            await tf.seek(0)
+            cache = MagicMock()
+            lookup_threads = []
+            cache.get.side_effect = lambda *args: lookup_threads.append(threading.current_thread()) or []
+
+            await PresidioScanner(cache=cache)._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
+
+            assert lookup_threads and threading.main_thread() not in lookup_threads
+
     async def test_scan_path_handles_exception(self):
         async with NamedTemporaryFile(suffix="file1.csv", mode="w+t") as tf:
-            with patch.object(PresidioScanner, "_scan_content") as mock_scan_content:
-                mock_scan_content.side_effect = Exception("An exception message")
+            with patch.object(PresidioScanner, "_scan_lines") as mock_scan_lines:
+                mock_scan_lines.side_effect = Exception("An exception message")
                 contents = "Error reading this file"
                 await tf.write(contents)
                 await tf.seek(0)
 
-                result = await PresidioScanner()._scan_path(MagicMock(), [], tf.name, [])
+                result = await PresidioScanner()._scan_path(MagicMock(), [], tf.name, ExclusionMatcher([]))
                 assert result.status == PathScanStatus.ERRORED
                 assert result.additional_detail == "An exception message"
 
@@ -120,7 +807,7 @@ class TestPresidioScanner:
         contents = "I have personal data"
 
         recognizer_results = [RecognizerResult("EMAIL", 0, 100, 1.0), RecognizerResult("PERSON", 0, 100, 0.9)]
-        expected_scan_results = [PersonalDataDetection(f, contents) for f in recognizer_results]
+        expected_scan_results = [PersonalDataDetection(f, contents, line_number=1) for f in recognizer_results]
 
         mock_analyzer = MagicMock()
         mock_analyzer.analyze.return_value = recognizer_results
@@ -129,6 +816,38 @@ class TestPresidioScanner:
 
         assert pickle.dumps(detections) == pickle.dumps(expected_scan_results)
 
+    def test_scan_content_returns_line_number_of_each_detection(self):
+        contents = "line one\nline two has a@b.com\n\nline four has c@d.com"
+
+        mock_analyzer = MagicMock()
+        mock_analyzer.analyze.return_value = [
+            RecognizerResult("EMAIL", contents.index("a@b.com"), contents.index("a@b.com") + 7, 1.0),
+            RecognizerResult("EMAIL", contents.index("c@d.com"), contents.index("c@d.com") + 7, 1.0),
+            RecognizerResult("UK_POSTCODE", contents.index("\nline four"), contents.index("\nline four") + 5, 1.0),
+        ]
+
+        detections = PresidioScanner()._scan_content(mock_analyzer, [], contents)
+
+        assert [detection.line_number for detection in detections] == [2, 4, 4]
+
+    def test_scan_lines_returns_detections_with_line_numbers(self):
+        lines = ["no data", "a@b.com", "c@d.com and e@f.com"]
+
+        with patch("src.hooks.presidio.scanner.BatchAnalyzerEngine") as mock_batch_analyzer:
+            mock_batch_analyzer.return_value.analyze_iterator.return_value = [
+                [],
+                [RecognizerResult("EMAIL", 0, 7, 1.0)],
+                [RecognizerResult("EMAIL", 0, 7, 1.0), RecognizerResult("EMAIL", 12, 19, 1.0)],
+            ]
+
+            detections = PresidioScanner()._scan_lines(MagicMock(), [], lines, 10)
+
+            assert [(detection.text_value, detection.line_number) for detection in detections] == [
+                ("a@b.com", 11),
+                ("c@d.com", 12),
+                ("e@f.com", 12),
+            ]
+
     def test_scan_content_returns_no_detections_when_path_has_no_personal_data(self):
         contents = "I have no personal data"
 
@@ -143,21 +862,91 @@ class TestPresidioScanner:
         assert pickle.dumps(detections) == pickle.dumps(expected_scan_results)
 
     async def test_scan_with_no_paths_returns_result_with_empty_paths(self):
-        with patch.object(PathFilter, "_get_exclusions") as mock_path_filter:
-            mock_path_filter.return_value = []
+        with patch.object(PathFilter, "_get_exclusion_matcher") as mock_path_filter:
+            mock_path_filter.return_value = ExclusionMatcher([])
 
             result = await PresidioScanner().scan()
             assert result.paths_containing_personal_data == []
             assert result.paths_without_personal_data == []
 
+    async def test_analyze_content_without_executor_scans_in_process(self):
+        with patch.object(PresidioScanner, "_scan_content") as mock_scan_content:
+            analyzer = MagicMock()
+
+            result = await PresidioScanner()._analyze_content(analyzer, ["EMAIL"], "contents")
+
+            mock_scan_content.assert_called_once_with(analyzer, ["EMAIL"], "contents")
+            assert result == mock_scan_content.return_value
+
+    async def test_analyze_content_without_executor_does_not_block_event_loop(self):
+        ticks = []
+
+        async def tick():
+            while True:
+                ticks.append(time.monotonic())
+                await anyio.sleep(0.01)
+
+        with patch.object(PresidioScanner, "_scan_content", side_effect=lambda *_: time.sleep(0.2)):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(tick)
+                await PresidioScanner()._analyze_content(MagicMock(), [], "contents")
+                tg.cancel_scope.cancel()
+
+        assert len(ticks) > 5
+
+    async def test_scan_loads_analyzer_off_the_event_loop_thread(self):
+        analyzer_threads = []
+
+        def get_analyzer():
+            analyzer_threads.append(threading.current_thread())
+            return MagicMock()
+
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher", return_value=ExclusionMatcher([])),
+            patch.object(PresidioScanner, "_get_analyzer", side_effect=get_analyzer),
+        ):
+            await PresidioScanner().scan()
+
+        assert analyzer_threads
+        assert analyzer_threads[0] is not threading.current_thread()
+
+    async def test_analyze_content_with_executor_scans_in_worker(self):
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            scanner = PresidioScanner()
+            scanner._executor = executor
+            with patch("src.hooks.presidio.scanner._scan_content_in_worker") as mock_scan_content_in_worker:
+                result = await scanner._analyze_content(None, None, "contents")
+
+                mock_scan_content_in_worker.assert_called_once_with("contents")
+                assert result == mock_scan_content_in_worker.return_value
+
+    async def test_scan_with_multiple_jobs_uses_executor_without_loading_analyzer(self):
+        with (
+            patch.object(PathFilter, "_get_exclusion_matcher") as mock_path_filter,
+            patch.object(PresidioScanner, "_get_analyzer") as mock_get_analyzer,
+            patch.object(PresidioScanner, "_get_executor") as mock_get_executor,
+            patch.object(PresidioScanner, "_scan_path") as mock_scan_path,
+        ):
+            exclusions = ExclusionMatcher([])
+            mock_path_filter.return_value = exclusions
+            mock_scan_path.return_value = PathScanResult("a.txt", PathScanStatus.PASSED)
+
+            result = await PresidioScanner(paths=["a.txt"], jobs=4).scan()
+
+            mock_get_analyzer.assert_not_called()
+            mock_get_executor.assert_called_once()
+            mock_scan_path.assert_called_once_with(None, None, "a.txt", exclusions, None)
+            assert len(result.paths_without_personal_data) == 1
+
     async def test_scan_calls_scan_path_for_every_path(self):
         with (
-            patch.object(PathFilter, "_get_exclusions") as mock_path_filter,
+            patch.object(PathFilter, "_get_exclusion_matcher") as mock_path_filter,
             patch.object(PresidioScanner, "_scan_path") as mock_scan_path,
         ):
-            mock_path_filter.return_value = []
+            exclusions = ExclusionMatcher([])
+            mock_path_filter.return_value = exclusions
             test_paths = ["a.txt", "b.yml", "c.py"]
 
             await PresidioScanner(paths=test_paths).scan()
 
-            mock_scan_path.assert_has_calls([call(ANY, ANY, path, []) for path in test_paths])
+            mock_scan_path.assert_has_calls([call(ANY, ANY, path, exclusions, None) for path in test_paths])
@@ -0,0 +1,43 @@
+from presidio_analyzer import AnalyzerEngine
+from unittest.mock import patch
+
+from src.hooks.build_engine_snapshot import BuildEngineSnapshot
+from src.hooks.presidio.engine_snapshot import EngineSnapshot
+
+
+class TestBuildEngineSnapshot:
+    def test_validate_args_with_one_path_returns_true(self):
+        assert BuildEngineSnapshot(paths=["engine.snapshot"]).validate_args() is True
+
+    def test_validate_args_with_more_than_one_path_returns_false(self):
+        assert BuildEngineSnapshot(paths=["a.snapshot", "b.snapshot"]).validate_args() is False
+
+    def test_validate_args_without_path_or_configured_snapshot_path_returns_false(self):
+        with patch("src.hooks.build_engine_snapshot.PRESIDIO_ENGINE_SNAPSHOT_PATH", None):
+            assert BuildEngineSnapshot().validate_args() is False
+
+    def test_validate_args_without_path_uses_configured_snapshot_path(self):
+        with patch("src.hooks.build_engine_snapshot.PRESIDIO_ENGINE_SNAPSHOT_PATH", "engine.snapshot"):
+            assert BuildEngineSnapshot().validate_args() is True
+
+    async def test_run_writes_snapshot_that_can_be_loaded(self, tmp_path):
+        snapshot_file = str(tmp_path / "engine.snapshot")
+
+        result = await BuildEngineSnapshot(paths=[snapshot_file]).run()
+
+        assert result.run_success() is True
+        assert isinstance(EngineSnapshot(snapshot_file).load(), AnalyzerEngine)
+
+    async def test_run_when_snapshot_can_not_be_loaded_returns_error(self, tmp_path):
+        with patch.object(EngineSnapshot, "load", return_value=None):
+            result = await BuildEngineSnapshot(paths=[str(tmp_path / "engine.snapshot")]).run()
+
+        assert result.run_success() is False
+        assert "could not be loaded" in result.run_summary()  # type: ignore
+
+    async def test_run_when_analyzer_can_not_be_built_returns_error(self, tmp_path):
+        with patch("src.hooks.build_engine_snapshot.PresidioScanner._create_analyzer", side_effect=ValueError("bad config")):
+            result = await BuildEngineSnapshot(paths=[str(tmp_path / "engine.snapshot")]).run()
+
+        assert result.run_success() is False
+        assert "bad config" in result.run_summary()  # type: ignore
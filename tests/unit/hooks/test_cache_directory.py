@@ -0,0 +1,43 @@
+import os
+import pytest
+
+from anyio import Path
+from unittest.mock import patch
+
+from src.hooks.cache_directory import create_cache_directory, write_cache_file
+
+
+class TestCreateCacheDirectory:
+    def test_create_cache_directory_creates_directory_ignored_by_git(self, tmp_path):
+        create_cache_directory(tmp_path / "cache")
+
+        assert (tmp_path / "cache" / ".gitignore").read_text() == "*\n"
+
+    def test_create_cache_directory_keeps_existing_gitignore(self, tmp_path):
+        (tmp_path / ".gitignore").write_text("other\n")
+
+        create_cache_directory(tmp_path)
+
+        assert (tmp_path / ".gitignore").read_text() == "other\n"
+
+
+class TestWriteCacheFile:
+    async def test_write_cache_file_writes_contents_without_leaving_temporary_file(self, tmp_path):
+        await write_cache_file(Path(tmp_path, "cache", "a.json"), "contents")
+
+        assert (tmp_path / "cache" / "a.json").read_text() == "contents"
+        assert sorted(os.listdir(tmp_path / "cache")) == [".gitignore", "a.json"]
+
+    async def test_write_cache_file_in_subdirectory_writes_gitignore_to_cache_directory(self, tmp_path):
+        await write_cache_file(Path(tmp_path, "cache", "sub", "a.json"), "contents", cache_directory=Path(tmp_path, "cache"))
+
+        assert (tmp_path / "cache" / ".gitignore").read_text() == "*\n"
+        assert (tmp_path / "cache" / "sub" / "a.json").read_text() == "contents"
+
+    async def test_write_cache_file_does_not_replace_file_when_write_fails(self, tmp_path):
+        (tmp_path / "a.json").write_text("old")
+
+        with patch.object(Path, "write_text", side_effect=OSError("disk full")), pytest.raises(OSError):
+            await write_cache_file(Path(tmp_path, "a.json"), "new")
+
+        assert (tmp_path / "a.json").read_text() == "old"
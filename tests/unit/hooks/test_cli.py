@@ -1,10 +1,18 @@
+import json
 import sys
 import pytest
 
 from unittest import mock
 
-from src.hooks.cli import main as main_function, main_async, parse_args
-from src.hooks.config import PERSONAL_DATA_SCAN, SECURITY_SCAN
+from src.hooks.cli import create_run_security_scan, main as main_function, main_async, parse_args
+from src.hooks.config import (
+    PERSONAL_DATA_SCAN,
+    PRESIDIO_MAX_IN_FLIGHT_PATHS,
+    PRESIDIO_MEMORY_BUDGET_BYTES,
+    PRESIDIO_PATH_TIMEOUT_SECONDS,
+    PRESIDIO_SCAN_TIMEOUT_SECONDS,
+    SECURITY_SCAN,
+)
 
 
 class TestCLI:
@@ -80,6 +88,135 @@ class TestCLI:
                 assert result.github_action is False
                 assert result.excluded_scans == [SECURITY_SCAN, PERSONAL_DATA_SCAN]
 
+        def test_parse_args_for_run_without_jobs_defaults_to_one_job(self):
+            testargs = ["run_scan", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                assert parse_args(testargs).jobs == 1
+
+        @pytest.mark.parametrize("jobs", (["-j", "--jobs"]))
+        def test_parse_args_for_run_with_jobs_returns_expected_args(self, jobs):
+            testargs = ["run_scan", jobs, "4", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                assert parse_args(testargs).jobs == 4
+
+        def test_parse_args_for_run_without_no_cache_uses_cache(self):
+            testargs = ["run_scan", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                assert parse_args(testargs).use_cache is True
+
+        def test_parse_args_for_run_with_no_cache_does_not_use_cache(self):
+            testargs = ["run_scan", "--no-cache", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                assert parse_args(testargs).use_cache is False
+
+        def test_parse_args_for_run_without_diff_base_returns_none(self):
+            testargs = ["run_scan", "--github-action", "."]
+            with mock.patch.object(sys, "argv", testargs):
+                assert parse_args(testargs).diff_base is None
+
+        def test_parse_args_for_run_with_diff_base_returns_expected_args(self):
+            testargs = ["run_scan", "--github-action", "--diff-base", "origin/main", "."]
+            with mock.patch.object(sys, "argv", testargs):
+                assert parse_args(testargs).diff_base == "origin/main"
+
+        def test_parse_args_for_run_with_staged_returns_expected_args(self):
+            testargs = ["run_scan", "--staged", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                assert parse_args(testargs).staged is True
+
+        def test_parse_args_for_run_without_trufflehog_shards_defaults_to_one_shard(self):
+            testargs = ["run_scan", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                result = parse_args(testargs)
+                assert result.trufflehog_shards == 1
+                assert result.trufflehog_concurrency is None
+
+        def test_parse_args_for_run_with_trufflehog_shards_and_concurrency_returns_expected_args(self):
+            testargs = ["run_scan", "--trufflehog-shards", "4", "--trufflehog-concurrency", "2", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                result = parse_args(testargs)
+                assert result.trufflehog_shards == 4
+                assert result.trufflehog_concurrency == 2
+
+        def test_parse_args_for_run_without_queue_limits_returns_defaults(self):
+            testargs = ["run_scan", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                result = parse_args(testargs)
+                assert result.max_in_flight_paths == PRESIDIO_MAX_IN_FLIGHT_PATHS
+                assert result.memory_budget_mb * 1024 * 1024 == PRESIDIO_MEMORY_BUDGET_BYTES
+
+        def test_parse_args_for_run_with_queue_limits_returns_expected_args(self):
+            testargs = ["run_scan", "--max-in-flight-paths", "8", "--memory-budget-mb", "16", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                result = parse_args(testargs)
+                assert result.max_in_flight_paths == 8
+                assert result.memory_budget_mb == 16
+
+        def test_parse_args_for_run_without_timeouts_returns_defaults(self):
+            testargs = ["run_scan", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                result = parse_args(testargs)
+                assert result.path_timeout == PRESIDIO_PATH_TIMEOUT_SECONDS
+                assert result.scan_timeout == PRESIDIO_SCAN_TIMEOUT_SECONDS
+
+        def test_parse_args_for_run_with_timeouts_returns_expected_args(self):
+            testargs = ["run_scan", "--path-timeout", "2.5", "--scan-timeout", "0", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                result = parse_args(testargs)
+                assert result.path_timeout == 2.5
+                assert result.scan_timeout == 0
+
+        def test_create_run_security_scan_passes_each_arg_to_the_matching_setting(self):
+            testargs = [
+                "run_scan",
+                "--max-in-flight-paths",
+                "8",
+                "--memory-budget-mb",
+                "16",
+                "--path-timeout",
+                "2.5",
+                "--scan-timeout",
+                "30",
+                "--in-process-proxy",
+                "a.txt",
+            ]
+            with mock.patch.object(sys, "argv", testargs):
+                scan = create_run_security_scan(parse_args(testargs))
+
+                assert scan.paths == ["a.txt"]
+                assert scan.in_process_proxy is True
+                assert scan.max_in_flight_paths == 8
+                assert scan.memory_budget == 16 * 1024 * 1024
+                assert scan.path_timeout == 2.5
+                assert scan.scan_timeout == 30
+
+        @pytest.mark.parametrize(
+            "limit", [["--memory-budget-mb", "-1"], ["--path-timeout", "-1"], ["--scan-timeout", "-0.5"]]
+        )
+        def test_create_run_security_scan_with_negative_limit_fails_validation(self, limit):
+            testargs = ["run_scan", *limit, "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                assert create_run_security_scan(parse_args(testargs)).validate_args() is False
+
+        def test_parse_args_for_run_with_in_process_proxy_returns_expected_args(self):
+            testargs = ["run_scan", "--in-process-proxy", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                assert parse_args(testargs).in_process_proxy is True
+
+        def test_parse_args_with_profile_returns_expected_args(self):
+            testargs = ["run_scan", "--profile", "profile.json", "a.txt"]
+            with mock.patch.object(sys, "argv", testargs):
+                result = parse_args(testargs)
+                assert result.profile == "profile.json"
+                assert result.paths == ["a.txt"]
+
+        def test_parse_args_for_build_engine_snapshot_returns_expected_hook(self):
+            testargs = ["build_engine_snapshot", "engine.snapshot"]
+            with mock.patch.object(sys, "argv", testargs):
+                result = parse_args(testargs)
+                assert result.paths == ["engine.snapshot"]
+                assert result.hook(result).__class__.__name__ == "BuildEngineSnapshot"
+
         def test_parse_args_for_validate_without_paths_returns_expected_args(self):
             testargs = ["validate_scan"]
             with mock.patch.object(sys, "argv", testargs):
@@ -115,7 +252,7 @@ class TestCLI:
             mock_hook = mock.MagicMock()
             mock_hook.validate_args = mock.MagicMock(return_value=False)
 
-            mock_args = mock.MagicMock()
+            mock_args = mock.MagicMock(profile=None)
             mock_args.hook.return_value = mock_hook
 
             with mock.patch.object(sys, "argv", [""]), mock.patch("src.hooks.cli.parse_args") as mock_parse_args:
@@ -127,7 +264,7 @@ class TestCLI:
             mock_hook.validate_args = mock.MagicMock(return_value=True)
             mock_hook.validate_hook_settings = mock.AsyncMock(return_value=False)
 
-            mock_args = mock.MagicMock()
+            mock_args = mock.MagicMock(profile=None)
             mock_args.hook.return_value = mock_hook
 
             with mock.patch.object(sys, "argv", [""]), mock.patch("src.hooks.cli.parse_args") as mock_parse_args:
@@ -147,7 +284,7 @@ class TestCLI:
 
             mock_hook.run = mock_run
 
-            mock_args = mock.MagicMock()
+            mock_args = mock.MagicMock(profile=None)
             mock_args.hook.return_value = mock_hook
 
             with mock.patch.object(sys, "argv", [""]), mock.patch("src.hooks.cli.parse_args") as mock_parse_args:
@@ -167,9 +304,30 @@ class TestCLI:
 
             mock_hook.run = mock_run
 
-            mock_args = mock.MagicMock()
+            mock_args = mock.MagicMock(profile=None)
             mock_args.hook.return_value = mock_hook
 
             with mock.patch.object(sys, "argv", [""]), mock.patch("src.hooks.cli.parse_args") as mock_parse_args:
                 mock_parse_args.return_value = mock_args
                 assert await main_async() == 0
+
+        async def test_hook_with_profile_writes_profile_of_each_phase(self, tmp_path):
+            mock_hook = mock.MagicMock()
+            mock_hook.validate_args = mock.MagicMock(return_value=True)
+            mock_hook.validate_hook_settings = mock.AsyncMock(return_value=True)
+            mock_hook.run = mock.AsyncMock(return_value=mock.MagicMock())
+
+            profile_file = tmp_path / "profile.json"
+            mock_args = mock.MagicMock(profile=str(profile_file))
+            mock_args.hook.return_value = mock_hook
+
+            with mock.patch.object(sys, "argv", [""]), mock.patch("src.hooks.cli.parse_args") as mock_parse_args:
+                mock_parse_args.return_value = mock_args
+                assert await main_async() == 0
+
+            profile = json.loads(profile_file.read_text())
+            assert [span["name"] for span in profile["spans"]] == [
+                "cli.create_hook",
+                "cli.validate_hook_settings",
+                "cli.run",
+            ]
@@ -0,0 +1,166 @@
+import os
+import pytest
+import subprocess
+
+from src.hooks.git_files import (
+    StagedFile,
+    StagedFiles,
+    get_paths_matching_index,
+    get_staged_tree,
+    iter_tracked_files,
+)
+
+
+def run_git(repo_path, *args):
+    return subprocess.run(["git", "-C", str(repo_path), *args], check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    run_git(tmp_path, "init", "--initial-branch=main")
+    run_git(tmp_path, "config", "user.email", "test@example.com")
+    run_git(tmp_path, "config", "user.name", "Test")
+    (tmp_path / "folder" / "nested").mkdir(parents=True)
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "folder" / "b with spaces.txt").write_text("b")
+    (tmp_path / "folder" / "nested" / "c\nnewline.txt").write_text("c")
+    run_git(tmp_path, "add", ".")
+    # A submodule is stored in the tree as a commit entry
+    commit = run_git(tmp_path, "hash-object", "-t", "commit", "--stdin", "--literally")
+    run_git(tmp_path, "update-index", "--add", "--cacheinfo", f"160000,{commit},submodule")
+    run_git(tmp_path, "commit", "-m", "Initial commit")
+    return tmp_path
+
+
+class TestIterTrackedFiles:
+    async def test_iter_tracked_files_returns_every_file_in_tree_without_directories_or_submodules(self, git_repo):
+        paths = [path async for path in iter_tracked_files(str(git_repo))]
+
+        assert sorted(paths) == [
+            os.path.join(git_repo, "a.txt"),
+            os.path.join(git_repo, "folder", "b with spaces.txt"),
+            os.path.join(git_repo, "folder", "nested", "c\nnewline.txt"),
+        ]
+
+    async def test_iter_tracked_files_does_not_return_untracked_files(self, git_repo):
+        (git_repo / "untracked.txt").write_text("untracked")
+
+        paths = [path async for path in iter_tracked_files(str(git_repo))]
+
+        assert os.path.join(git_repo, "untracked.txt") not in paths
+
+    async def test_iter_tracked_files_raises_error_when_git_fails(self, tmp_path):
+        with pytest.raises(subprocess.CalledProcessError):
+            [path async for path in iter_tracked_files(str(tmp_path))]
+
+
+@pytest.fixture
+def staged_repo(git_repo, monkeypatch):
+    monkeypatch.chdir(git_repo)
+    (git_repo / "a.txt").write_text("staged a")
+    (git_repo / "copy.txt").write_text("staged a")
+    run_git(git_repo, "add", "a.txt", "copy.txt")
+    (git_repo / "a.txt").write_text("unstaged a")
+    (git_repo / "untracked.txt").write_text("untracked")
+    os.symlink("a.txt", git_repo / "link.txt")
+    run_git(git_repo, "add", "link.txt")
+    return git_repo
+
+
+class TestStagedFiles:
+    async def test_load_returns_blob_for_each_path_staged_as_a_regular_file(self, staged_repo):
+        staged_files = await StagedFiles.load(["./a.txt", "copy.txt", "untracked.txt", "link.txt", "submodule"])
+
+        assert sorted(staged_files.blobs) == ["a.txt", "copy.txt"]
+        assert staged_files.get("./a.txt") == staged_files.get("copy.txt")
+        assert staged_files.get("untracked.txt") is None
+
+    async def test_load_returns_size_of_each_staged_blob(self, staged_repo):
+        staged_files = await StagedFiles.load(["a.txt", "folder/b with spaces.txt"])
+
+        assert staged_files.get_size(staged_files.get("a.txt")) == len("staged a")
+        assert staged_files.get_size(staged_files.get("folder/b with spaces.txt")) == len("b")
+        assert staged_files.get_size("0" * 40) == 0
+
+    async def test_load_treats_paths_as_file_names_not_patterns(self, staged_repo):
+        (staged_repo / "*.txt").write_text("star")
+        run_git(staged_repo, "--literal-pathspecs", "add", "*.txt")
+
+        staged_files = await StagedFiles.load(["*.txt"])
+
+        assert sorted(staged_files.blobs) == ["*.txt"]
+
+    async def test_read_blob_returns_staged_contents_instead_of_working_tree_contents(self, staged_repo):
+        staged_files = await StagedFiles.load(["a.txt", "folder/b with spaces.txt"])
+        try:
+            assert await staged_files.read_blob(staged_files.get("a.txt")) == b"staged a"
+            assert await staged_files.read_blob(staged_files.get("folder/b with spaces.txt")) == b"b"
+        finally:
+            await staged_files.aclose()
+
+    async def test_read_blob_raises_error_when_blob_is_missing(self, staged_repo):
+        staged_files = await StagedFiles.load([])
+        try:
+            with pytest.raises(ValueError):
+                await staged_files.read_blob("0" * 40)
+        finally:
+            await staged_files.aclose()
+
+    async def test_checkout_writes_staged_contents_to_directory(self, staged_repo, tmp_path_factory):
+        directory = tmp_path_factory.mktemp("staged")
+        staged_files = await StagedFiles.load(["a.txt", "folder/b with spaces.txt"])
+
+        await staged_files.checkout(str(directory))
+
+        assert (directory / "a.txt").read_text() == "staged a"
+        assert (directory / "folder" / "b with spaces.txt").read_text() == "b"
+
+
+class TestStagedTree:
+    async def test_get_staged_tree_returns_tree_of_index(self, staged_repo):
+        assert await get_staged_tree() == run_git(staged_repo, "write-tree")
+
+    async def test_get_staged_tree_changes_when_index_changes(self, staged_repo):
+        tree = await get_staged_tree()
+        run_git(staged_repo, "add", "untracked.txt")
+
+        assert await get_staged_tree() != tree
+
+    async def test_get_staged_tree_outside_repository_returns_none(self, tmp_path, monkeypatch):
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(tmp_path.parent))
+
+        assert await get_staged_tree() is None
+
+    async def test_get_paths_matching_index_returns_staged_paths_unchanged_in_working_tree(self, staged_repo):
+        matching_paths = await get_paths_matching_index(["./a.txt", "copy.txt", "untracked.txt", "folder/b with spaces.txt"])
+
+        assert matching_paths == {"copy.txt", os.path.join("folder", "b with spaces.txt")}
+
+    async def test_get_paths_matching_index_does_not_return_deleted_paths(self, staged_repo):
+        (staged_repo / "copy.txt").unlink()
+
+        assert await get_paths_matching_index(["copy.txt"]) == set()
+
+    async def test_get_paths_matching_index_outside_repository_returns_none(self, staged_repo, tmp_path_factory):
+        outside = tmp_path_factory.mktemp("outside") / "a.txt"
+        outside.write_text("a")
+
+        assert await get_paths_matching_index([str(outside)]) is None
+
+    async def test_get_paths_matching_index_treats_paths_as_file_names_not_patterns(self, staged_repo):
+        (staged_repo / "[ac]opy.txt").write_text("bracket")
+        run_git(staged_repo, "--literal-pathspecs", "add", "[ac]opy.txt")
+
+        assert await get_paths_matching_index(["[ac]opy.txt"]) == {"[ac]opy.txt"}
+
+
+class TestStagedFile:
+    async def test_read_returns_contents(self):
+        staged_file = StagedFile("line 1\nline 2")
+
+        assert await staged_file.read(4) == "line"
+        assert await staged_file.read() == " 1\nline 2"
+
+    async def test_iterating_returns_each_line(self):
+        assert [line async for line in StagedFile("line 1\nline 2")] == ["line 1\n", "line 2"]
@@ -0,0 +1,62 @@
+import os
+
+from src.hooks.hook_settings import HookSettingsCache, SafeLoader, load_yaml
+
+REPO = {"repo": "https://github.com/uktrade/github-standards", "rev": "v1"}
+
+
+class TestLoadYaml:
+    def test_load_yaml_returns_same_result_as_safe_load(self):
+        assert load_yaml("repos:\n  - repo: a\n    rev: v1\n") == {"repos": [{"repo": "a", "rev": "v1"}]}
+
+    def test_load_yaml_uses_libyaml_loader_when_available(self):
+        import yaml
+
+        if yaml.__with_libyaml__:
+            assert SafeLoader is yaml.CSafeLoader
+
+
+class TestHookSettingsCache:
+    async def test_get_without_cache_returns_none(self, tmp_path):
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text("repos: []")
+
+        assert await HookSettingsCache(str(tmp_path / "cache")).get(str(config_file), os.stat(config_file)) is None
+
+    async def test_get_for_unchanged_config_returns_cached_repo(self, tmp_path):
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text("repos: []")
+        cache = HookSettingsCache(str(tmp_path / "cache"))
+
+        await cache.set(str(config_file), os.stat(config_file), REPO)
+
+        assert await cache.get(str(config_file), os.stat(config_file)) == REPO
+        assert (tmp_path / "cache" / ".gitignore").read_text() == "*\n"
+
+    async def test_get_for_changed_config_returns_none(self, tmp_path):
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text("repos: []")
+        cache = HookSettingsCache(str(tmp_path / "cache"))
+        await cache.set(str(config_file), os.stat(config_file), REPO)
+
+        config_file.write_text("repos: [changed]")
+
+        assert await cache.get(str(config_file), os.stat(config_file)) is None
+
+    async def test_get_for_another_config_file_returns_none(self, tmp_path):
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text("repos: []")
+        other_config_file = tmp_path / "other.yaml"
+        other_config_file.write_text("repos: []")
+        os.utime(other_config_file, ns=(os.stat(config_file).st_atime_ns, os.stat(config_file).st_mtime_ns))
+        cache = HookSettingsCache(str(tmp_path / "cache"))
+        await cache.set(str(config_file), os.stat(config_file), REPO)
+
+        assert await cache.get(str(other_config_file), os.stat(other_config_file)) is None
+
+    async def test_get_with_invalid_cache_file_returns_none(self, tmp_path):
+        config_file = tmp_path / "config.yaml"
+        config_file.write_text("repos: []")
+        (tmp_path / "hook_settings.json").write_text("{not json")
+
+        assert await HookSettingsCache(str(tmp_path)).get(str(config_file), os.stat(config_file)) is None
@@ -1,7 +1,11 @@
+import os
+import pytest
+
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 from anyio import NamedTemporaryFile
+from src.hooks.hook_settings import load_yaml
 from src.hooks.hooks_base import Hook, HookRunResult
 
 
@@ -16,6 +20,22 @@ class HooksBaseTestImplementation(Hook):
         return HookRunResult()
 
 
+VALID_YAML = b"""
+repos:
+    - repo: https://github.com/uktrade/github-standards
+      rev: v111
+      hooks:
+        - id: validate-security-scan
+        - id: run-security-scan
+"""
+
+
+@pytest.fixture(autouse=True)
+def cache_directory(tmp_path):
+    with patch("src.hooks.hooks_base.DEFAULT_CACHE_DIRECTORY", str(tmp_path / "cache")):
+        yield tmp_path / "cache"
+
+
 class TestHooksBase:
     def test_init_assigns_paths_as_empty_list_when_paths_is_none(self):
         assert HooksBaseTestImplementation().paths == []
@@ -96,3 +116,70 @@ class TestHooksBase:
                 await tf.seek(0)
 
                 assert await HooksBaseTestImplementation().validate_hook_settings() is False
+
+    async def test_validate_hook_settings_with_valid_pre_commit_file_passes_repo_entry_to_hook(self, tmp_path):
+        pre_commit_file = tmp_path / ".pre-commit-config.yaml"
+        pre_commit_file.write_bytes(VALID_YAML)
+        with (
+            patch("src.hooks.hooks_base.PRE_COMMIT_FILE", str(pre_commit_file)),
+            patch.object(HooksBaseTestImplementation, "_enforce_settings_checks", return_value=True),
+            patch.object(
+                HooksBaseTestImplementation, "_validate_hook_settings", AsyncMock(return_value=True)
+            ) as mock_validate,
+        ):
+            assert await HooksBaseTestImplementation().validate_hook_settings() is True
+
+            mock_validate.assert_awaited_once_with(
+                {
+                    "repo": "https://github.com/uktrade/github-standards",
+                    "rev": "v111",
+                    "hooks": [{"id": "validate-security-scan"}, {"id": "run-security-scan"}],
+                }
+            )
+
+    async def test_validate_hook_settings_for_unchanged_pre_commit_file_does_not_parse_it_again(self, tmp_path):
+        pre_commit_file = tmp_path / ".pre-commit-config.yaml"
+        pre_commit_file.write_bytes(VALID_YAML)
+        with (
+            patch("src.hooks.hooks_base.PRE_COMMIT_FILE", str(pre_commit_file)),
+            patch.object(HooksBaseTestImplementation, "_enforce_settings_checks", return_value=True),
+            patch.object(
+                HooksBaseTestImplementation, "_validate_hook_settings", AsyncMock(return_value=True)
+            ) as mock_validate,
+            patch("src.hooks.hooks_base.load_yaml", wraps=load_yaml) as mock_load_yaml,
+        ):
+            await HooksBaseTestImplementation().validate_hook_settings()
+            await HooksBaseTestImplementation().validate_hook_settings()
+
+            mock_load_yaml.assert_called_once()
+            assert mock_validate.await_args_list[0] == mock_validate.await_args_list[1]
+
+    async def test_validate_hook_settings_for_changed_pre_commit_file_parses_it_again(self, tmp_path):
+        pre_commit_file = tmp_path / ".pre-commit-config.yaml"
+        pre_commit_file.write_bytes(VALID_YAML)
+        with (
+            patch("src.hooks.hooks_base.PRE_COMMIT_FILE", str(pre_commit_file)),
+            patch.object(HooksBaseTestImplementation, "_enforce_settings_checks", return_value=True),
+            patch.object(
+                HooksBaseTestImplementation, "_validate_hook_settings", AsyncMock(return_value=True)
+            ) as mock_validate,
+        ):
+            await HooksBaseTestImplementation().validate_hook_settings()
+
+            pre_commit_file.write_bytes(VALID_YAML.replace(b"v111", b"v222"))
+            # Make sure the modification time changes, even on file systems with a coarse timestamp resolution
+            os.utime(pre_commit_file, ns=(0, 0))
+            await HooksBaseTestImplementation().validate_hook_settings()
+
+            assert mock_validate.await_args_list[1].args[0]["rev"] == "v222"
+
+    async def test_validate_hook_settings_with_invalid_pre_commit_file_is_not_cached(self, tmp_path, cache_directory):
+        pre_commit_file = tmp_path / ".pre-commit-config.yaml"
+        pre_commit_file.write_bytes(b"repos: []")
+        with (
+            patch("src.hooks.hooks_base.PRE_COMMIT_FILE", str(pre_commit_file)),
+            patch.object(HooksBaseTestImplementation, "_enforce_settings_checks", return_value=True),
+        ):
+            assert await HooksBaseTestImplementation().validate_hook_settings() is False
+
+        assert not cache_directory.exists()
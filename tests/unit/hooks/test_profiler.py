@@ -0,0 +1,110 @@
+import json
+import pytest
+
+from contextlib import asynccontextmanager, contextmanager
+
+from src.hooks.config import PROFILE_PATH_SPAN
+from src.hooks.profiler import (
+    Profiler,
+    get_profiler,
+    profile_async_context,
+    profile_context,
+    profile_span,
+    use_profiler,
+)
+
+
+class TestProfiler:
+    def test_profile_span_without_profiler_records_nothing(self):
+        with profile_span("phase") as span:
+            span["files"] = 1
+
+        assert get_profiler() is None
+
+    def test_profile_span_records_span_with_attributes(self):
+        with use_profiler(Profiler()) as profiler:
+            with profile_span("phase", kind="test") as span:
+                span["files"] = 2
+
+        assert get_profiler() is None
+        assert [(span.name, span.attributes) for span in profiler.spans] == [("phase", {"kind": "test", "files": 2})]
+        assert profiler.spans[0].duration >= 0
+
+    def test_profile_span_is_recorded_when_an_exception_is_raised(self):
+        with use_profiler(Profiler()) as profiler, pytest.raises(ValueError):
+            with profile_span("phase"):
+                raise ValueError("failed")
+
+        assert [span.name for span in profiler.spans] == ["phase"]
+
+    def test_profile_context_records_start_and_stop(self):
+        events = []
+
+        @contextmanager
+        def context():
+            events.append("start")
+            yield "value"
+            events.append("stop")
+
+        with use_profiler(Profiler()) as profiler:
+            with profile_context("proxy", context(), proxy="test") as value:
+                assert value == "value"
+                assert [span.name for span in profiler.spans] == ["proxy_start"]
+
+        assert events == ["start", "stop"]
+        assert [(span.name, span.attributes) for span in profiler.spans] == [
+            ("proxy_start", {"proxy": "test"}),
+            ("proxy_stop", {"proxy": "test"}),
+        ]
+
+    async def test_profile_async_context_passes_exception_to_context_manager(self):
+        exceptions = []
+
+        @asynccontextmanager
+        async def context():
+            try:
+                yield
+            except ValueError as exc:
+                exceptions.append(exc)
+                raise
+
+        with use_profiler(Profiler()) as profiler, pytest.raises(ValueError):
+            async with profile_async_context("proxy", context()):
+                raise ValueError("failed")
+
+        assert len(exceptions) == 1
+        assert [span.name for span in profiler.spans] == ["proxy_start", "proxy_stop"]
+
+    def test_get_report_summarises_paths(self):
+        profiler = Profiler()
+        with use_profiler(profiler):
+            for path, size, cached in [("a.txt", 100, False), ("b.txt", 300, False), ("c.txt", 1000, True)]:
+                with profile_span(PROFILE_PATH_SPAN, path=path) as span:
+                    span["bytes"] = size
+                    span["cached"] = cached
+            with profile_span("presidio.scan"):
+                pass
+
+        report = profiler.get_report(slowest_paths=2)
+
+        assert [span["name"] for span in report["spans"]] == ["presidio.scan"]
+        assert report["phases"][PROFILE_PATH_SPAN]["count"] == 3
+        assert report["paths"]["count"] == 3
+        assert report["paths"]["bytes"] == 400
+        assert report["paths"]["bytes_per_second"] > 0
+        assert len(report["paths"]["slowest"]) == 2
+
+    def test_get_report_without_paths_has_no_throughput(self):
+        report = Profiler().get_report()
+
+        assert report["paths"] == {"count": 0, "bytes": 0, "seconds": 0.0, "bytes_per_second": None, "slowest": []}
+
+    def test_write_writes_report_as_json(self, tmp_path):
+        profile_file = tmp_path / "profile.json"
+        profiler = Profiler()
+        with use_profiler(profiler), profile_span("phase"):
+            pass
+
+        profiler.write(str(profile_file))
+
+        assert [span["name"] for span in json.loads(profile_file.read_text())["spans"]] == ["phase"]
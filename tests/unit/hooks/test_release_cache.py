@@ -0,0 +1,46 @@
+import time
+
+from src.hooks.release_cache import CachedRelease, ReleaseTagCache
+
+
+class TestCachedRelease:
+    def test_is_fresh_within_ttl_returns_true(self):
+        assert CachedRelease("v1").is_fresh(60) is True
+
+    def test_is_fresh_after_ttl_returns_false(self):
+        assert CachedRelease("v1", checked_at=time.time() - 61).is_fresh(60) is False
+
+    def test_is_fresh_checked_in_the_future_returns_false(self):
+        # A clock that has gone backwards must not keep a cached release fresh for longer than the ttl
+        assert CachedRelease("v1", checked_at=time.time() + 3600).is_fresh(60) is False
+
+
+class TestReleaseTagCache:
+    async def test_load_without_cache_file_returns_none(self, tmp_path):
+        assert await ReleaseTagCache(str(tmp_path)).load() is None
+
+    async def test_load_returns_saved_release(self, tmp_path):
+        cache = ReleaseTagCache(str(tmp_path))
+        await cache.save(CachedRelease("v1", etag='"abc"', checked_at=10.0))
+
+        cached_release = await cache.load()
+
+        assert cached_release.to_dict() == {"tag_name": "v1", "etag": '"abc"', "checked_at": 10.0}  # type: ignore
+
+    async def test_save_creates_directory_that_ignores_itself_from_git(self, tmp_path):
+        cache_directory = tmp_path / "cache"
+        await ReleaseTagCache(str(cache_directory)).save(CachedRelease("v1"))
+
+        assert (cache_directory / ".gitignore").read_text() == "*\n"
+        assert sorted(path.name for path in cache_directory.iterdir()) == [".gitignore", "latest_release.json"]
+
+    async def test_load_invalid_cache_file_returns_none(self, tmp_path):
+        cache = ReleaseTagCache(str(tmp_path))
+        (tmp_path / "latest_release.json").write_text("{not json")
+
+        assert await cache.load() is None
+
+    async def test_save_to_directory_that_can_not_be_created_does_not_raise(self, tmp_path):
+        (tmp_path / "file").write_text("")
+
+        await ReleaseTagCache(str(tmp_path / "file" / "cache")).save(CachedRelease("v1"))
@@ -1,4 +1,6 @@
+import git
 import json
+import os
 import pytest
 import requests
 
@@ -7,20 +9,29 @@ import pytest_asyncio
 from aiohttp import ClientResponseError, web
 from aiohttp.pytest_plugin import AiohttpClient
 
+from contextlib import asynccontextmanager
 from pathlib import Path
 from presidio_analyzer import RecognizerResult
 
-from unittest.mock import AsyncMock, MagicMock, patch
+from typing import Any, Dict
+from unittest.mock import ANY, AsyncMock, patch
 from src.hooks.config import (
     LOGGER,
     PERSONAL_DATA_SCAN,
+    PRESIDIO_MAX_IN_FLIGHT_PATHS,
+    PRESIDIO_MEMORY_BUDGET_BYTES,
+    PRESIDIO_PATH_TIMEOUT_SECONDS,
+    PRESIDIO_SCAN_TIMEOUT_SECONDS,
     RELEASE_CHECK_URL,
     SECURITY_SCAN,
 )
 from src.hooks.presidio.path_filter import PathScanStatus
+from src.hooks.presidio.result_cache import PresidioResultCache
 from src.hooks.presidio.scanner import PersonalDataDetection, PresidioScanResult, PathScanResult
-from src.hooks.run_security_scan import RunSecurityScan
-from src.hooks.trufflehog.scanner import TrufflehogScanResult
+from src.hooks.release_cache import CachedRelease, ReleaseTagCache
+from src.hooks.run_security_scan import RunSecurityScan, RunSecurityScanResult
+from src.hooks.scan_receipts import ScanReceipts
+from src.hooks.trufflehog.scanner import TrufflehogFinding, TrufflehogScanResult
 
 
 @pytest_asyncio.fixture
@@ -31,6 +42,40 @@ async def aio_client_with_app(aiohttp_client: AiohttpClient):
     return client
 
 
+class FakeResponse:
+    def __init__(self, status: int, body: Dict[str, Any] | None = None, headers: Dict[str, str] | None = None) -> None:
+        self.status = status
+        self.real_url = RELEASE_CHECK_URL
+        self.headers = headers if headers else {}
+        self.body = body
+
+    async def json(self):
+        return self.body
+
+
+class FakeClientSession:
+    """Records the headers of the request sent to it, and returns a fixed response or raises a fixed error"""
+
+    def __init__(self, response: FakeResponse, error: Exception | None = None) -> None:
+        self.response = response
+        self.error = error
+        self.request_headers: Dict[str, str] | None = None
+        self.closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.closed = True
+
+    @asynccontextmanager
+    async def get(self, url: str, headers: Dict[str, str], **kwargs):
+        self.request_headers = headers
+        if self.error:
+            raise self.error
+        yield self.response
+
+
 class TestRunSecurityScan:
     def test_validate_args_without_path_list_returns_false(self):
         assert RunSecurityScan(paths=None).validate_args() is False
@@ -58,8 +103,59 @@ class TestRunSecurityScan:
             mock_is_dir.return_value = True
             assert RunSecurityScan(paths=["/a/b/c"], github_action=True).validate_args() is True
 
+    def test_validate_args_with_negative_jobs_returns_false(self):
+        assert RunSecurityScan(paths=["a.txt"], jobs=-1).validate_args() is False
+
+    def test_validate_args_with_negative_trufflehog_shards_returns_false(self):
+        assert RunSecurityScan(paths=["a.txt"], trufflehog_shards=-1).validate_args() is False
+
+    def test_validate_args_with_zero_trufflehog_concurrency_returns_false(self):
+        assert RunSecurityScan(paths=["a.txt"], trufflehog_concurrency=0).validate_args() is False
+
+    @pytest.mark.parametrize("max_in_flight_paths", [0, -1])
+    def test_validate_args_with_max_in_flight_paths_below_one_returns_false(self, max_in_flight_paths):
+        assert RunSecurityScan(paths=["a.txt"], max_in_flight_paths=max_in_flight_paths).validate_args() is False
+
+    @pytest.mark.parametrize("memory_budget", [0, -1, -1024 * 1024])
+    def test_validate_args_with_memory_budget_below_one_byte_returns_false(self, memory_budget):
+        assert RunSecurityScan(paths=["a.txt"], memory_budget=memory_budget).validate_args() is False
+
+    @pytest.mark.parametrize(
+        "timeouts",
+        [{"path_timeout": -1}, {"scan_timeout": -1}, {"path_timeout": float("nan")}, {"scan_timeout": float("nan")}],
+    )
+    def test_validate_args_with_negative_timeout_returns_false(self, timeouts):
+        assert RunSecurityScan(paths=["a.txt"], **timeouts).validate_args() is False
+
+    async def test_run_personal_scan_passes_timeouts_to_the_scanner(self):
+        with patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner:
+            mock_scanner.return_value.scan = AsyncMock()
+            await RunSecurityScan(paths=["1.txt"], path_timeout=5, scan_timeout=0).run_personal_scan()
+
+            assert mock_scanner.call_args.kwargs["path_timeout"] == 5
+            assert mock_scanner.call_args.kwargs["scan_timeout"] == 0
+
+    async def test_run_personal_scan_passes_queue_limits_to_the_scanner(self):
+        with patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner:
+            mock_scanner.return_value.scan = AsyncMock()
+            await RunSecurityScan(paths=["1.txt"], max_in_flight_paths=4, memory_budget=1024).run_personal_scan()
+
+            assert mock_scanner.call_args.kwargs["max_in_flight_paths"] == 4
+            assert mock_scanner.call_args.kwargs["memory_budget"] == 1024
+
+    def test_validate_args_with_diff_base_without_github_actions_mode_returns_false(self):
+        assert RunSecurityScan(paths=["a.txt"], diff_base="main").validate_args() is False
+
+    def test_validate_args_with_diff_base_with_github_actions_mode_returns_true(self):
+        with patch.object(Path, "is_dir", return_value=True):
+            assert RunSecurityScan(paths=["/a/b/c"], github_action=True, diff_base="main").validate_args() is True
+
+    def test_validate_args_with_staged_with_github_actions_mode_returns_false(self):
+        with patch.object(Path, "is_dir", return_value=True):
+            assert RunSecurityScan(paths=["/a/b/c"], github_action=True, staged=True).validate_args() is False
+
     @pytest.mark.asyncio
-    async def test_get_version_from_remote_raises_exception_for_http_errors(self, aio_client_with_app):
+    async def test_get_version_from_remote_raises_exception_for_http_errors(self, aio_client_with_app, tmp_path):
         aio_client_with_app.app.router.add_route(
             "GET",
             RELEASE_CHECK_URL,
@@ -67,12 +163,13 @@ class TestRunSecurityScan:
         )
         with (
             patch.object(RunSecurityScan, "_get_client_session", return_value=aio_client_with_app),
+            patch.object(RunSecurityScan, "_get_release_tag_cache", return_value=ReleaseTagCache(str(tmp_path))),
             pytest.raises(ClientResponseError),
         ):
             await RunSecurityScan()._get_version_from_remote()
 
     @pytest.mark.asyncio
-    async def test_get_version_from_remote_returns_expected_json(self, aio_client_with_app):
+    async def test_get_version_from_remote_returns_expected_json(self, aio_client_with_app, tmp_path):
         aio_client_with_app.app.router.add_route(
             "GET",
             RELEASE_CHECK_URL,
@@ -80,9 +177,60 @@ class TestRunSecurityScan:
         )
         with (
             patch.object(RunSecurityScan, "_get_client_session", return_value=aio_client_with_app),
+            patch.object(RunSecurityScan, "_get_release_tag_cache", return_value=ReleaseTagCache(str(tmp_path))),
         ):
             assert await RunSecurityScan()._get_version_from_remote() == "v1122"
 
+    async def test_get_version_from_remote_with_fresh_cached_release_does_not_call_github(self, tmp_path):
+        cache = ReleaseTagCache(str(tmp_path))
+        await cache.save(CachedRelease("v7", etag='"abc"'))
+        with (
+            patch.object(RunSecurityScan, "_get_client_session") as mock_get_client_session,
+            patch.object(RunSecurityScan, "_get_release_tag_cache", return_value=cache),
+        ):
+            assert await RunSecurityScan()._get_version_from_remote() == "v7"
+
+            mock_get_client_session.assert_not_called()
+
+    async def test_get_version_from_remote_with_stale_cached_release_revalidates_with_etag(self, tmp_path):
+        cache = ReleaseTagCache(str(tmp_path))
+        await cache.save(CachedRelease("v7", etag='"abc"', checked_at=0))
+        session = FakeClientSession(FakeResponse(304, headers={"ETag": '"abc"'}))
+        with (
+            patch.object(RunSecurityScan, "_get_client_session", return_value=session),
+            patch.object(RunSecurityScan, "_get_release_tag_cache", return_value=cache),
+        ):
+            assert await RunSecurityScan()._get_version_from_remote() == "v7"
+
+        assert session.request_headers == {"If-None-Match": '"abc"'}
+        assert session.closed is True
+        cached_release = await cache.load()
+        assert cached_release.is_fresh(cache.ttl)  # type: ignore
+
+    async def test_get_version_from_remote_caches_new_release_with_its_etag(self, tmp_path):
+        cache = ReleaseTagCache(str(tmp_path))
+        session = FakeClientSession(FakeResponse(200, {"tag_name": "v8"}, headers={"ETag": '"def"'}))
+        with (
+            patch.object(RunSecurityScan, "_get_client_session", return_value=session),
+            patch.object(RunSecurityScan, "_get_release_tag_cache", return_value=cache),
+        ):
+            assert await RunSecurityScan()._get_version_from_remote() == "v8"
+
+        assert session.request_headers == {}
+        cached_release = await cache.load()
+        assert (cached_release.tag_name, cached_release.etag) == ("v8", '"def"')  # type: ignore
+
+    async def test_get_version_from_remote_closes_session_when_request_fails(self, tmp_path):
+        session = FakeClientSession(FakeResponse(200), error=ClientResponseError(None, (), status=500))  # type: ignore
+        with (
+            patch.object(RunSecurityScan, "_get_client_session", return_value=session),
+            patch.object(RunSecurityScan, "_get_release_tag_cache", return_value=ReleaseTagCache(str(tmp_path))),
+            pytest.raises(ClientResponseError),
+        ):
+            await RunSecurityScan()._get_version_from_remote()
+
+        assert session.closed is True
+
     async def test_validate_hook_settings_with_dbt_hooks_repo_present_without_rev_element_in_pre_commit_file_returns_false(
         self,
     ):
@@ -93,86 +241,224 @@ class TestRunSecurityScan:
 
             assert await RunSecurityScan()._validate_hook_settings(repo) is False
 
-    async def test_validate_hook_settings_with_dbt_hooks_repo_present_with_rev_element_in_pre_commit_file_differs_remote_version_returns_true_but_logs_error(
+    async def test_validate_hook_settings_with_rev_element_does_not_check_remote_version(self):
+        with (
+            patch.object(RunSecurityScan, "_enforce_settings_checks", return_value=True),
+            patch.object(RunSecurityScan, "_get_version_from_remote") as mock_get_version_from_remote,
+        ):
+            scan = RunSecurityScan()
+            repo = {"repo": "https://github.com/uktrade/github-standards", "rev": "v1"}
+
+            assert await scan._validate_hook_settings(repo) is True
+            assert scan._version_in_config == "v1"
+            mock_get_version_from_remote.assert_not_called()
+
+    async def test_check_version_differs_remote_version_logs_error(
         self,
         caplog,
     ):
         with (
-            patch.object(RunSecurityScan, "_enforce_settings_checks", return_value=True),
             patch.object(RunSecurityScan, "_get_version_from_remote", return_value="v5"),
         ):
             logger = LOGGER
             logger.propagate = True  # Enable propagation for this logger
-            repo = {"repo": "https://github.com/uktrade/github-standards", "rev": "v3"}
 
-            assert await RunSecurityScan()._validate_hook_settings(repo) is True
-            assert caplog.records[1].levelname == "ERROR"
+            await RunSecurityScan()._check_version("v3")
+            assert caplog.records[-1].levelname == "ERROR"
 
-    async def test_validate_hook_settings_with_dbt_hooks_repo_present_when_remote_version_http_error_returns_true(
+    async def test_check_version_when_remote_version_http_error_does_not_raise(
         self,
     ):
         mock_get_version_from_remote = AsyncMock()
         mock_get_version_from_remote.side_effect = requests.exceptions.HTTPError
         with (
-            patch.object(RunSecurityScan, "_enforce_settings_checks", return_value=True),
             patch.object(RunSecurityScan, "_get_version_from_remote", mock_get_version_from_remote),
         ):
-            repo = {"repo": "https://github.com/uktrade/github-standards", "rev": "v1"}
-
-            assert await RunSecurityScan()._validate_hook_settings(repo) is True
+            await RunSecurityScan()._check_version("v1")
 
-    async def test_validate_hook_settings_with_dbt_hooks_repo_present_with_rev_element_in_pre_commit_file_matching_remote_version_returns_true(
+    async def test_check_version_matching_remote_version_does_not_log_error(
         self,
+        caplog,
     ):
         with (
-            patch.object(RunSecurityScan, "_enforce_settings_checks", return_value=True),
             patch.object(RunSecurityScan, "_get_version_from_remote", return_value="v1"),
         ):
-            repo = {"repo": "https://github.com/uktrade/github-standards", "rev": "v1"}
+            logger = LOGGER
+            logger.propagate = True  # Enable propagation for this logger
+
+            await RunSecurityScan()._check_version("v1")
+            assert [record for record in caplog.records if record.levelname == "ERROR"] == []
+
+    async def test_run_checks_version_alongside_the_scans(self):
+        with (
+            patch.object(RunSecurityScan, "_check_version") as mock_check_version,
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+        ):
+            scan = RunSecurityScan(paths=["a.txt"], use_daemon=False)
+            scan._version_in_config = "v1"
+
+            assert await scan.run() == mock_run_in_process.return_value
+            mock_check_version.assert_awaited_once_with("v1")
+
+    async def test_run_without_validated_hook_settings_does_not_check_version(self):
+        with (
+            patch.object(RunSecurityScan, "_check_version") as mock_check_version,
+            patch.object(RunSecurityScan, "run_in_process"),
+        ):
+            await RunSecurityScan(paths=["a.txt"], use_daemon=False).run()
 
-            assert await RunSecurityScan()._validate_hook_settings(repo) is True
+            mock_check_version.assert_not_called()
 
     async def test_run_security_scan_with_detected_keys_returns_keys(self):
         mock_scan_result = AsyncMock()
-        mock_scan_result.return_value.detected_keys = "Keys found"
-        with patch("src.hooks.run_security_scan.TrufflehogScanner") as mock_scanner:
+        mock_scan_result.return_value = TrufflehogScanResult([TrufflehogFinding("AWS")])
+        with patch("src.hooks.trufflehog.scanner.TrufflehogScanner") as mock_scanner:
             mock_scanner().scan = mock_scan_result
             scan = RunSecurityScan()
             result = await scan.run_security_scan()
-            assert result.detected_keys == "Keys found"
+            assert result.findings == [TrufflehogFinding("AWS")]
 
     async def test_run_security_scan_without_detected_keys_returns_nothing(self):
         mock_scan_result = AsyncMock()
-        mock_scan_result.return_value.detected_keys = None
-        with patch("src.hooks.run_security_scan.TrufflehogScanner") as mock_scanner:
+        mock_scan_result.return_value = TrufflehogScanResult()
+        with patch("src.hooks.trufflehog.scanner.TrufflehogScanner") as mock_scanner:
             mock_scanner().scan = mock_scan_result
             scan = RunSecurityScan()
             result = await scan.run_security_scan()
-            assert result.detected_keys is None
+            assert result.has_issues() is False
 
     async def test_run_personal_scan_with_github_action_set_true_calls_scanner_with_all_files_in_git_repo(self):
         with (
-            patch("src.hooks.run_security_scan.git.Repo") as mock_repo,
-            patch("src.hooks.run_security_scan.PresidioScanner") as mock_scanner,
+            patch("src.hooks.run_security_scan.iter_tracked_files") as mock_iter_tracked_files,
+            patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner,
         ):
-            git_file_1 = MagicMock()
-            git_file_1.abspath = "1.rt"
-
-            mock_repo.return_value.tree.return_value.traverse.return_value = [git_file_1]
-
             mock_scanner.return_value = AsyncMock()
             scan = RunSecurityScan(github_action=True, paths=["."])
             await scan.run_personal_scan()
-            mock_scanner.assert_called_once_with(False, ["1.rt"])
+            mock_iter_tracked_files.assert_called_once_with(".")
+            mock_scanner.assert_called_once_with(
+                False,
+                mock_iter_tracked_files.return_value,
+                jobs=1,
+                cache=ANY,
+                staged_files=None,
+                analyzer=None,
+                max_in_flight_paths=PRESIDIO_MAX_IN_FLIGHT_PATHS,
+                memory_budget=PRESIDIO_MEMORY_BUDGET_BYTES,
+                path_timeout=PRESIDIO_PATH_TIMEOUT_SECONDS,
+                scan_timeout=PRESIDIO_SCAN_TIMEOUT_SECONDS,
+            )
+
+    async def test_run_personal_scan_with_diff_base_calls_scanner_with_files_changed_since_merge_base(self, tmp_path):
+        repo = git.Repo.init(tmp_path, initial_branch="main")
+        for file_name in ["unchanged.txt", "modified.txt", "deleted.txt", "renamed.txt"]:
+            (tmp_path / file_name).write_text(file_name)
+        repo.index.add(["unchanged.txt", "modified.txt", "deleted.txt", "renamed.txt"])
+        repo.index.commit("Initial commit")
+
+        repo.create_head("feature").checkout()
+        (tmp_path / "modified.txt").write_text("modified")
+        (tmp_path / "added.txt").write_text("added")
+        repo.index.add(["modified.txt", "added.txt"])
+        repo.index.remove(["deleted.txt"], working_tree=True)
+        repo.index.move(["renamed.txt", "moved.txt"])
+        repo.index.commit("Feature commit")
+
+        repo.heads.main.checkout()
+        (tmp_path / "main_only.txt").write_text("main only")
+        repo.index.add(["main_only.txt"])
+        repo.index.commit("Main commit")
+        repo.heads.feature.checkout()
+
+        with patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner:
+            mock_scanner.return_value = AsyncMock()
+            await RunSecurityScan(github_action=True, paths=[str(tmp_path)], diff_base="main").run_personal_scan()
+
+            paths = mock_scanner.call_args.args[1]
+            assert sorted(paths) == [
+                os.path.join(tmp_path, file_name) for file_name in ["added.txt", "modified.txt", "moved.txt"]
+            ]
+
+    async def test_run_security_scan_with_diff_base_scans_commits_since_diff_base(self):
+        with patch("src.hooks.trufflehog.scanner.TrufflehogScanner") as mock_scanner:
+            mock_scanner.return_value.scan = AsyncMock()
+            await RunSecurityScan(github_action=True, paths=["."], diff_base="origin/dev").run_security_scan()
+            assert mock_scanner.return_value.scan.call_args.kwargs["since_commit"] == "origin/dev"
+
+    async def test_run_security_scan_passes_shards_and_concurrency_to_the_scanner(self):
+        with patch("src.hooks.trufflehog.scanner.TrufflehogScanner") as mock_scanner:
+            mock_scanner.return_value.scan = AsyncMock()
+            await RunSecurityScan(paths=["1.txt"], trufflehog_shards=4, trufflehog_concurrency=2).run_security_scan()
+            assert mock_scanner.call_args.kwargs["shards"] == 4
+            assert mock_scanner.call_args.kwargs["concurrency"] == 2
+
+    async def test_run_security_scan_passes_in_process_proxy_to_the_scanner(self):
+        with patch("src.hooks.trufflehog.scanner.TrufflehogScanner") as mock_scanner:
+            mock_scanner.return_value.scan = AsyncMock()
+            await RunSecurityScan(paths=["1.txt"], in_process_proxy=True).run_security_scan()
+            assert mock_scanner.call_args.kwargs["in_process_proxy"] is True
+
+    async def test_run_security_scan_with_zero_shards_uses_a_shard_per_cpu(self):
+        with (
+            patch("src.hooks.trufflehog.scanner.TrufflehogScanner") as mock_scanner,
+            patch("src.hooks.run_security_scan.os.cpu_count", return_value=16),
+        ):
+            mock_scanner.return_value.scan = AsyncMock()
+            await RunSecurityScan(paths=["1.txt"], trufflehog_shards=0).run_security_scan()
+            assert mock_scanner.call_args.kwargs["shards"] == 16
 
     async def test_run_personal_scan_with_github_action_set_false_calls_scanner_with_files_in_paths(self):
         with (
-            patch("src.hooks.run_security_scan.PresidioScanner") as mock_scanner,
+            patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner,
         ):
             mock_scanner.return_value = AsyncMock()
             scan = RunSecurityScan(github_action=False, paths=["1.txt", "2.csv"])
             await scan.run_personal_scan()
-            mock_scanner.assert_called_once_with(False, ["1.txt", "2.csv"])
+            mock_scanner.assert_called_once_with(
+                False,
+                ["1.txt", "2.csv"],
+                jobs=1,
+                cache=ANY,
+                staged_files=None,
+                analyzer=None,
+                max_in_flight_paths=PRESIDIO_MAX_IN_FLIGHT_PATHS,
+                memory_budget=PRESIDIO_MEMORY_BUDGET_BYTES,
+                path_timeout=PRESIDIO_PATH_TIMEOUT_SECONDS,
+                scan_timeout=PRESIDIO_SCAN_TIMEOUT_SECONDS,
+            )
+
+    async def test_run_personal_scan_with_zero_jobs_uses_a_worker_per_cpu(self):
+        with (
+            patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner,
+            patch("src.hooks.run_security_scan.os.cpu_count", return_value=16),
+        ):
+            mock_scanner.return_value = AsyncMock()
+            scan = RunSecurityScan(paths=["1.txt"], jobs=0)
+            await scan.run_personal_scan()
+            mock_scanner.assert_called_once_with(
+                False,
+                ["1.txt"],
+                jobs=16,
+                cache=ANY,
+                staged_files=None,
+                analyzer=None,
+                max_in_flight_paths=PRESIDIO_MAX_IN_FLIGHT_PATHS,
+                memory_budget=PRESIDIO_MEMORY_BUDGET_BYTES,
+                path_timeout=PRESIDIO_PATH_TIMEOUT_SECONDS,
+                scan_timeout=PRESIDIO_SCAN_TIMEOUT_SECONDS,
+            )
+
+    async def test_run_personal_scan_with_cache_enabled_passes_a_result_cache_to_the_scanner(self):
+        with patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner:
+            mock_scanner.return_value = AsyncMock()
+            await RunSecurityScan(paths=["1.txt"]).run_personal_scan()
+            assert isinstance(mock_scanner.call_args.kwargs["cache"], PresidioResultCache)
+
+    async def test_run_personal_scan_with_cache_disabled_does_not_pass_a_result_cache_to_the_scanner(self):
+        with patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner:
+            mock_scanner.return_value = AsyncMock()
+            await RunSecurityScan(paths=["1.txt"], use_cache=False).run_personal_scan()
+            assert mock_scanner.call_args.kwargs["cache"] is None
 
     async def test_run_personal_scan_with_data_detected_returns_expected_results(self):
         detection = PersonalDataDetection(RecognizerResult("test_recognizer", 1, 2, 1), "found value")
@@ -180,7 +466,7 @@ class TestRunSecurityScan:
         scan_result.add_path_scan_result(PathScanResult("file.txt", PathScanStatus.FAILED, [detection]))
         mock_scan_result = AsyncMock()
         mock_scan_result.return_value = scan_result
-        with patch("src.hooks.run_security_scan.PresidioScanner") as mock_scanner:
+        with patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner:
             mock_scanner().scan = mock_scan_result
             scan = RunSecurityScan()
             result = await scan.run_personal_scan()
@@ -193,7 +479,7 @@ class TestRunSecurityScan:
         scan_result.add_path_scan_result(PathScanResult("file.txt", PathScanStatus.PASSED, []))
         mock_scan_result = AsyncMock()
         mock_scan_result.return_value = scan_result
-        with patch("src.hooks.run_security_scan.PresidioScanner") as mock_scanner:
+        with patch("src.hooks.presidio.scanner.PresidioScanner") as mock_scanner:
             mock_scanner().scan = mock_scan_result
             scan = RunSecurityScan()
             result = await scan.run_personal_scan()
@@ -218,6 +504,61 @@ class TestRunSecurityScan:
             mock_run_personal_scan.assert_called_once()
             mock_run_security_scan.assert_called_once()
 
+    async def test_run_with_daemon_result_returns_daemon_result_without_scanning(self):
+        daemon_result = RunSecurityScanResult(TrufflehogScanResult([TrufflehogFinding("AWS", file="a.txt")]), None)  # type: ignore
+        with (
+            patch("src.hooks.run_security_scan.ScanDaemonClient") as mock_client,
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+        ):
+            mock_client.return_value.run_scan = AsyncMock(return_value=daemon_result.to_dict())
+            scan = RunSecurityScan(paths=["a.txt"])
+
+            result = await scan.run()
+
+            mock_client.return_value.run_scan.assert_awaited_once_with(scan.get_scan_args())
+            mock_run_in_process.assert_not_called()
+            assert result.trufflehog_scan_result.findings == daemon_result.trufflehog_scan_result.findings
+            assert result.presidio_scan_result is None
+
+    async def test_run_without_daemon_result_scans_in_process(self):
+        with (
+            patch("src.hooks.run_security_scan.ScanDaemonClient") as mock_client,
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+        ):
+            mock_client.return_value.run_scan = AsyncMock(return_value=None)
+
+            result = await RunSecurityScan(paths=["a.txt"]).run()
+
+            assert result == mock_run_in_process.return_value
+
+    async def test_run_with_use_daemon_false_does_not_use_the_daemon(self):
+        with (
+            patch("src.hooks.run_security_scan.ScanDaemonClient") as mock_client,
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+        ):
+            await RunSecurityScan(paths=["a.txt"], use_daemon=False).run()
+
+            mock_client.assert_not_called()
+            mock_run_in_process.assert_awaited_once()
+
+    async def test_run_with_staged_passes_staged_files_to_both_scans_and_closes_them(self):
+        staged_files = AsyncMock()
+        scan = RunSecurityScan(paths=["a.txt"], staged=True)
+
+        async def assert_staged_files_loaded():
+            assert scan._staged_files is staged_files
+
+        with (
+            patch("src.hooks.run_security_scan.StagedFiles.load", return_value=staged_files) as mock_load,
+            patch.object(RunSecurityScan, "run_security_scan", side_effect=assert_staged_files_loaded),
+            patch.object(RunSecurityScan, "run_personal_scan", side_effect=assert_staged_files_loaded),
+        ):
+            await scan.run()
+
+            mock_load.assert_awaited_once_with(["a.txt"])
+            staged_files.aclose.assert_awaited_once()
+            assert scan._staged_files is None
+
     async def test_run_with_run_security_scan_excluded_does_not_run_a_security_scan(
         self,
     ):
@@ -241,3 +582,114 @@ class TestRunSecurityScan:
 
             mock_run_personal_scan.assert_not_called()
             mock_run_security_scan.assert_called_once()
+
+    async def test_run_with_receipt_for_staged_tree_does_not_scan(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path))
+        await receipts.record("tree-fingerprint", ["a.txt"], [])
+        with (
+            patch.object(RunSecurityScan, "_get_scan_receipts", return_value=receipts),
+            patch.object(ScanReceipts, "get_key", AsyncMock(return_value="tree-fingerprint")),
+            patch("src.hooks.run_security_scan.get_paths_matching_index", AsyncMock(return_value={"a.txt"})),
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+        ):
+            result = await RunSecurityScan(paths=["./a.txt"], use_daemon=False).run()
+
+            mock_run_in_process.assert_not_called()
+            assert result.run_success() is True
+
+    async def test_run_without_receipt_records_receipt_when_scans_pass(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path))
+        with (
+            patch.object(RunSecurityScan, "_get_scan_receipts", return_value=receipts),
+            patch.object(ScanReceipts, "get_key", AsyncMock(return_value="tree-fingerprint")),
+            patch("src.hooks.run_security_scan.get_paths_matching_index", AsyncMock(return_value={"a.txt"})),
+            patch.object(
+                RunSecurityScan,
+                "run_in_process",
+                return_value=RunSecurityScanResult(TrufflehogScanResult(), PresidioScanResult()),
+            ) as mock_run_in_process,
+        ):
+            await RunSecurityScan(paths=["a.txt"], use_daemon=False).run()
+
+            mock_run_in_process.assert_awaited_once()
+            assert await receipts.has_passed("tree-fingerprint", ["a.txt"], []) is True
+
+    @pytest.mark.parametrize(
+        "scan_result",
+        [
+            RunSecurityScanResult(TrufflehogScanResult([TrufflehogFinding("AWS", file="a.txt")]), None),  # type: ignore
+            RunSecurityScanResult(TrufflehogScanResult(error="failed"), None),  # type: ignore
+            RunSecurityScanResult(
+                None,  # type: ignore
+                PresidioScanResult([PathScanResult("a.txt", PathScanStatus.ERRORED, additional_detail="unreadable")]),
+            ),
+        ],
+    )
+    async def test_run_without_receipt_does_not_record_receipt_when_scans_do_not_pass(self, tmp_path, scan_result):
+        receipts = ScanReceipts(str(tmp_path))
+        with (
+            patch.object(RunSecurityScan, "_get_scan_receipts", return_value=receipts),
+            patch.object(ScanReceipts, "get_key", AsyncMock(return_value="tree-fingerprint")),
+            patch("src.hooks.run_security_scan.get_paths_matching_index", AsyncMock(return_value={"a.txt"})),
+            patch.object(RunSecurityScan, "run_in_process", return_value=scan_result),
+        ):
+            await RunSecurityScan(paths=["a.txt"], use_daemon=False).run()
+
+            assert await receipts.has_passed("tree-fingerprint") is False
+
+    async def test_run_with_paths_not_matching_staged_tree_does_not_use_receipts(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path))
+        await receipts.record("tree-fingerprint", ["a.txt", "b.txt"], [])
+        with (
+            patch.object(RunSecurityScan, "_get_scan_receipts", return_value=receipts),
+            patch.object(ScanReceipts, "get_key", AsyncMock(return_value="tree-fingerprint")) as mock_get_key,
+            patch("src.hooks.run_security_scan.get_paths_matching_index", AsyncMock(return_value={"a.txt"})),
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+        ):
+            await RunSecurityScan(paths=["a.txt", "b.txt"], use_daemon=False).run()
+
+            mock_get_key.assert_not_called()
+            mock_run_in_process.assert_awaited_once()
+
+    @pytest.mark.parametrize(
+        "scan_args",
+        [
+            {"paths": ["a.txt"], "use_cache": False},
+            {"paths": ["."], "github_action": True},
+        ],
+    )
+    async def test_run_with_cache_disabled_or_github_action_does_not_use_receipts(self, scan_args):
+        with (
+            patch("src.hooks.run_security_scan.get_paths_matching_index") as mock_get_paths_matching_index,
+            patch.object(RunSecurityScan, "run_in_process"),
+        ):
+            await RunSecurityScan(use_daemon=False, **scan_args).run()
+
+            mock_get_paths_matching_index.assert_not_called()
+
+
+class TestRunSecurityScanResult:
+    def test_to_dict_and_from_dict_round_trips_both_results(self):
+        detection = PersonalDataDetection(RecognizerResult("EMAIL_ADDRESS", 0, 13, 1.0), "test@test.com", line_number=2)
+        result = RunSecurityScanResult(
+            TrufflehogScanResult([TrufflehogFinding("AWS", file="a.txt", line=1, verified=True)], error="failed"),
+            PresidioScanResult(
+                [
+                    PathScanResult("a.txt", PathScanStatus.FAILED, results=[detection], cached=True),
+                    PathScanResult("b.txt", PathScanStatus.ERRORED, additional_detail="unreadable"),
+                    PathScanResult("c.txt", PathScanStatus.EXCLUDED),
+                ]
+            ),
+        )
+
+        round_tripped = RunSecurityScanResult.from_dict(json.loads(json.dumps(result.to_dict())))
+
+        assert round_tripped.run_summary() == result.run_summary()
+        assert round_tripped.run_success() is False
+        assert round_tripped.presidio_scan_result.paths_from_cache == 1
+
+    def test_to_dict_and_from_dict_round_trips_excluded_scans(self):
+        result = RunSecurityScanResult.from_dict(RunSecurityScanResult(None, None).to_dict())  # type: ignore
+
+        assert result.trufflehog_scan_result is None
+        assert result.presidio_scan_result is None
@@ -0,0 +1,203 @@
+import json
+import os
+import pytest
+import tempfile
+
+from anyio import connect_unix, create_task_group, sleep
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
+from unittest.mock import MagicMock, patch
+
+from src.hooks.presidio.scanner import PresidioScanner
+from src.hooks.run_security_scan import RunSecurityScan, RunSecurityScanResult
+from src.hooks.scan_daemon import ScanDaemon
+from src.hooks.scan_daemon_client import ScanDaemonClient
+from src.hooks.trufflehog.scanner import TrufflehogFinding, TrufflehogScanResult
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths have a short maximum length, so keep the directory near the root of the filesystem
+    with tempfile.TemporaryDirectory(dir="/tmp") as directory:
+        yield str(Path(directory, "daemon", "scan_daemon.sock"))
+
+
+@asynccontextmanager
+async def run_daemon(socket_path: str) -> AsyncIterator[ScanDaemon]:
+    daemon = ScanDaemon(socket_path=socket_path)
+    with patch.object(PresidioScanner, "_get_analyzer", return_value=MagicMock()):
+        async with create_task_group() as tg:
+            await tg.start(daemon.serve)
+            yield daemon
+            tg.cancel_scope.cancel()
+
+
+class TestScanDaemon:
+    def test_validate_args_without_paths_returns_true(self):
+        assert ScanDaemon().validate_args() is True
+
+    def test_validate_args_with_paths_returns_false(self):
+        assert ScanDaemon(paths=["a.txt"]).validate_args() is False
+
+    async def test_scan_is_run_by_the_daemon_with_its_analyzer_and_proxy(self, socket_path):
+        scans = []
+
+        async def run_in_process(scan: RunSecurityScan):
+            scans.append(scan)
+            return RunSecurityScanResult(TrufflehogScanResult([TrufflehogFinding("AWS", file="a.txt")]), None)  # type: ignore
+
+        with patch.object(RunSecurityScan, "run_in_process", autospec=True, side_effect=run_in_process):
+            async with run_daemon(socket_path) as daemon:
+                scan_args = RunSecurityScan(paths=["a.txt"], in_process_proxy=True).get_scan_args()
+                result = await ScanDaemonClient(socket_path).run_scan(scan_args)
+
+                assert len(scans) == 1
+                assert scans[0].paths == ["a.txt"]
+                assert scans[0].use_daemon is False
+                assert scans[0].analyzer is daemon._analyzer
+                assert scans[0].proxy_url == daemon._proxy.url  # type: ignore
+
+        assert RunSecurityScanResult.from_dict(result).trufflehog_scan_result.findings == [  # type: ignore
+            TrufflehogFinding("AWS", file="a.txt")
+        ]
+
+    async def test_scan_without_in_process_proxy_does_not_use_the_daemon_proxy(self, socket_path):
+        with patch.object(RunSecurityScan, "run_in_process", autospec=True) as mock_run_in_process:
+            mock_run_in_process.return_value = RunSecurityScanResult(None, None)  # type: ignore
+            async with run_daemon(socket_path):
+                await ScanDaemonClient(socket_path).run_scan(RunSecurityScan(paths=["a.txt"]).get_scan_args())
+
+            assert mock_run_in_process.call_args.args[0].proxy_url is None
+
+    async def test_scan_is_run_with_the_git_environment_of_the_client(self, socket_path, monkeypatch):
+        git_env = []
+
+        async def run_in_process(scan: RunSecurityScan):
+            git_env.append({name: value for name, value in os.environ.items() if name.startswith("GIT_")})
+            return RunSecurityScanResult(None, None)  # type: ignore
+
+        monkeypatch.setenv("GIT_DIR", "daemon.git")
+        with patch.object(RunSecurityScan, "run_in_process", autospec=True, side_effect=run_in_process):
+            async with run_daemon(socket_path):
+                client = ScanDaemonClient(socket_path)
+                request = {**client.get_request({"paths": ["a.txt"]}), "git_env": {"GIT_INDEX_FILE": "next-index"}}
+                with patch.object(client, "get_request", return_value=request):
+                    assert await client.run_scan({}) is not None
+
+        assert git_env == [{"GIT_INDEX_FILE": "next-index"}]
+        assert os.environ["GIT_DIR"] == "daemon.git"
+        assert "GIT_INDEX_FILE" not in os.environ
+
+    async def test_socket_is_removed_when_the_daemon_stops(self, socket_path):
+        async with run_daemon(socket_path):
+            assert Path(socket_path).exists()
+
+        assert not Path(socket_path).exists()
+
+    async def test_scan_from_another_working_directory_is_rejected(self, socket_path):
+        client = ScanDaemonClient(socket_path)
+        with (
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+            patch.object(client, "get_request", return_value={**client.get_request({}), "cwd": "/somewhere/else"}),
+        ):
+            async with run_daemon(socket_path):
+                assert await client.run_scan({}) is None
+
+            mock_run_in_process.assert_not_called()
+
+    async def test_scan_with_different_presidio_configuration_is_rejected(self, socket_path):
+        client = ScanDaemonClient(socket_path)
+        with (
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+            patch.object(client, "get_request", return_value={**client.get_request({}), "fingerprint": "changed"}),
+        ):
+            async with run_daemon(socket_path):
+                assert await client.run_scan({}) is None
+
+            mock_run_in_process.assert_not_called()
+
+    async def test_scan_from_another_hooks_version_is_rejected(self, socket_path):
+        client = ScanDaemonClient(socket_path)
+        with (
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+            patch.object(client, "get_request", return_value={**client.get_request({}), "hooks_version": "0.0.1"}),
+        ):
+            async with run_daemon(socket_path):
+                assert await client.run_scan({}) is None
+
+            mock_run_in_process.assert_not_called()
+
+    async def test_scan_with_different_exclusions_is_rejected(self, socket_path, tmp_path):
+        exclusions_file = tmp_path / "exclusions.txt"
+        exclusions_file.write_text("a.txt")
+        client = ScanDaemonClient(socket_path)
+        with (
+            patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process,
+            patch("src.hooks.scan_receipts.PRESIDIO_EXCLUSIONS_FILE_PATH", str(exclusions_file)),
+        ):
+            request = client.get_request({})
+            exclusions_file.write_text("b.txt")
+            async with run_daemon(socket_path):
+                with patch.object(client, "get_request", return_value=request):
+                    assert await client.run_scan({}) is None
+
+            mock_run_in_process.assert_not_called()
+
+    async def test_scan_with_invalid_args_is_rejected(self, socket_path):
+        with patch.object(RunSecurityScan, "run_in_process") as mock_run_in_process:
+            async with run_daemon(socket_path):
+                assert await ScanDaemonClient(socket_path).run_scan({"paths": [], "jobs": -1}) is None
+
+            mock_run_in_process.assert_not_called()
+
+    async def test_scan_that_fails_in_the_daemon_returns_no_result(self, socket_path):
+        with patch.object(RunSecurityScan, "run_in_process", side_effect=ValueError("failed")):
+            async with run_daemon(socket_path):
+                assert await ScanDaemonClient(socket_path).run_scan({"paths": ["a.txt"]}) is None
+
+    async def test_client_that_disconnects_before_the_reply_does_not_stop_the_daemon(self, socket_path):
+        async def run_in_process(scan: RunSecurityScan):
+            await sleep(0.1)
+            return RunSecurityScanResult(None, None)  # type: ignore
+
+        with patch.object(RunSecurityScan, "run_in_process", autospec=True, side_effect=run_in_process):
+            async with run_daemon(socket_path):
+                client = ScanDaemonClient(socket_path)
+                async with await connect_unix(socket_path) as stream:
+                    await stream.send(json.dumps(client.get_request({"paths": ["a.txt"]})).encode())
+                    await stream.send_eof()
+                await sleep(0.3)
+
+                assert await client.run_scan({"paths": ["a.txt"]}) is not None
+
+    async def test_serve_when_a_daemon_is_already_running_raises_runtime_error(self, socket_path):
+        async with run_daemon(socket_path):
+            with pytest.raises(RuntimeError):
+                await ScanDaemon(socket_path=socket_path).serve()
+
+    async def test_serve_removes_socket_left_by_a_daemon_that_did_not_stop_cleanly(self, socket_path):
+        Path(socket_path).parent.mkdir(parents=True)
+        Path(socket_path).write_text("")
+
+        async with run_daemon(socket_path):
+            assert await ScanDaemonClient(socket_path).run_scan({"paths": [], "jobs": -1}) is None
+
+
+class TestScanDaemonClient:
+    async def test_run_scan_without_a_daemon_returns_none(self, socket_path):
+        assert await ScanDaemonClient(socket_path).run_scan({}) is None
+
+    async def test_run_scan_with_daemon_that_does_not_reply_in_time_returns_none(self, socket_path):
+        async def run_in_process(scan: RunSecurityScan):
+            await sleep(10)
+
+        with patch.object(RunSecurityScan, "run_in_process", autospec=True, side_effect=run_in_process):
+            async with run_daemon(socket_path):
+                assert await ScanDaemonClient(socket_path, timeout=0.1).run_scan({"paths": ["a.txt"]}) is None
+
+    async def test_run_scan_with_socket_nobody_is_listening_on_returns_none(self, socket_path):
+        Path(socket_path).parent.mkdir(parents=True)
+        Path(socket_path).write_text("")
+
+        assert await ScanDaemonClient(socket_path).run_scan({}) is None
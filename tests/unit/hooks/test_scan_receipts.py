@@ -0,0 +1,89 @@
+import os
+
+from unittest.mock import AsyncMock, patch
+
+from src.hooks.scan_receipts import ScanReceipts
+
+
+class TestScanReceipts:
+    async def test_has_passed_without_receipt_returns_false(self, tmp_path):
+        assert await ScanReceipts(str(tmp_path)).has_passed("tree-fingerprint") is False
+
+    async def test_has_passed_with_recorded_receipt_returns_true(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path))
+        await receipts.record("tree-fingerprint", ["a.txt"], [])
+
+        assert await receipts.has_passed("tree-fingerprint") is True
+        assert await receipts.has_passed("other-fingerprint") is False
+
+    async def test_has_passed_with_paths_scanned_by_receipt_returns_true(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path))
+        await receipts.record("tree-fingerprint", ["./a.txt", "folder/b.txt"], [])
+
+        assert await receipts.has_passed("tree-fingerprint", paths=["a.txt"]) is True
+        assert await receipts.has_passed("tree-fingerprint", paths=["a.txt", "folder/./b.txt"]) is True
+
+    async def test_has_passed_with_paths_not_scanned_by_receipt_returns_false(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path))
+        await receipts.record("tree-fingerprint", ["a.txt"], [])
+
+        assert await receipts.has_passed("tree-fingerprint", paths=["a.txt", "c.txt"]) is False
+
+    async def test_has_passed_with_scan_excluded_by_receipt_but_not_now_returns_false(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path))
+        await receipts.record("tree-fingerprint", ["a.txt"], ["security_scan"])
+
+        assert await receipts.has_passed("tree-fingerprint", excluded_scans=[]) is False
+        assert await receipts.has_passed("tree-fingerprint", excluded_scans=["security_scan"]) is True
+
+    async def test_has_passed_with_invalid_receipt_returns_false(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path))
+        (tmp_path / "scan_receipts").mkdir()
+        (tmp_path / "scan_receipts" / "tree-fingerprint.json").write_text("{not json")
+
+        assert await receipts.has_passed("tree-fingerprint") is False
+
+    async def test_record_creates_directory_that_ignores_itself_from_git(self, tmp_path):
+        cache_directory = tmp_path / "cache"
+        await ScanReceipts(str(cache_directory)).record("tree-fingerprint", ["a.txt"], [])
+
+        assert (cache_directory / ".gitignore").read_text() == "*\n"
+        assert os.listdir(cache_directory / "scan_receipts") == ["tree-fingerprint.json"]
+
+    async def test_record_removes_oldest_receipts_beyond_max_entries(self, tmp_path):
+        receipts = ScanReceipts(str(tmp_path), max_entries=2)
+        for index, key in enumerate(["first", "second", "third"]):
+            await receipts.record(key, ["a.txt"], [])
+            os.utime(tmp_path / "scan_receipts" / f"{key}.json", (index, index))
+        await receipts.record("fourth", ["a.txt"], [])
+
+        assert sorted(os.listdir(tmp_path / "scan_receipts")) == ["fourth.json", "third.json"]
+
+    async def test_record_when_directory_can_not_be_created_does_not_raise(self, tmp_path):
+        (tmp_path / "file").write_text("")
+
+        await ScanReceipts(str(tmp_path / "file")).record("tree-fingerprint", ["a.txt"], [])
+
+    async def test_get_key_combines_staged_tree_and_fingerprint(self):
+        with (
+            patch("src.hooks.scan_receipts.get_staged_tree", AsyncMock(return_value="tree")),
+            patch.object(ScanReceipts, "get_fingerprint", return_value="fingerprint"),
+        ):
+            assert await ScanReceipts().get_key() == "tree-fingerprint"
+
+    async def test_get_key_without_staged_tree_returns_none(self):
+        with patch("src.hooks.scan_receipts.get_staged_tree", AsyncMock(return_value=None)):
+            assert await ScanReceipts().get_key() is None
+
+    def test_get_fingerprint_changes_when_exclusions_change(self, tmp_path):
+        exclusions_file = tmp_path / "exclusions.txt"
+        exclusions_file.write_text("a.txt")
+        with patch("src.hooks.scan_receipts.PRESIDIO_EXCLUSIONS_FILE_PATH", str(exclusions_file)):
+            fingerprint = ScanReceipts.get_fingerprint()
+            assert ScanReceipts.get_fingerprint() == fingerprint
+
+            exclusions_file.write_text("b.txt")
+            assert ScanReceipts.get_fingerprint() != fingerprint
+
+    def test_get_fingerprint_changes_with_hooks_version(self):
+        assert ScanReceipts.get_fingerprint(hooks_version="1.0.0") != ScanReceipts.get_fingerprint(hooks_version="2.0.0")
@@ -1,12 +1,32 @@
+import json
+import os
+import sys
+
 from pathlib import Path
-from unittest.mock import patch
+from typing import List
+from unittest.mock import AsyncMock, MagicMock, patch
 from src.hooks.config import (
     TRUFFLEHOG_ERROR_CODE,
     TRUFFLEHOG_EXCLUSIONS_FILE_PATH,
     TRUFFLEHOG_INFO_LOG_LEVEL,
     TRUFFLEHOG_VERBOSE_LOG_LEVEL,
 )
-from src.hooks.trufflehog.scanner import TrufflehogScanner
+from src.hooks.trufflehog.scanner import TrufflehogFinding, TrufflehogScanResult, TrufflehogScanner
+
+FILESYSTEM_FINDING = {
+    "SourceMetadata": {"Data": {"Filesystem": {"file": "keys.txt", "line": 2}}},
+    "DetectorName": "AWS",
+    "Verified": True,
+    "Raw": "AKIAEXAMPLESECRET",
+    "Redacted": "AKIAEXAMPLE",
+}
+GIT_FINDING = {
+    "SourceMetadata": {"Data": {"Git": {"commit": "abc123", "file": "src/a.py", "line": 10}}},
+    "DetectorName": "Github",
+    "Verified": False,
+    "Raw": "ghp_secret",
+    "Redacted": "",
+}
 
 
 class TestTrufflehogScanner:
@@ -31,6 +51,14 @@ class TestTrufflehogScanner:
         assert "file:///folder1" in args
         assert "git" in args
 
+    async def test_get_args_with_github_action_true_scans_commits_since_main_by_default(self):
+        args = await TrufflehogScanner()._get_args(paths=["/folder1"], github_action=True)
+        assert "--since-commit=main" in args
+
+    async def test_get_args_with_github_action_true_scans_commits_since_commit_passed_in(self):
+        args = await TrufflehogScanner()._get_args(paths=["/folder1"], github_action=True, since_commit="origin/dev")
+        assert "--since-commit=origin/dev" in args
+
     async def test_get_args_with_github_action_false_uses_filesystem_scanning_mode(self):
         paths = ["1.txt", "2.txt", "3.txt"]
         args = await TrufflehogScanner()._get_args(paths=paths, github_action=False)
@@ -57,51 +85,223 @@ class TestTrufflehogScanner:
                 "--fail",
                 "--no-update",
                 "--results=verified,unknown",
+                "--json",
                 f"--log-level={TRUFFLEHOG_INFO_LOG_LEVEL}",
                 "--include-detectors=a,b,c",
                 "1.txt",
             ]
 
-    async def test_scan_with_trufflehog_error_code_returns_error_response(self):
+    def _get_fake_trufflehog_args(self, stdout_lines: List[str], returncode: int, stderr: str = "") -> List[str]:
+        script = (
+            "import sys;"
+            f"[print(line, flush=True) for line in {stdout_lines!r}];"
+            f"sys.stderr.write({stderr!r});"
+            f"sys.exit({returncode})"
+        )
+        return [sys.executable, "-c", script]
+
+    async def test_scan_with_trufflehog_error_code_returns_findings(self):
         with (
             patch.object(TrufflehogScanner, "_get_args") as mock_args,
-            patch("src.hooks.trufflehog.scanner.Proxy"),
-            patch.object(TrufflehogScanner, "_get_trufflehog_env_vars") as mock_env,
-            patch("src.hooks.trufflehog.scanner.run_process") as mock_run_process,
+            patch("proxy.Proxy"),
         ):
-            mock_args.return_value = ["arg1", "arg2"]
-            mock_env.return_value = {"env_1": "true"}
+            mock_args.return_value = self._get_fake_trufflehog_args(
+                [json.dumps(FILESYSTEM_FINDING), "not json", json.dumps(GIT_FINDING)], TRUFFLEHOG_ERROR_CODE
+            )
 
-            mock_run_process.return_value.stdout = "Found keys".encode()
-            mock_run_process.return_value.stderr = "Called the scanning tool and keys were found".encode()
-            mock_run_process.return_value.returncode = TRUFFLEHOG_ERROR_CODE
+            result = await TrufflehogScanner().scan()
+
+            assert result.has_issues() is True
+            assert result.error is None
+            assert result.findings == [
+                TrufflehogFinding("AWS", file="keys.txt", line=2, verified=True, redacted="AKIAEXAMPLE"),
+                TrufflehogFinding("Github", file="src/a.py", line=10, commit="abc123", verified=False),
+            ]
+
+    async def test_scan_with_trufflehog_success_returns_no_findings(self):
+        with (
+            patch.object(TrufflehogScanner, "_get_args") as mock_args,
+            patch("proxy.Proxy"),
+        ):
+            mock_args.return_value = self._get_fake_trufflehog_args([], 0, stderr="finished scanning")
 
             result = await TrufflehogScanner().scan()
-            mock_run_process.assert_awaited_once_with(
-                mock_args.return_value,
-                check=False,
-                env=mock_env.return_value,
-            )
 
-            assert result.detected_keys == "Found keys"
+            assert result.has_issues() is False
+            assert result.findings == []
 
-    async def test_scan_with_trufflehog_success_returns_no_error_response(self):
+    async def test_scan_with_trufflehog_failing_to_run_returns_error(self):
         with (
             patch.object(TrufflehogScanner, "_get_args") as mock_args,
-            patch("src.hooks.trufflehog.scanner.Proxy"),
+            patch("proxy.Proxy"),
+        ):
+            mock_args.return_value = self._get_fake_trufflehog_args([], 1, stderr="line 1\nunable to scan")
+
+            result = await TrufflehogScanner().scan()
+
+            assert result.has_issues() is True
+            assert result.error == "line 1\nunable to scan"
+
+    async def test_scan_passes_trufflehog_env_vars_to_process(self):
+        with (
+            patch.object(TrufflehogScanner, "_get_args", return_value=["trufflehog"]),
+            patch("proxy.Proxy"),
             patch.object(TrufflehogScanner, "_get_trufflehog_env_vars") as mock_env,
-            patch("src.hooks.trufflehog.scanner.run_process") as mock_run_process,
+            patch.object(TrufflehogScanner, "_run_trufflehog") as mock_run_trufflehog,
         ):
-            mock_args.return_value = ["arg1", "arg2"]
-            mock_env.return_value = {"env_1": "true"}
+            result = await TrufflehogScanner(paths=["1.txt"]).scan()
 
-            mock_run_process.return_value.stdout = "".encode()
-            mock_run_process.return_value.returncode = 0
+            mock_run_trufflehog.assert_awaited_once_with(["trufflehog"], mock_env.return_value, cwd=None)
+            assert result == mock_run_trufflehog.return_value
 
-            result = await TrufflehogScanner().scan()
-            mock_run_process.assert_awaited_once_with(
-                mock_args.return_value,
-                check=False,
-                env=mock_env.return_value,
+    async def test_scan_with_in_process_proxy_sends_trufflehog_requests_through_the_egress_proxy(self):
+        with (
+            patch.object(TrufflehogScanner, "_get_args", return_value=["trufflehog"]),
+            patch("proxy.Proxy") as mock_proxy,
+            patch("src.hooks.trufflehog.scanner.EgressProxy") as mock_egress_proxy,
+            patch.object(TrufflehogScanner, "_run_trufflehog") as mock_run_trufflehog,
+        ):
+            mock_egress_proxy.return_value.__aenter__.return_value.url = "http://127.0.0.1:1234"
+
+            await TrufflehogScanner(paths=["1.txt"], in_process_proxy=True).scan(allowed_vendor_endpoints=["a.com"])
+
+            mock_proxy.assert_not_called()
+            mock_egress_proxy.assert_called_once_with(["a.com"])
+            env = mock_run_trufflehog.call_args.args[1]
+            assert env["HTTP_PROXY"] == "http://127.0.0.1:1234"
+            assert env["HTTPS_PROXY"] == "http://127.0.0.1:1234"
+
+    async def test_run_proxy_runs_proxy_py_on_an_os_assigned_port_in_its_own_directory(self, tmp_path):
+        with patch("src.hooks.trufflehog.scanner.DEFAULT_PROXY_DIRECTORY", str(tmp_path)):
+            async with (
+                TrufflehogScanner()._run_proxy(["a.com"]) as first_url,
+                TrufflehogScanner()._run_proxy(["a.com"]) as second_url,
+            ):
+                assert first_url.startswith("http://127.0.0.1:")
+                assert second_url.startswith("http://127.0.0.1:")
+                assert first_url != second_url
+                assert len(list(tmp_path.glob("run_*"))) == 2
+
+            assert list(tmp_path.glob("run_*")) == []
+
+    async def test_get_args_with_concurrency_adds_concurrency_arg_for_trufflehog(self):
+        assert "--concurrency=4" in await TrufflehogScanner(concurrency=4)._get_args([])
+
+    async def test_get_args_without_concurrency_does_not_add_concurrency_arg_for_trufflehog(self):
+        assert not [arg for arg in await TrufflehogScanner()._get_args([]) if arg.startswith("--concurrency")]
+
+    def test_get_path_shards_balances_shards_by_file_size(self, tmp_path):
+        sizes = {"a.txt": 100, "b.txt": 60, "c.txt": 50, "d.txt": 10}
+        for file_name, size in sizes.items():
+            (tmp_path / file_name).write_bytes(b"x" * size)
+
+        shards = TrufflehogScanner(shards=2)._get_path_shards(list(sizes), cwd=str(tmp_path))
+
+        assert shards == [["a.txt", "d.txt"], ["b.txt", "c.txt"]]
+
+    def test_get_path_shards_with_more_shards_than_paths_has_no_empty_shards(self):
+        assert TrufflehogScanner(shards=8)._get_path_shards(["a.txt", "b.txt"]) == [["a.txt"], ["b.txt"]]
+
+    def test_get_path_shards_adds_shards_when_paths_are_too_long_for_one_process(self):
+        paths = [f"{index}.txt" for index in range(10)]
+        with patch("src.hooks.trufflehog.scanner.TRUFFLEHOG_MAX_SHARD_ARGS_LENGTH", 20):
+            shards = TrufflehogScanner(shards=1)._get_path_shards(paths)
+
+        assert len(shards) == 4
+        assert sorted(path for shard in shards for path in shard) == sorted(paths)
+        for shard in shards:
+            assert sum(len(path) + 1 for path in shard) <= 20
+
+    async def test_scan_with_shards_merges_the_findings_of_every_shard(self):
+        async def get_args(scanner, paths, **kwargs):
+            finding = {"SourceMetadata": {"Data": {"Filesystem": {"file": paths[0], "line": 1}}}, "DetectorName": "AWS"}
+            return self._get_fake_trufflehog_args([json.dumps(finding)], TRUFFLEHOG_ERROR_CODE)
+
+        with (
+            patch.object(TrufflehogScanner, "_get_args", autospec=True, side_effect=get_args) as mock_args,
+            patch("proxy.Proxy") as mock_proxy,
+        ):
+            result = await TrufflehogScanner(paths=["1.txt", "2.txt", "3.txt"], shards=3).scan()
+
+            mock_proxy.assert_called_once()
+            assert mock_args.await_count == 3
+            assert sorted(finding.file for finding in result.findings) == ["1.txt", "2.txt", "3.txt"]
+            assert result.error is None
+
+    async def test_scan_with_shards_returns_errors_of_failed_shards(self):
+        async def get_args(scanner, paths, **kwargs):
+            if paths == ["2.txt"]:
+                return self._get_fake_trufflehog_args([], 1, stderr="unable to scan")
+            return self._get_fake_trufflehog_args([], 0)
+
+        with (
+            patch.object(TrufflehogScanner, "_get_args", autospec=True, side_effect=get_args),
+            patch("proxy.Proxy"),
+        ):
+            result = await TrufflehogScanner(paths=["1.txt", "2.txt"], shards=2).scan()
+
+            assert result.has_issues() is True
+            assert result.error == "unable to scan"
+
+    async def test_scan_with_staged_files_runs_trufflehog_on_staged_contents(self):
+        staged_files = MagicMock()
+        staged_files.checkout = AsyncMock()
+        staged_files.get.side_effect = lambda path: "blob" if path != "untracked.txt" else None
+        with (
+            patch("proxy.Proxy"),
+            patch.object(TrufflehogScanner, "_get_trufflehog_env_vars") as mock_env,
+            patch.object(TrufflehogScanner, "_get_args") as mock_args,
+            patch.object(TrufflehogScanner, "_run_trufflehog") as mock_run_trufflehog,
+        ):
+            await TrufflehogScanner(paths=["./a.txt", "untracked.txt"], staged_files=staged_files).scan()
+
+            staged_directory = staged_files.checkout.call_args.args[0]
+            mock_args.assert_awaited_once_with(
+                ["a.txt", os.path.abspath("untracked.txt")],
+                allowed_vendor_codes=[],
+                exclusions_file=os.path.abspath(TRUFFLEHOG_EXCLUSIONS_FILE_PATH),
             )
-            assert result.detected_keys is None
+            mock_run_trufflehog.assert_awaited_once_with(mock_args.return_value, mock_env.return_value, cwd=staged_directory)
+
+
+class TestTrufflehogScanResult:
+    def test_duplicate_findings_are_removed(self):
+        finding = TrufflehogFinding.from_json(FILESYSTEM_FINDING)
+        result = TrufflehogScanResult([finding, TrufflehogFinding.from_json(FILESYSTEM_FINDING)])
+
+        assert result.findings == [finding]
+
+    def test_str_output_without_findings(self):
+        assert "No security issues detected" in str(TrufflehogScanResult())
+
+    def test_str_output_with_findings_does_not_include_raw_secret(self):
+        result = str(TrufflehogScanResult([TrufflehogFinding.from_json(FILESYSTEM_FINDING)]))
+
+        assert "1 POTENTIAL SECRETS FOUND" in result
+        assert "keys.txt" in result
+        assert "AKIAEXAMPLE" in result
+        assert "AKIAEXAMPLESECRET" not in result
+
+    def test_merge_combines_findings_and_errors(self):
+        finding = TrufflehogFinding.from_json(FILESYSTEM_FINDING)
+        other_finding = TrufflehogFinding.from_json(GIT_FINDING)
+
+        result = TrufflehogScanResult.merge(
+            [
+                TrufflehogScanResult([finding]),
+                TrufflehogScanResult([other_finding, finding], error="first error"),
+                TrufflehogScanResult(error="second error"),
+            ]
+        )
+
+        assert result.findings == [finding, other_finding]
+        assert result.error == "first error\nsecond error"
+
+    def test_merge_without_errors_has_no_error(self):
+        assert TrufflehogScanResult.merge([TrufflehogScanResult(), TrufflehogScanResult()]).error is None
+
+    def test_str_output_with_error(self):
+        result = str(TrufflehogScanResult(error="unable to scan"))
+
+        assert "THE SECURITY SCAN FAILED TO RUN" in result
+        assert "unable to scan" in result
@@ -0,0 +1,57 @@
+import pytest
+
+from src.proxy.allowlist import EndpointAllowlist
+
+
+class TestEndpointAllowlist:
+    def test_exact_host_is_allowed(self):
+        assert EndpointAllowlist(["other.com", "something.com"]).is_allowed("something.com") is True
+
+    def test_host_not_in_allowlist_is_not_allowed(self):
+        assert EndpointAllowlist(["something.com"]).is_allowed("something-else.com") is False
+
+    def test_subdomain_of_exact_host_is_not_allowed(self):
+        assert EndpointAllowlist(["something.com"]).is_allowed("api.something.com") is False
+
+    def test_missing_host_is_not_allowed(self):
+        assert EndpointAllowlist(["something.com"]).is_allowed(None) is False
+
+    def test_hosts_are_compared_case_insensitively(self):
+        assert EndpointAllowlist(["Something.com"]).is_allowed("SOMETHING.COM.") is True
+
+    @pytest.mark.parametrize("host", ["a.okta.com", "a.b.okta.com"])
+    def test_wildcard_domain_allows_subdomains(self, host):
+        assert EndpointAllowlist(["*.okta.com"]).is_allowed(host) is True
+
+    @pytest.mark.parametrize("host", ["okta.com", "notokta.com", "okta.com.evil.com"])
+    def test_wildcard_domain_does_not_allow_other_hosts(self, host):
+        assert EndpointAllowlist(["*.okta.com"]).is_allowed(host) is False
+
+    @pytest.mark.parametrize("path", ["/api/v2/me", "/api/v2/me/", "/api/v2/me/projects", "/api/v2/me?a=1"])
+    def test_path_rule_allows_paths_under_the_prefix(self, path):
+        assert EndpointAllowlist(["circleci.com/api/v2/me"]).is_allowed("circleci.com", path) is True
+
+    @pytest.mark.parametrize("path", ["/", "/api/v2", "/api/v2/messages", "/other/api/v2/me"])
+    def test_path_rule_does_not_allow_other_paths(self, path):
+        assert EndpointAllowlist(["circleci.com/api/v2/me"]).is_allowed("circleci.com", path) is False
+
+    def test_path_rule_allows_host_when_path_is_not_known(self):
+        assert EndpointAllowlist(["circleci.com/api/v2/me"]).is_allowed("circleci.com") is True
+
+    def test_host_without_path_allows_any_path_even_with_path_rules(self):
+        allowlist = EndpointAllowlist(["circleci.com/api/v2/me", "circleci.com"])
+        assert allowlist.is_allowed("circleci.com", "/anything") is True
+
+    def test_wildcard_domain_with_path_rule(self):
+        allowlist = EndpointAllowlist(["*.example.com/api"])
+        assert allowlist.is_allowed("a.example.com", "/api/x") is True
+        assert allowlist.is_allowed("a.example.com", "/other") is False
+
+    def test_from_flag_splits_comma_separated_endpoints(self):
+        allowlist = EndpointAllowlist.from_flag("a.com,b.com/path")
+        assert allowlist.is_allowed("a.com", "/x") is True
+        assert allowlist.is_allowed("b.com", "/path") is True
+        assert allowlist.is_allowed("c.com") is False
+
+    def test_from_flag_with_empty_flag_allows_nothing(self):
+        assert EndpointAllowlist.from_flag("").is_allowed("a.com") is False
@@ -0,0 +1,107 @@
+from anyio import connect_tcp, create_task_group, create_tcp_listener
+from anyio.abc import SocketAttribute, SocketStream
+from anyio.streams.buffered import BufferedByteReceiveStream
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List
+
+from src.proxy.egress_proxy import EgressProxy
+
+
+@asynccontextmanager
+async def run_upstream(received: List[bytes]) -> AsyncIterator[int]:
+    """Runs a server that records the request it receives, then responds with a fixed body and closes the connection"""
+
+    async def handle(client: SocketStream):
+        async with client:
+            request = await BufferedByteReceiveStream(client).receive_until(b"\r\n\r\n", 65536)
+            received.append(request)
+            await client.send(b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello")
+
+    async with await create_tcp_listener(local_host="127.0.0.1", local_port=0) as listener:
+        async with create_task_group() as tg:
+            tg.start_soon(listener.serve, handle, tg)
+            yield listener.extra(SocketAttribute.local_port)
+            tg.cancel_scope.cancel()
+
+
+async def send_request(proxy: EgressProxy, request: bytes) -> bytes:
+    async with await connect_tcp("127.0.0.1", proxy.port) as client:  # type: ignore
+        await client.send(request)
+        response = b""
+        async for chunk in client:
+            response += chunk
+        return response
+
+
+class TestEgressProxy:
+    async def test_proxy_listens_on_an_ephemeral_port(self):
+        async with EgressProxy([]) as proxy:
+            assert proxy.port
+            assert proxy.url == f"http://127.0.0.1:{proxy.port}"
+
+    async def test_connect_to_allowed_endpoint_is_tunnelled(self):
+        received: List[bytes] = []
+        async with run_upstream(received) as upstream_port, EgressProxy(["127.0.0.1"]) as proxy:
+            async with await connect_tcp("127.0.0.1", proxy.port) as client:  # type: ignore
+                await client.send(f"CONNECT 127.0.0.1:{upstream_port} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n".encode())
+                client_stream = BufferedByteReceiveStream(client)
+                assert await client_stream.receive_until(b"\r\n\r\n", 1024) == b"HTTP/1.1 200 Connection established"
+
+                await client.send(b"GET /tunnelled HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+                response = b""
+                async for chunk in client_stream:
+                    response += chunk
+
+        assert response.endswith(b"hello")
+        assert received == [b"GET /tunnelled HTTP/1.1\r\nHost: 127.0.0.1"]
+
+    async def test_connect_to_endpoint_not_allowed_is_rejected(self):
+        received: List[bytes] = []
+        async with run_upstream(received) as upstream_port, EgressProxy(["something.com"]) as proxy:
+            response = await send_request(proxy, f"CONNECT 127.0.0.1:{upstream_port} HTTP/1.1\r\n\r\n".encode())
+
+        assert response.startswith(b"HTTP/1.1 403 Forbidden")
+        assert received == []
+
+    async def test_http_request_to_allowed_endpoint_is_forwarded_in_origin_form(self):
+        received: List[bytes] = []
+        async with run_upstream(received) as upstream_port, EgressProxy(["127.0.0.1"]) as proxy:
+            response = await send_request(
+                proxy,
+                f"GET http://127.0.0.1:{upstream_port}/path?a=1 HTTP/1.1\r\n"
+                f"Host: 127.0.0.1\r\nProxy-Connection: keep-alive\r\n\r\n".encode(),
+            )
+
+        assert response.endswith(b"hello")
+        assert received == [b"GET /path?a=1 HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close"]
+
+    async def test_http_request_to_endpoint_not_allowed_is_rejected(self):
+        received: List[bytes] = []
+        async with run_upstream(received) as upstream_port, EgressProxy([]) as proxy:
+            response = await send_request(proxy, f"GET http://127.0.0.1:{upstream_port}/ HTTP/1.1\r\n\r\n".encode())
+
+        assert response.startswith(b"HTTP/1.1 403 Forbidden")
+        assert received == []
+
+    async def test_http_request_to_path_not_allowed_is_rejected(self):
+        received: List[bytes] = []
+        async with run_upstream(received) as upstream_port, EgressProxy(["127.0.0.1/allowed"]) as proxy:
+            response = await send_request(proxy, f"GET http://127.0.0.1:{upstream_port}/other HTTP/1.1\r\n\r\n".encode())
+
+        assert response.startswith(b"HTTP/1.1 403 Forbidden")
+        assert received == []
+
+    async def test_request_that_can_not_be_proxied_is_rejected(self):
+        async with EgressProxy(["127.0.0.1"]) as proxy:
+            response = await send_request(proxy, b"GET /not-absolute HTTP/1.1\r\n\r\n")
+
+        assert response.startswith(b"HTTP/1.1 400 Bad Request")
+
+    async def test_allowed_endpoint_that_can_not_be_reached_returns_bad_gateway(self):
+        async with await create_tcp_listener(local_host="127.0.0.1", local_port=0) as listener:
+            closed_port = listener.extra(SocketAttribute.local_port)
+
+        async with EgressProxy(["127.0.0.1"]) as proxy:
+            response = await send_request(proxy, f"CONNECT 127.0.0.1:{closed_port} HTTP/1.1\r\n\r\n".encode())
+
+        assert response.startswith(b"HTTP/1.1 502 Bad Gateway")
@@ -4,7 +4,7 @@ from proxy.http.exception import HttpRequestRejected
 from unittest import mock
 
 
-from src.proxy.plugins import OutgoingRequestInterceptorPlugin
+from src.proxy.plugins import OutgoingRequestInterceptorPlugin, get_allowlist
 
 
 class TestOutgoingRequestInterceptorPlugin:
@@ -31,3 +31,55 @@ class TestOutgoingRequestInterceptorPlugin:
         request = mock.MagicMock(host="something.com".encode())
 
         assert plugin.before_upstream_connection(request=request) == request
+
+    def test_requested_path_not_in_endpoint_path_rules_throws_http_exception(self):
+        flags = mock.MagicMock(allowed_trufflehog_vendor_endpoints="circleci.com/api/v2/me")
+        plugin = OutgoingRequestInterceptorPlugin("test_plugin", flags, None, None)
+
+        request = mock.MagicMock(host="circleci.com".encode(), path="/api/v2/other".encode())
+        with pytest.raises(HttpRequestRejected):
+            plugin.before_upstream_connection(request=request)
+
+    def test_requested_path_in_endpoint_path_rules_returns_request(self):
+        flags = mock.MagicMock(allowed_trufflehog_vendor_endpoints="circleci.com/api/v2/me")
+        plugin = OutgoingRequestInterceptorPlugin("test_plugin", flags, None, None)
+
+        request = mock.MagicMock(host="circleci.com".encode(), path="/api/v2/me".encode())
+
+        assert plugin.before_upstream_connection(request=request) == request
+
+    def test_tunnelled_request_without_path_to_endpoint_with_path_rules_returns_request(self):
+        flags = mock.MagicMock(allowed_trufflehog_vendor_endpoints="circleci.com/api/v2/me")
+        plugin = OutgoingRequestInterceptorPlugin("test_plugin", flags, None, None)
+
+        request = mock.MagicMock(method=b"CONNECT", host="circleci.com".encode(), path=None)
+
+        assert plugin.before_upstream_connection(request=request) == request
+
+    def test_plain_http_request_without_path_to_endpoint_with_path_rules_throws_http_exception(self):
+        flags = mock.MagicMock(allowed_trufflehog_vendor_endpoints="circleci.com/api/v2/me")
+        plugin = OutgoingRequestInterceptorPlugin("test_plugin", flags, None, None)
+
+        request = mock.MagicMock(method=b"GET", host="circleci.com".encode(), path=None)
+        with pytest.raises(HttpRequestRejected):
+            plugin.before_upstream_connection(request=request)
+
+    def test_plain_http_request_without_path_is_checked_as_root_path(self):
+        flags = mock.MagicMock(allowed_trufflehog_vendor_endpoints="circleci.com/")
+        plugin = OutgoingRequestInterceptorPlugin("test_plugin", flags, None, None)
+
+        request = mock.MagicMock(method=b"GET", host="circleci.com".encode(), path=None)
+
+        assert plugin.before_upstream_connection(request=request) == request
+
+    def test_allowlist_is_built_once_for_the_same_flags(self):
+        flags = mock.MagicMock(allowed_trufflehog_vendor_endpoints="something.com")
+        request = mock.MagicMock(host="something.com".encode())
+
+        with mock.patch("src.proxy.plugins.EndpointAllowlist") as mock_allowlist:
+            get_allowlist.cache_clear()
+            for _ in range(3):
+                OutgoingRequestInterceptorPlugin("test_plugin", flags, None, None).before_upstream_connection(request)
+            get_allowlist.cache_clear()
+
+        mock_allowlist.from_flag.assert_called_once_with("something.com")